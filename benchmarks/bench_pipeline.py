@@ -0,0 +1,146 @@
+"""
+Benchmark of each stage of checking a tree of db files: finding the files,
+classifying them, parsing them and running the checks, and when NumPy is
+installed exporting the records to columns and running the batched checks.
+
+Run from the root of the checker with:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --fixture --files 500
+    python -m benchmarks.bench_pipeline --input_dir ../../../support
+"""
+import argparse
+import gc
+import mmap
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from utils import columnar
+from utils.columnar import RecordTable, run_batch_checks
+from utils.db_checks import run_checks
+from utils.loader import find_files, is_epics, parsed_file
+
+from .generator import write_corpus
+
+FILE_TYPES = ['.db', '.template']
+
+
+def _classify(filenames):
+    for filename in filenames:
+        with open(filename, "rb") as _file:
+            if os.fstat(_file.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                is_epics(data)
+
+
+def _parse(filenames):
+    return [db for db in map(parsed_file, filenames) if db is not None]
+
+
+def _check(dbs):
+    for db in dbs:
+        run_checks(db)
+
+
+def _table(dbs):
+    return RecordTable.from_dbs((db.directory, db) for db in dbs)
+
+
+def _measure(stage, *args):
+    """
+    Runs a stage once for its time and again under tracemalloc for the peak
+    memory it allocates, as tracing slows the stage down
+
+    Returns:
+        a tuple of the result of the stage, the time taken in seconds and
+        the peak memory in bytes
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = stage(*args)
+    seconds = time.perf_counter() - start
+
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    result = stage(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def _report(label, seconds, peak, records, size):
+    print("{:<10}{:9.1f} ms {:11.0f} records/s {:8.1f} MB/s {:8.1f} MB peak"
+          .format(label, seconds * 1000, records / seconds,
+                  size / 1e6 / seconds, peak / 1e6))
+
+
+def run(directory):
+    """
+    Runs each stage over the files in a directory and prints the results
+    """
+    filenames, seconds, peak = _measure(
+        lambda: list(find_files([directory], FILE_TYPES)))
+    size = sum(os.path.getsize(f) for f in filenames)
+    print("{} files, {:.1f} MB".format(len(filenames), size / 1e6))
+    print("{:<10}{:9.1f} ms {:33}{:8.1f} MB peak".format(
+        "find", seconds * 1000, "", peak / 1e6))
+
+    _, seconds, peak = _measure(_classify, filenames)
+    print("{:<10}{:9.1f} ms {:33}{:8.1f} MB peak".format(
+        "classify", seconds * 1000, "", peak / 1e6))
+
+    dbs, seconds, peak = _measure(_parse, filenames)
+    records = sum(len(db.records) for db in dbs)
+    print("{} records in {} dbs".format(records, len(dbs)))
+    _report("parse", seconds, peak, records, size)
+
+    _, seconds, peak = _measure(_check, dbs)
+    _report("checks", seconds, peak, records, size)
+
+    if columnar.numpy is not None:
+        table, seconds, peak = _measure(_table, dbs)
+        _report("columns", seconds, peak, records, size)
+        _, seconds, peak = _measure(run_batch_checks, table)
+        _report("batch", seconds, peak, records, size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--input_dir', type=str, default=None,
+        help='A directory of real db files to benchmark, instead of a '
+             'generated corpus')
+    parser.add_argument(
+        '--files', type=int, default=100,
+        help='The number of files to generate')
+    parser.add_argument(
+        '--records', type=int, default=200,
+        help='The number of records in each generated file')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='The seed of the generated files')
+    parser.add_argument(
+        '--fixture', action='store_true',
+        help='Generate copies of tests/test_all.db rather than synthetic '
+             'files')
+    args = parser.parse_args()
+
+    if args.input_dir is not None:
+        run(args.input_dir)
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        write_corpus(directory, args.files, args.records, args.seed,
+                     args.fixture)
+        run(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
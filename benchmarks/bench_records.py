@@ -0,0 +1,78 @@
+"""
+Benchmark of the memory used to hold parsed records, and of the time taken
+by the record lookups the checks rely on.
+
+Run from the root of the checker with:
+    python -m benchmarks.bench_records
+"""
+import gc
+import time
+import tracemalloc
+
+from utils.db_parser import parse_db
+
+RECORD = '''record(ai, "$(P)REC{i}") {{
+    field(DESC, "Record number {i}")
+    field(EGU, "mm")
+    field(INP, "@asyn($(PORT) 0)")
+    field(SCAN, "1 second")
+    field(PREC, "3")
+    info(INTEREST, "HIGH")
+}}
+'''
+
+
+class _Text:
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+    def get_dir(self):
+        return "synthetic.db"
+
+
+def _lookups(db):
+    for rec in db.records:
+        rec.get_field("EGU")
+        rec.get_field("DESC")
+        rec.has_field("ASG")
+        rec.is_interest()
+        rec.is_sim()
+        rec.is_disable()
+
+
+def _report(label, held, records):
+    print("{:<24}{:6.1f} MB {:6.0f} bytes/record".format(
+        label, held / 1e6, held / records))
+
+
+def main(records=50000):
+    text = _Text("".join(RECORD.format(i=i) for i in range(records)))
+
+    gc.collect()
+    tracemalloc.start()
+    db = parse_db(text)
+    gc.collect()
+    parsed, _ = tracemalloc.get_traced_memory()
+    _lookups(db)
+    gc.collect()
+    queried, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("{} records".format(len(db.records)))
+    _report("held after parsing", parsed, len(db.records))
+    _report("held after lookups", queried, len(db.records))
+
+    db = parse_db(text)
+    for label in ("first lookups", "repeated lookups"):
+        start = time.perf_counter()
+        _lookups(db)
+        seconds = time.perf_counter() - start
+        print("{:<24}{:6.1f} ms {:6.2f} us/record".format(
+            label, seconds * 1000, seconds * 1e6 / len(db.records)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark of db_checks.allowed_unit against the implementation it replaced,
+over a corpus of EGU strings in the proportions they appear in a real tree.
+
+Run from the root of the checker with:
+    python -m benchmarks.bench_units
+"""
+import random
+import re
+import timeit
+
+from utils import db_checks
+
+# EGUs with rough relative frequencies, the common ones repeat thousands of
+# times across the ioc and support trees
+EGU_FREQUENCIES = [
+    ("", 400), ("mm", 300), ("K", 250), ("V", 200), ("A", 200), ("s", 150),
+    ("deg", 120), ("%", 100), ("Hz", 80), ("mbar", 60), ("mA", 60),
+    ("ms", 50), ("count", 50), ("T", 40), ("W", 40), ("mm/s", 40),
+    ("degree", 30), ("C", 30), ("kV", 30), ("bar", 20), ("uA", 20),
+    ("$(EGU)", 20), ("$(EGU=mm)", 20), ("torr", 15), ("ohm", 15),
+    ("mm/s^2", 10), ("m^3/hour", 10), ("1/s", 10), ("cdeg/ss", 5),
+    ("uA hour", 5), ("kbyte", 5), ("bit/kbyte", 5), ("rpm", 5),
+    ("m s^-1", 2), ("BADUNIT", 2), ("kkm", 1), ("Km", 1), ("dm", 1),
+]
+
+
+def legacy_allowed_unit(raw_unit):
+    """
+    The implementation of allowed_unit before units were expanded into a set
+    """
+    if raw_unit in db_checks.allowed_standalone_units:
+        return True
+
+    processed_unit = re.sub(r'\$[({].*?=(.*)?[})]', r'\1', raw_unit)
+    processed_unit = re.sub(r'\$[({].*?[})]', 'm', processed_unit)
+    processed_unit = re.sub(r'1/', '', processed_unit).replace(" ", "")
+    units_with_powers = re.split(r'[/ ()]', processed_unit)
+
+    for u in units_with_powers:
+        if '^' in u:
+            base, expo = u.split('^')
+            if expo[:1] == '-':
+                return False
+            else:
+                units_with_powers = [base]
+
+    units = filter(None, units_with_powers)
+
+    def is_standalone_unit(unit):
+        return unit in db_checks.allowed_non_prefixable_units or \
+               unit in db_checks.allowed_prefixable_units
+
+    def is_prefixed_unit(unit):
+        return any(len(unit) > len(base_unit) and
+                   unit[-len(base_unit):] == base_unit and
+                   unit[:-len(base_unit)] in db_checks.allowed_unit_prefixes
+                   for base_unit in db_checks.allowed_prefixable_units)
+
+    return all(is_standalone_unit(u) or is_prefixed_unit(u) for u in units)
+
+
+def egu_corpus(size=20000, seed=0):
+    """
+    Builds a deterministic list of EGU strings drawn with the frequencies
+    above
+    """
+    units, weights = zip(*EGU_FREQUENCIES)
+    return random.Random(seed).choices(units, weights, k=size)
+
+
+def _uncached(raw_unit):
+    return db_checks.allowed_unit.__wrapped__(raw_unit)
+
+
+def main(repeat=5):
+    corpus = egu_corpus()
+    for unit in set(corpus):
+        assert legacy_allowed_unit(unit) == db_checks.allowed_unit(unit), unit
+
+    def run(check):
+        return min(timeit.repeat(lambda: [check(u) for u in corpus],
+                                 number=1, repeat=repeat))
+
+    legacy = run(legacy_allowed_unit)
+    uncached = run(_uncached)
+    cached = run(db_checks.allowed_unit)
+
+    print("{} EGUs, {} unique".format(len(corpus), len(set(corpus))))
+    for name, seconds in [("legacy", legacy), ("compiled", uncached),
+                          ("compiled + cache", cached)]:
+        print("{:<18}{:8.2f} ms {:10.0f} units/s {:6.1f}x".format(
+            name, seconds * 1000, len(corpus) / seconds, legacy / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Deterministic generators of db files for the benchmarks.
+
+The synthetic corpus mixes the constructs that make parsing slow in a real
+tree: macros, strings containing 'record' and '#', comments, aliases and
+info tags. The fixture corpus repeats tests/test_all.db with unique PV
+names, so the checks see the same mix of passing and failing records as
+the self-tests.
+"""
+import os
+import random
+import re
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "tests", "test_all.db")
+
+RECORD_TYPES = ["ai", "ao", "bi", "bo", "calc", "calcout", "longin",
+                "mbbi", "stringin", "waveform"]
+
+EGUS = ["", "mm", "K", "V", "A", "s", "deg", "%", "Hz", "mbar", "mm/s",
+        "$(EGU=mm)", "BADUNIT"]
+
+EXTRA_FIELDS = ["PREC", "HOPR", "LOPR", "HIHI", "LOLO", "HIGH", "LOW",
+                "MDEL", "ADEL", "FLNK", "SDIS", "DISV", "ASG", "PHAS"]
+
+INFOS = ["INTEREST", "archive", "autosaveFields", "log_alarm", "alarm"]
+
+DESCRIPTIONS = [
+    "Reads the record(ai) value",
+    "Setpoint # not a comment",
+    "Position of $(AXIS)",
+    "Temperature \\\"sensor\\\" 1",
+    "A description that is longer than forty characters",
+]
+
+# The start of each record definition, to give each copy of the fixture
+# its own PV names
+_RECORD_NAME = re.compile(r'(g?record\s*\(\s*\w+\s*,\s*")')
+
+
+def generate_db(seed=0, records=1000, fields=6, infos=2):
+    """
+    Generates the text of a synthetic db
+
+    Args:
+        seed: the seed, the same seed always gives the same text
+        records: the number of records
+        fields: the number of fields on each record, at least three
+        infos: the number of info tags on each record
+
+    Returns:
+        the text of the db
+    """
+    rand = random.Random(seed)
+    lines = ['# Generated db, seed {}\n'.format(seed),
+             '# record(ai, "$(P)COMMENTED") is not a record\n\n']
+    for i in range(records):
+        rec_type = rand.choice(RECORD_TYPES)
+        lines.append('record({}, "$(P){}REC{}") {{\n'.format(
+            rec_type, rand.choice(["", "${DEV}:", "$(SUB=X):"]), i))
+        lines.append('    field(DESC, "{}")\n'.format(
+            rand.choice(DESCRIPTIONS)))
+        lines.append('    field(EGU, "{}")\n'.format(rand.choice(EGUS)))
+        lines.append('    field(INP, "@asyn($(PORT),{},1) $(ADDR=0)")\n'
+                     .format(i % 8))
+        for name in rand.sample(EXTRA_FIELDS, min(max(fields - 3, 0),
+                                                  len(EXTRA_FIELDS))):
+            lines.append('    field({}, {})\n'.format(
+                name, rand.choice(['"1"', '"$(LIMIT=10)"', '0.5', 'YES'])))
+        for name in rand.sample(INFOS, min(infos, len(INFOS))):
+            lines.append('    info({}, "{}")\n'.format(
+                name, rand.choice(["HIGH", "VAL", "MEDIUM"])))
+        if rand.random() < 0.05:
+            lines.append('    alias("$(P)ALIAS{}")\n'.format(i))
+        lines.append('}\n\n')
+    return "".join(lines)
+
+
+def fixture_copy(text, copy):
+    """
+    Gives the records of a db unique PV names for a copy of it
+    """
+    return _RECORD_NAME.sub(r'\g<1>C{}:'.format(copy), text)
+
+
+def write_corpus(directory, files=100, records=200, seed=0, fixture=False):
+    """
+    Writes a corpus of db and template files, spread over subdirectories of
+    ten files each as the files of an IOC would be
+
+    Args:
+        directory: the directory to write to
+        files: the number of files
+        records: the number of records in each synthetic file
+        seed: the seed for the synthetic files
+        fixture: write copies of tests/test_all.db instead of synthetic
+            files
+
+    Returns:
+        the total size of the files written, in bytes
+    """
+    if fixture:
+        with open(FIXTURE) as _file:
+            template = _file.read()
+
+    total = 0
+    for i in range(files):
+        subdirectory = os.path.join(directory, "ioc{}".format(i // 10))
+        os.makedirs(subdirectory, exist_ok=True)
+        extension = ".template" if i % 3 == 0 else ".db"
+        text = fixture_copy(template, i) if fixture else \
+            generate_db(seed + i, records)
+        with open(os.path.join(subdirectory, "file{}{}".format(
+                i, extension)), "w") as _file:
+            _file.write(text)
+        total += len(text.encode("utf-8"))
+    return total
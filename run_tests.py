@@ -1,26 +1,35 @@
-import unittest
 import time
-import xmlrunner
+
+# when the checker started importing its modules, for --import_time
+_IMPORT_START = time.perf_counter()
+
 import argparse
 import sys
 import os
+from functools import partial
+
+from utils.ignore_rules import IgnoreRules, ALL_CHECKS, DEFAULT_RULES_PATH
+from utils.loader import find_files, given_files, parsed_file, prefetch
+from utils.pv_index import PvIndex, summarise
+from utils.walker import DirectoryWalker
 
-from tests.pv_unit_tests import TestPVUnits
-from utils.loader import parsed_files
+# The unittest runner, the PvUnit tests, the JUnit report and the modules of
+# the optional modes are imported where they are used, so that a run only
+# pays for importing what its output format and options need
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+
+IGNORE_RULES = IgnoreRules.load(DEFAULT_RULES_PATH)
 
 
 DEFAULT_DIRECTORY = os.path.join('..', '..', '..', 'test-reports')
 
+FILE_TYPES = ['.db', '.template']
 
-def set_up(directories):
-    """
-    This set up method generates parsed DB and template files.
-    @param directories: a list of directories passed to the tool
-    @returns parsed file: a single parsed db file 
-    """
-    for directory in directories:
-        for parsed_file in parsed_files(directory, ['.db', '.template']):
-            yield parsed_file
+SUBSTITUTIONS_TYPES = ['.substitutions']
+
+
+def _classname(test_class):
+    return "{}.{}".format(test_class.__module__, test_class.__name__)
 
 
 def run_own_unit_tests(xml_dir):
@@ -29,6 +38,8 @@ def run_own_unit_tests(xml_dir):
     @param xml_dir : output directory to pass the results to
     @returns : state of the tests True/False
     """
+    import unittest
+    import xmlrunner
 
     print("Running self-tests...")
     suite = unittest.TestLoader().discover(os.path.join("utils", "tests"))
@@ -36,45 +47,722 @@ def run_own_unit_tests(xml_dir):
         .run(suite).wasSuccessful()
 
 
-def run_system_tests(xml_dir, input_dir):
+def run_test_methods(tests):
+    """ Run tests directly rather than through a unittest runner, which is
+    all the PvUnit tests need as they have no tear down
+
+    @param tests : list of TestCase instances
+    @returns outcomes : list of (test name, outcome, message) tuples
+    """
+    import traceback
+    import unittest
+    from utils.results import PASSED, FAILED, ERROR, SKIPPED
+
+    outcomes = []
+    for test in tests:
+        name = test._testMethodName
+        try:
+            test.setUp()
+            getattr(test, name)()
+        except unittest.SkipTest as e:
+            outcomes.append((name, SKIPPED, str(e)))
+        except test.failureException as e:
+            outcomes.append((name, FAILED, str(e)))
+        except Exception:
+            outcomes.append((name, ERROR, traceback.format_exc()))
+        else:
+            outcomes.append((name, PASSED, None))
+    return outcomes
+
+
+def _run_tests(db, check_times=None):
+    """ Run the PvUnit tests on a parsed db
+
+    @param db : the parsed db
+    @param check_times : an optional dictionary which the seconds spent in
+        each check are added to
+    @returns outcomes : list of (test name, outcome, message) tuples
+    """
+    from tests.pv_unit_tests import TestPVUnits
+
+    return run_test_methods(TestPVUnits.for_db(db, check_times))
+
+
+def check_file(filename, cache=None, sniff_size=None, timings=None,
+               graph=None, prefetched=None, stat=None):
+    """ Parse a single file and run the PvUnit tests on it
+
+    @param filename : absolute path of the file to check
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition,
+        or None to search the whole file
+    @param timings : an optional dictionary to record the time spent on each
+        stage of checking the file in, as kept by Timings
+    @param graph : an optional IncludeGraph to load the file from, so the
+        tests are run on its records composed with those it includes
+    @param prefetched : the file as already read by a prefetch thread, if
+        it was
+    @param stat : the result of stat on the file, if already known
+    @returns result : None if the file is not an EPICS db, otherwise a
+        tuple of the list of (test name, outcome, message) tuples and the
+        summary of the db for the PV index, which is None if the file
+        cannot be parsed
+    """
+    try:
+        if graph is None:
+            own = db = parsed_file(filename, cache, sniff_size, timings,
+                                   prefetched, stat)
+        else:
+            own, db = graph.load_with_includes(filename)
+    except ValueError as e:
+        # reported in the suite of the file, so the other files are still
+        # checked
+        from utils.results import ERROR
+        return [("parse", ERROR, str(e))], None
+    if db is None:
+        return None
+    # the index only holds the records defined in the file itself, so
+    # included records are not reported as defined twice
+    if timings is None:
+        return _run_tests(db), summarise(own)
+
+    start = time.perf_counter()
+    timings["check_times"] = {}
+    outcomes = _run_tests(db, timings["check_times"])
+    timings["checks"] = time.perf_counter() - start
+    timings["records"] = len(db.records)
+    return outcomes, summarise(own)
+
+
+def timed_check_file(filename, **kwargs):
+    """ Check a single file, keeping the time spent on each stage
+
+    @param filename : absolute path of the file to check
+    @param kwargs : options passed on to check_file
+    @returns result : a tuple of the result of check_file and the timings
+    """
+    timings = {}
+    return check_file(filename, timings=timings, **kwargs), timings
+
+
+def include_graph(filenames, cache=None, sniff_size=None):
+    """ Build the graph of the includes between files, reporting any
+    included file that cannot be found
+
+    @param filenames : absolute paths of the scanned files
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition
+    @returns graph : the IncludeGraph
+    """
+    from utils.include_graph import IncludeGraph
+
+    graph = IncludeGraph(filenames, partial(
+        parsed_file, cache=cache, sniff_size=sniff_size))
+    for includer, name in graph.missing:
+        print("Cannot find {} included by {}".format(name, includer))
+    return graph
+
+
+def _without_ignored(filenames):
+    """ Drop the files that every check is skipped on by the ignore rules
+
+    @param filenames : absolute paths of candidate files
+    @returns filenames : the paths of the files to check
+    """
+    for filename in filenames:
+        if not IGNORE_RULES.skips_all(filename):
+            yield filename
+
+
+def _check_with_stat(worker, filename, stat):
+    return worker(filename, stat=stat)
+
+
+def _check_files(filenames, jobs=1, cache=None, sniff_size=None,
+                 timings=None, graph=None, io_threads=0, stats=None):
+    """ Check files, across a process pool if more than one job is given
+
+    @param filenames : absolute paths of the files to check
+    @param jobs : number of worker processes, ignored with a graph as the
+        graph keeps the files it has parsed in this process
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition
+    @param timings : an optional Timings to add the timings of each file to
+    @param graph : an optional IncludeGraph to compose included files with
+    @param io_threads : number of threads to read files ahead of parsing
+        them with when checking in this process, or 0 to read each file as
+        it is parsed
+    @param stats : an optional dictionary of the stat results of the files
+        as kept by find_files, each of which is used and dropped as its file
+        is checked
+    @returns results : (filename, result) tuples in the order given
+    """
+    stats = stats if stats is not None else {}
+    worker = partial(check_file if timings is None else timed_check_file,
+                     cache=cache, sniff_size=sniff_size, graph=graph)
+    if jobs > 1 and graph is None:
+        filenames = list(filenames)
+        chunksize = max(1, len(filenames) // (jobs * 8))
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = zip(filenames, executor.map(
+            partial(_check_with_stat, worker), filenames,
+            [stats.pop(filename, None) for filename in filenames],
+            chunksize=chunksize))
+    elif io_threads > 0 and graph is None:
+        # each worker process already overlaps its reads with the other
+        # workers, so files are only read ahead when checking in-process
+        executor = None
+        results = ((filename, worker(filename, prefetched=fetched))
+                   for filename, fetched in prefetch(filenames, io_threads,
+                                                     cache, stats=stats))
+    else:
+        executor = None
+        results = ((filename, worker(filename,
+                                     stat=stats.pop(filename, None)))
+                   for filename in filenames)
+
+    try:
+        for filename, result in results:
+            if timings is not None:
+                result, file_timings = result
+                timings.add(filename, file_timings)
+            yield filename, result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _incremental_results(input_dir, baseline_path, jobs, cache, changed,
+                          since, sniff_size=None, timings=None,
+                          includes=False, io_threads=0, walker=None):
+    """ Check only the files that changed since the baseline was saved
+
+    @param input_dir : input directories of DB files
+    @param baseline_path : file the results of the last run are kept in
+    @param jobs : number of processes to check files with
+    @param cache : an optional ParseCache to take unchanged files from
+    @param changed : list of changed files, or None
+    @param since : git ref to find changed files from, or None
+    @param sniff_size : number of bytes to search for a record definition
+    @param timings : an optional Timings to add the timings of each checked
+        file to
+    @param includes : compose each file with the files it includes, and
+        check the files including a changed file again
+    @param io_threads : number of threads to read files ahead of parsing
+        them with
+    @param walker : an optional DirectoryWalker to find files with
+    @returns results : (filename, result) tuples for every file
+    """
+    from utils.incremental import Baseline, changed_files_since, \
+        checks_key, files_to_check
+
+    key = checks_key(DEFAULT_RULES_PATH, {"includes": includes,
+                                          "sniff_size": sniff_size})
+    baseline = Baseline.load(baseline_path, key)
+    # the stat of each file taken before it is read is recorded with its
+    # result, as the parse cache does
+    stats = {}
+    if baseline is None:
+        print("No baseline found for these checks, checking all files...")
+        baseline = Baseline(key=key)
+        to_check = list(find_files(input_dir, FILE_TYPES, walker, stats))
+        removed = []
+    else:
+        scan_dirs = []
+        if since is not None:
+            changed, scan_dirs = changed_files_since(since, input_dir)
+            for directory in scan_dirs:
+                print("Cannot compare {} with {}, using modification "
+                      "times".format(directory, since))
+        elif changed is None:
+            scan_dirs = input_dir
+        to_check, removed = files_to_check(
+            baseline, input_dir, FILE_TYPES, changed or (), scan_dirs,
+            walker, stats)
+
+    # files every check is skipped on are never read, and are dropped from
+    # the baseline if a rule was added since it was saved
+    to_check = list(_without_ignored(to_check))
+    removed = sorted(set(removed).union(
+        filename for filename in baseline.files
+        if IGNORE_RULES.skips_all(filename)))
+
+    graph = None
+    if includes:
+        filenames = list(_without_ignored(
+            find_files(input_dir, FILE_TYPES, walker, stats)))
+        graph = include_graph(filenames, cache, sniff_size)
+        to_check = sorted(set(to_check).union(
+            graph.dependents(to_check + removed) & set(filenames)))
+
+    print("Checking {} changed files, {} removed, {} in baseline".format(
+        len(to_check), len(removed), len(baseline.files)))
+
+    for filename in removed:
+        baseline.remove(filename)
+    for filename, result in _check_files(to_check, jobs, cache, sniff_size,
+                                         timings, graph, io_threads,
+                                         dict(stats)):
+        baseline.update(filename, result, stats[filename])
+
+    baseline.save(baseline_path)
+    return baseline.results()
+
+
+def _resolve_template(template, substitutions_file, templates):
+    """ Find the template loaded by a substitutions file
+
+    @param template : the name of the template in the substitutions file
+    @param substitutions_file : absolute path of the substitutions file
+    @param templates : dictionary of file name to the path of each db and
+        template found in the input directories
+    @returns path : the absolute path of the template, or None if not found
+    """
+    path = os.path.join(os.path.dirname(substitutions_file), template)
+    if os.path.isfile(path):
+        return os.path.abspath(path)
+    # names are often given relative to a macro such as $(TOP)
+    return templates.get(os.path.basename(template))
+
+
+def substitution_results(input_dir, cache=None, graph=None, walker=None):
+    """ Expand the templates loaded by each substitutions file with each of
+    their sets of macros, and run the PvUnit tests on every instance
+
+    @param input_dir : input directories to find substitutions files in
+    @param cache : an optional ParseCache to take unchanged templates from
+    @param graph : an optional IncludeGraph to compose templates with the
+        files they include
+    @param walker : an optional DirectoryWalker to find files with
+    @returns results : (suite name, outcomes) tuples, one per instance
+    """
+    from utils.macros import TemplateExpander
+    from utils.results import ERROR
+    from utils.substitutions import parse_substitutions
+
+    templates = {}
+    for filename in find_files(input_dir, FILE_TYPES, walker):
+        templates.setdefault(os.path.basename(filename), filename)
+    expander = TemplateExpander(partial(parsed_file, cache=cache)
+                                if graph is None else graph.composed)
+
+    for filename in _without_ignored(
+            find_files(input_dir, SUBSTITUTIONS_TYPES, walker)):
+        with open(filename) as _file:
+            text = _file.read()
+        try:
+            entries = parse_substitutions(text)
+        except ValueError as e:
+            yield filename, [("parse", ERROR, "Failed to parse substitutions "
+                              "'{}'. Exception was: {}".format(filename, e))]
+            continue
+
+        for template, instances in entries:
+            path = _resolve_template(template, filename, templates)
+            if path is None:
+                print("Cannot find template {} loaded by {}".format(
+                    template, filename))
+                continue
+            for macros in instances:
+                name = "{} ({}) from {}".format(path, ",".join(
+                    "{}={}".format(*item)
+                    for item in sorted(macros.items())), filename)
+                try:
+                    db = expander.expand(path, macros)
+                except ValueError as e:
+                    yield name, [("parse", ERROR, str(e))]
+                    continue
+                if db is not None:
+                    yield name, _run_tests(db)
+
+
+def cross_file_tests(index, directories=None):
+    """ Build the tests that span the files of each directory
+
+    @param index : the PvIndex of all the files checked
+    @param directories : the directories to build the tests of, or None for
+        every directory with more than one file
+    @returns tests : list of (directory, list of TestCrossFilePVs instances)
+        tuples
+    """
+    import unittest
+    from tests.pv_unit_tests import TestCrossFilePVs
+
+    names = unittest.TestLoader().getTestCaseNames(TestCrossFilePVs)
+    duplicates = index.duplicates(directories)
+    return [(directory, [TestCrossFilePVs(
+                name, directory, duplicates.get(directory, []),
+                index.log_entries(directory)) for name in names])
+            for directory in index.directories()
+            if directories is None or directory in directories]
+
+
+def run_system_tests(xml_dir, input_dir, jobs=1, cache=None,
+                     baseline=None, changed=None, since=None,
+                     sniff_size=None, timings=None, substitutions=False,
+                     includes=False, io_threads=0, walker=None):
     """ Run PvUnit tests on the input directories
 
     @param xml_dir : output directory to pass the results to
     @param input_dir : input directory of DB files.
+    @param jobs : number of processes to check files with
+    @param cache : an optional ParseCache to take unchanged files from
+    @param baseline : file to keep the results in between runs, so that
+        only changed files are checked, or None to check every file
+    @param changed : list of files changed since the baseline was saved,
+        or None to find them from modification times
+    @param since : git ref the baseline was saved at, to find changed
+        files with git
+    @param sniff_size : number of bytes at the start of each file to search
+        for a record definition, or None to search the whole file
+    @param timings : an optional Timings to keep the time spent on each file
+        in
+    @param substitutions : also check each instance of the templates loaded
+        by substitutions files, with its macros expanded
+    @param includes : check each file composed with the files it includes
+    @param io_threads : number of threads to read files ahead of parsing
+        them with, when checking with a single process
+    @param walker : an optional DirectoryWalker to find files with, which
+        decides the directories skipped and keeps the duplicates skipped
     @returns sccess : state of the tests True/False
     """
+    from tests.pv_unit_tests import TestPVUnits, TestCrossFilePVs
+    from utils.results import JUnitWriter, ResultCollector
 
     start = time.time()
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-
-    print("Scanning files...")
-    for db in set_up(input_dir):
-        suite.addTests([TestPVUnits(test, db) for test in
-                        loader.getTestCaseNames(TestPVUnits)])
+    index = PvIndex()
+    walker = walker if walker is not None else DirectoryWalker()
+    os.makedirs(xml_dir, exist_ok=True)
+    report = os.path.join(xml_dir, "TEST-{}-{}.xml".format(
+        TestPVUnits.__module__, time.strftime("%Y%m%d%H%M%S")))
 
     print("Beginning PV unit tests...")
+    with JUnitWriter(report) as writer:
+        collector = ResultCollector(writer)
+        # only the outcomes and summary of each file are kept, and they are
+        # written to the report as each file completes, so each parsed db
+        # is released as soon as it has been checked
+        graph = None
+        if baseline is not None:
+            results = _incremental_results(
+                input_dir, baseline, jobs, cache, changed, since, sniff_size,
+                timings, includes, io_threads, walker)
+        else:
+            stats = {}
+            filenames = _without_ignored(
+                find_files(input_dir, FILE_TYPES, walker, stats))
+            if includes:
+                filenames = list(filenames)
+                graph = include_graph(filenames, cache, sniff_size)
+            results = _check_files(filenames, jobs, cache, sniff_size,
+                                   timings, graph, io_threads, stats)
+        for filename, result in results:
+            if result is not None:
+                outcomes, summary = result
+                collector.add(filename, _classname(TestPVUnits), outcomes)
+                if summary is not None:
+                    index.add_summary(filename, summary)
+
+        if substitutions:
+            for name, outcomes in substitution_results(input_dir, cache,
+                                                       graph, walker):
+                collector.add(name, _classname(TestPVUnits), outcomes)
 
-    success = xmlrunner.XMLTestRunner(output=xml_dir).run(suite).wasSuccessful()
+        for directory, tests in cross_file_tests(index):
+            suite_start = time.perf_counter()
+            outcomes = run_test_methods(tests)
+            collector.add(directory, _classname(TestCrossFilePVs), outcomes,
+                          time.perf_counter() - suite_start)
+        collector.summarise()
+
+    if cache is not None:
+        print("Evicted {} stale entries from the parse cache".format(
+            cache.evict_missing()))
+    for directory, outer in sorted(walker.nested):
+        print("Skipped input directory {} as it is within {}".format(
+            directory, outer))
+    if walker.duplicates:
+        print("Skipped {} duplicate paths to files already checked".format(
+            len(walker.duplicates)))
+    if walker.manifest is not None:
+        walker.save()
+        print("Reused the listing of {} unchanged directories".format(
+            walker.manifest.reused))
 
     print(
         "PV unit tests complete (Took {:.3f} sec)".format(time.time() - start)
     )
 
-    return success
+    return collector.was_successful()
 
 
-def run_all_tests(xml_dir, input_dir):
-    """ Run all unit tests on db_checks and db_parser
+def _failure_lines(outcomes):
+    """ Split the failures of a suite into one line per failing item, so
+    that a change to one item of a failure is reported as that item
+
+    @param outcomes : list of (test name, outcome, message) tuples
+    @returns lines : set of (test name, line) tuples
+    """
+    from utils.results import FAILED, ERROR
+
+    lines = set()
+    for name, outcome, message in outcomes:
+        if outcome not in (FAILED, ERROR):
+            continue
+        message = message.rstrip()
+        items = [line.strip() for line in message.splitlines()
+                 if line.startswith("   -> ")]
+        if not items:
+            items = [message.splitlines()[-1] if outcome == ERROR
+                     else message.splitlines()[0]]
+        lines.update((name, item) for item in items)
+    return lines
+
+
+def _print_delta(suite, before, after):
+    """ Print the failures of a suite that are new and that are resolved
+
+    @returns counts : a tuple of the number of new and resolved failures
+    """
+    for name, line in sorted(after - before):
+        print("+ {} {}: {}".format(suite, name, line))
+    for name, line in sorted(before - after):
+        print("- {} {}: {}".format(suite, name, line))
+    return len(after - before), len(before - after)
+
+
+def watch(input_dir, interval=0.5, cache=None, sniff_size=None,
+          walker=None, polls=None):
+    """ Check every file once, then keep checking the files that change,
+    printing only the failures that are new or resolved by each change
+
+    The outcomes of each file and the PV index are kept in memory, so a
+    change only re-parses and re-checks the changed files, and re-runs the
+    cross file tests of their directories.
+
+    @param input_dir : input directories of DB files
+    @param interval : seconds between polls of the directories
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition
+    @param walker : an optional DirectoryWalker to find files with
+    @param polls : number of polls to make, or None to watch until
+        interrupted
+    """
+    from utils.results import ERROR
+    from utils.watcher import PollingWatcher
+
+    watcher = PollingWatcher(input_dir, FILE_TYPES, walker)
+    index = PvIndex()
+    failing = {}
+
+    def update(changed, removed):
+        start = time.perf_counter()
+        suites = {}
+        unparsed = set()
+        for filename in removed:
+            index.remove(filename)
+            suites[filename] = []
+        for filename in _without_ignored(changed):
+            try:
+                result = check_file(filename, cache, sniff_size)
+            except OSError as e:
+                # removed since the poll, which the next poll reports
+                index.remove(filename)
+                suites[filename] = [("parse", ERROR, str(e))]
+                continue
+            if result is None:
+                index.remove(filename)
+                suites[filename] = []
+                continue
+            outcomes, summary = result
+            # a file saved part way through an edit cannot be parsed, and
+            # the records last parsed are kept in the index until it can
+            if summary is not None:
+                index.remove(filename)
+                index.add_summary(filename, summary)
+            else:
+                unparsed.add(filename)
+            suites[filename] = outcomes
+        directories = {os.path.dirname(f) for f in list(changed) + removed}
+        for directory in directories:
+            suites[directory] = []
+        for directory, tests in cross_file_tests(index, directories):
+            suites[directory] = run_test_methods(tests)
+
+        new = resolved = unknown = 0
+        for suite, outcomes in sorted(suites.items()):
+            before = failing.get(suite, set())
+            after = _failure_lines(outcomes)
+            if suite in unparsed:
+                # the failures found before the file stopped parsing can no
+                # longer be checked, so they are kept until it parses again
+                kept = {line for line in before if line[0] != "parse"}
+                for name, line in sorted(kept):
+                    print("? {} {}: {}".format(suite, name, line))
+                unknown += len(kept)
+                after |= kept
+            counts = _print_delta(suite, before, after)
+            new, resolved = new + counts[0], resolved + counts[1]
+            if after:
+                failing[suite] = after
+            else:
+                failing.pop(suite, None)
+        print("{} new, {} resolved, {} unknown, {} failing in total "
+              "(took {:.0f} ms)".format(
+                  new, resolved, unknown, sum(map(len, failing.values())),
+                  (time.perf_counter() - start) * 1000))
+
+    print("Watching {} files, press Ctrl+C to stop...".format(
+        len(watcher.files())))
+    update(watcher.files(), [])
+    try:
+        for changed, removed in watcher.wait(interval, polls):
+            update(changed, removed)
+    except KeyboardInterrupt:
+        pass
+
+
+def _shown(path, relative):
+    """ The path to print for a failure, relative to the working directory
+    when asked for and below it
+    """
+    if not relative:
+        return path
+    try:
+        shown = os.path.relpath(path)
+    except ValueError:
+        # on a different drive
+        return path
+    return path if shown.startswith(os.pardir) else shown
+
+
+def find_failures(filenames, cache=None, sniff_size=None, io_threads=0,
+                  counts=None, stats=None):
+    """ Generator of the failures of the checks on files, run without the
+    unittest runner
+
+    @param filenames : absolute paths of the files to check
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition
+    @param io_threads : number of threads to read files ahead of parsing
+        them with
+    @param counts : an optional dictionary to keep the number of files
+        checked in, under "files"
+    @param stats : an optional dictionary of the stat results of the files
+        as kept by find_files
+    @yields failure : each Failure, those of each file once it is checked
+        and then those across the files of each directory
+    """
+    from utils import db_checks
+    from utils.failures import Failure
+
+    filenames = _without_ignored(filenames)
+    stats = stats if stats is not None else {}
+    fetched = prefetch(filenames, io_threads, cache, stats=stats) \
+        if io_threads > 0 else ((filename, None) for filename in filenames)
+    counts = counts if counts is not None else {}
+    counts["files"] = 0
+    index = PvIndex()
+    checks = list(db_checks.RULES.rules)
+    for filename, prefetched in fetched:
+        try:
+            db = parsed_file(filename, cache, sniff_size,
+                             prefetched=prefetched,
+                             stat=stats.pop(filename, None))
+        except ValueError as e:
+            counts["files"] += 1
+            yield Failure("{error}", params={"error": str(e)}, check="parse",
+                          file=filename)
+            continue
+        if db is None:
+            continue
+        counts["files"] += 1
+        index.add_summary(filename, summarise(db))
+        skipped = IGNORE_RULES.skipped_checks(filename, checks)
+        results = db_checks.run_checks(
+            db, [check for check in checks if check not in skipped])
+        for failures in results.values():
+            yield from failures
+
+    # the ignore rules name the checks across files by their tests
+    duplicates = index.duplicates()
+    for directory in index.directories():
+        skips = IGNORE_RULES.skips(directory)
+        if ALL_CHECKS in skips:
+            continue
+        if "test_multiple_pvs_across_files_warning" not in skips:
+            yield from db_checks.get_multiple_instances_across_files(
+                duplicates.get(directory, []), directory)
+        if "test_log_info_tags_across_files" not in skips:
+            yield from db_checks.get_log_info_tags_across_files(
+                index.log_entries(directory))
+
+
+def report_failures(filenames, output_format="text", cache=None,
+                    sniff_size=None, io_threads=0, stream=sys.stdout,
+                    terse=False, stats=None):
+    """ Run the checks on files without the unittest runner, writing the
+    failures as text, JSON lines or a SARIF log
+
+    @param filenames : absolute paths of the files to check
+    @param output_format : "text" for a line per failure and a summary,
+        "jsonl" for a JSON object per failure or "sarif" for a SARIF log
+    @param cache : an optional ParseCache to take unchanged files from
+    @param sniff_size : number of bytes to search for a record definition
+    @param io_threads : number of threads to read files ahead of parsing
+        them with
+    @param stream : the stream to write the failures to
+    @param terse : whether to print paths relative to the working directory
+        and leave out the summary when there are no failures, for text
+    @param stats : an optional dictionary of the stat results of the files
+        as kept by find_files
+    @returns success : True if there were no failures
+    """
+    from utils.failures import sarif_log, write_jsonl
+
+    counts = {}
+    failures = find_failures(filenames, cache, sniff_size, io_threads,
+                             counts, stats)
+    if output_format == "jsonl":
+        return write_jsonl(failures, stream) == 0
+    if output_format == "sarif":
+        import json
+        from utils.db_checks import RULES
+
+        failures = list(failures)
+        json.dump(sarif_log(failures, list(RULES.rules)), stream, indent=2)
+        stream.write("\n")
+        return not failures
+
+    found = 0
+    for failure in failures:
+        where = _shown(failure.file, terse)
+        if failure.line is not None:
+            where = "{}:{}".format(where, failure.line)
+        stream.write("{}: {}: {}\n".format(where, failure.check,
+                                           failure.message))
+        found += 1
+    if found or not terse:
+        stream.write("{} failures in {} files\n".format(found,
+                                                       counts["files"]))
+    return found == 0
+
+
+def run_all_tests(xml_dir, input_dir, self_tests=False, **kwargs):
+    """ Run the PvUnit tests, and optionally first the unit tests on
+    db_checks and db_parser
 
     @param xml_dir : output directory to pass the results to
+    @param input_dir : input directories of DB files
+    @param self_tests : whether to run the unit tests of the checker first
+    @param kwargs : options passed on to run_system_tests
     @returns : state of the tests True/False
     """
-    
-    if not run_own_unit_tests(xml_dir):
+    if self_tests and not run_own_unit_tests(xml_dir):
         return False
-    
-    return run_system_tests(xml_dir, input_dir)
+
+    return run_system_tests(xml_dir, input_dir, **kwargs)
 
 
 def main():
@@ -94,10 +782,215 @@ def main():
         '-i', '--input_dir', nargs='+', type=str, default=default_dirs,
         help='The input directories to look for db files within'
     )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='The number of processes to check files with, 0 for one per CPU'
+    )
+    parser.add_argument(
+        '--cache_dir', type=str, default=None,
+        help='A directory to cache parsed files in between runs'
+    )
+    parser.add_argument(
+        '--cache_hash', action='store_true',
+        help='Compare file contents when a cached file has been touched'
+    )
+    parser.add_argument(
+        '--baseline', type=str, default=None,
+        help='A file to keep results in between runs, so that only changed '
+             'files are checked. Changes are found from modification times '
+             'unless --changed_files or --since is given. The results are '
+             'discarded when the checker, the ignore rules, --includes or '
+             '--sniff_size change'
+    )
+    changes = parser.add_mutually_exclusive_group()
+    changes.add_argument(
+        '--changed_files', type=str, default=None,
+        help='A file listing the files changed since the baseline was '
+             'saved, one per line, or - to read the list from stdin'
+    )
+    changes.add_argument(
+        '--since', type=str, default=None,
+        help='The git ref the baseline was saved at, changed files are '
+             'found with git diff'
+    )
+    parser.add_argument(
+        '--sniff_size', type=int, default=None,
+        help='Only treat files as EPICS dbs if a record is defined within '
+             'this many bytes of the start, rather than searching the whole '
+             'file'
+    )
+    parser.add_argument(
+        '--timings_json', type=str, default=None,
+        help='A file to save the time spent reading, parsing and checking '
+             'each file to, as JSON'
+    )
+    parser.add_argument(
+        '--slowest', type=int, default=0,
+        help='Report this many of the slowest files, directories and checks'
+    )
+    parser.add_argument(
+        '--profile', type=str, default=None,
+        help='A file to save a cProfile dump of the run to. Only the main '
+             'process is profiled, so use with -j 1'
+    )
+    parser.add_argument(
+        '--substitutions', action='store_true',
+        help='Also check every instance of the templates loaded by '
+             'substitutions files, with the macros of each instance expanded'
+    )
+    parser.add_argument(
+        '--includes', action='store_true',
+        help='Check each file together with the records of the files it '
+             'includes. Files are then checked in a single process'
+    )
+    parser.add_argument(
+        '--io_threads', type=int, default=0,
+        help='The number of threads to read files ahead of the parser with, '
+             'for slow or network file systems. Used with -j 1 only'
+    )
+    parser.add_argument(
+        '--prune_dirs', nargs='+', type=str, default=(),
+        help='Glob patterns of the names of directories to skip, as well as '
+             'the directories that are always skipped'
+    )
+    parser.add_argument(
+        '--walk_manifest', type=str, default=None,
+        help='A file to keep the listing of each directory in between runs, '
+             'so that unchanged directories are not listed again'
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='Keep checking the input directories, re-checking files as '
+             'they change and printing only the failures that are new or '
+             'resolved. No report is written'
+    )
+    parser.add_argument(
+        '--watch_interval', type=float, default=0.5,
+        help='The seconds between checks of the input directories for '
+             'changes in watch mode'
+    )
+    parser.add_argument(
+        'files', nargs='*', type=str,
+        help='Files to check instead of searching the input directories, '
+             'such as the files staged for a commit. Files of other types '
+             'are left out, and the failures are printed as text. Give '
+             'the files after -- when -i is used.'
+    )
+    parser.add_argument(
+        '--files_from', type=str, default=None,
+        help='A file listing the files to check, one per line or '
+             'separated by NUL characters as given by git diff -z, or - '
+             'to read the list from stdin'
+    )
+    parser.add_argument(
+        '--output_format', choices=['junit', 'text', 'jsonl', 'sarif'],
+        default=None,
+        help='junit runs the checks as unit tests and writes a JUnit XML '
+             'report. The other formats check files in a single process '
+             'without loading the unittest runner and write to stdout: text '
+             'prints one line per failure, jsonl one JSON object per '
+             'failure and sarif a SARIF log for code scanning tools. '
+             'Defaults to text when files are given, junit otherwise.'
+    )
+    parser.add_argument(
+        '--self_tests', action='store_true',
+        help='Run the unit tests of the checker itself before the checks'
+    )
+    parser.add_argument(
+        '--import_time', action='store_true',
+        help='Report the time spent importing the modules of the checker'
+    )
     args = parser.parse_args()
 
+    if args.baseline is None and \
+            (args.changed_files is not None or args.since is not None):
+        parser.error("--changed_files and --since require --baseline")
+    given = args.files or args.files_from is not None
+    for directory in args.input_dir:
+        if os.path.isfile(directory):
+            parser.error("{} is not a directory, files given after -i must "
+                         "follow --".format(directory))
+    for filename in args.files:
+        if not os.path.isfile(filename):
+            parser.error("{} is not a file to check, files given after -i "
+                         "must follow --".format(filename))
+    if args.output_format is None:
+        args.output_format = 'text' if given else 'junit'
+    if args.watch and (args.baseline is not None or args.substitutions or
+                       args.includes):
+        parser.error("--baseline, --substitutions and --includes cannot "
+                     "be used with --watch")
+    if given and (args.output_format == 'junit' or args.watch):
+        parser.error("Files given to check cannot be reported with "
+                     "--output_format junit, or watched")
+    if args.output_format != 'junit' and (
+            args.baseline is not None or args.substitutions or
+            args.includes or args.self_tests):
+        parser.error("--baseline, --substitutions, --includes and "
+                     "--self_tests need --output_format junit")
+
+    if args.import_time:
+        print("Imported the checker in {:.1f} ms".format(
+            _IMPORT_SECONDS * 1000))
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    cache = None
+    if args.cache_dir is not None:
+        from utils.parse_cache import ParseCache
+        cache = ParseCache(args.cache_dir, use_hash=args.cache_hash)
+    changed = None
+    if args.changed_files is not None:
+        from utils.incremental import read_file_list
+        changed = read_file_list(args.changed_files)
+    timings = None
+    if args.timings_json is not None or args.slowest > 0:
+        from utils.timings import Timings
+        timings = Timings()
+    profiler = None
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+    walker = DirectoryWalker(globs=args.prune_dirs,
+                             manifest=args.walk_manifest)
     xml_dir = args.output_dir[0]
-    success = run_all_tests(xml_dir, args.input_dir)
+    if args.watch:
+        watch(args.input_dir, args.watch_interval, cache, args.sniff_size,
+              walker)
+        return
+    if given:
+        filenames = list(args.files)
+        if args.files_from is not None:
+            from utils.incremental import read_file_list
+            filenames.extend(read_file_list(args.files_from))
+        run = partial(report_failures,
+                      given_files(filenames, FILE_TYPES, walker),
+                      args.output_format, cache, args.sniff_size,
+                      args.io_threads, terse=True)
+    elif args.output_format != 'junit':
+        stats = {}
+        run = partial(report_failures,
+                      find_files(args.input_dir, FILE_TYPES, walker, stats),
+                      args.output_format, cache, args.sniff_size,
+                      args.io_threads, stats=stats)
+    else:
+        run = partial(run_all_tests, xml_dir, args.input_dir,
+                      self_tests=args.self_tests, jobs=jobs, cache=cache,
+                      baseline=args.baseline, changed=changed,
+                      since=args.since, sniff_size=args.sniff_size,
+                      timings=timings, substitutions=args.substitutions,
+                      includes=args.includes, io_threads=args.io_threads,
+                      walker=walker)
+    success = run() if profiler is None else profiler.runcall(run)
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+    if timings is not None:
+        if args.slowest > 0:
+            timings.report(args.slowest)
+        if args.timings_json is not None:
+            timings.save(args.timings_json)
+    if args.import_time:
+        print("{} modules were loaded in total".format(len(sys.modules)))
     sys.exit(0 if success else 1)
 
 
@@ -1 +1 @@
-%python3% run_tests.py -o ./tests -i ./tests
+%python3% run_tests.py -o ./tests -i ./tests --self_tests
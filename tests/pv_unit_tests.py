@@ -1,47 +1,71 @@
 import unittest
 from utils import db_checks
+from utils.ignore_rules import IgnoreRules, ALL_CHECKS, DEFAULT_RULES_PATH
 
 
-def ignore(dbs, message):
+IGNORE_RULES = IgnoreRules.load(DEFAULT_RULES_PATH)
+
+
+class _IgnorableTestCase(unittest.TestCase):
     """
-    Decorator to skip tests on certain DBs or paths
-    Args:
-        dbs: DBs or paths to skip on.
-        message: skip message
+    Test case which skips itself when an ignore rule applies to its path
     """
-    def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            if any(db in self.db.directory for db in dbs):
-                self.skipTest(message)
-            func(self, *args, **kwargs)
-        return wrapper
-    return decorator
+    skips = None
+
+    def setUp(self):
+        if self.skips is None:
+            self.skips = IGNORE_RULES.skips(self.path)
+        reason = self.skips.get(self._testMethodName,
+                                self.skips.get(ALL_CHECKS))
+        if reason is not None:
+            self.skipTest(reason)
 
 
-class TestPVUnits(unittest.TestCase):
+class TestPVUnits(_IgnorableTestCase):
 
-    def __init__(self, methodName, db=None):
+    def __init__(self, methodName, db=None, results=None, skips=None):
         super(TestPVUnits, self).__init__(methodName=methodName)
         self.db = db
+        self.results = results
+        self.skips = skips
+
+    @classmethod
+    def for_db(cls, db, timings=None):
+        """
+        Creates every test for a db, sharing the results of a single run of
+        all the checks over its records
+
+        Args:
+            db: the parsed db
+            timings: an optional dictionary which the seconds spent in each
+                check are added to
+        """
+        results = db_checks.run_checks(db, timings=timings)
+        skips = IGNORE_RULES.skips(db.directory)
+        return [cls(test, db, results, skips) for test in
+                unittest.TestLoader().getTestCaseNames(cls)]
+
+    @property
+    def path(self):
+        return self.db.directory
+
+    def _failures(self, check):
+        """
+        Returns the failures of a check, running it if it was not run with
+        the other checks for the db
+        """
+        if self.results is None:
+            self.results = {}
+        if check not in self.results:
+            self.results.update(db_checks.run_checks(self.db, [check]))
+        return self.results[check]
 
-    @ignore(
-        ["superlogics.db", "lakeshore336.db", "motor.db"],
-        "Historical failures have not been addressed"
-    )
-    @ignore(["EPICS_V4"], "Vendor-supplied DBs")
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
-    @ignore(
-        ["channel_access_test.template"],
-        "Too complicated for DbUnitChecker to understand"
-    )
     def test_multiple_pvs_warning(self):
         """
         This method warns if there are multiple PVs with the same name
         in the project
         """
-        failures = db_checks.get_multiple_instances(self.db)
+        failures = self._failures("multiple_instances")
         self.assertEqual(
             len(failures), 0,
             msg=db_checks.build_failure_message(
@@ -50,54 +74,19 @@ class TestPVUnits(unittest.TestCase):
             )
         )
 
-    @ignore(
-        ["MercurySPCAvailable.db"],
-        "Used to set on or off commented out by macro"
-    )
-    @ignore([
-        "moxa1210_aliases.db",
-        "moxa12XX_aliases.db",
-        "separator_voltage.db",
-        "separator_current.db",
-        "isActiveEurothrm.db",
-        "tpgx6x.template",
-        "tpg36x.db",
-        "tpg26x.db",
-        "Lakeshore340.db",
-        "zfmagfld_axes.template",
-        "zfmagfld_cdaq_data.db",
-        "zfmagfld_cdaq_data.template",
-        "zfmagfld_axes.db",
-        "zfmagfld_extra_axis.db",
-    ], "Mutually exclusive guards prevent this from ever happening")
-    @ignore(["optics", "danfysikMps8000"], "Vendor-supplied DBs")
-    @ignore(
-        ["Mezflipr_common_v1.db"],
-        "Complex macro guards cannot be understood by DbUnitChecker."
-    )
-    @ignore(
-        ["axisUtil.db", "motorUtil.db"],
-        "Complex macro guards cannot be understood by DbUnitChecker."
-    )
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_multiple_properties_on_pvs(self):
         """
         This method checks that interesting PVs have units
         """
-        failures = db_checks.get_multiple_properties_on_pvs(self.db)
+        failures = self._failures("multiple_properties_on_pvs")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Multiple fields on PVs in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_interest_units(self):
         """
         This method checks that interesting PVs have units
         """
-        failures = db_checks.get_interest_units(self.db)
+        failures = self._failures("interest_units")
         self.assertEqual(
             len(failures), 0,
             msg=db_checks.build_failure_message(
@@ -106,84 +95,90 @@ class TestPVUnits(unittest.TestCase):
             )
         )
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
-    @ignore(
-        ["jsco4180.db"], "Complex calc record sequences not understood properly"
-    )
     def test_interest_calc_readonly(self):
         """
         This method checks that interesting PVs that are calc fields are set to
         readonly
         """
-        failures = db_checks.get_interest_calc_readonly(self.db)
+        failures = self._failures("interest_calc_readonly")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Writable calc records in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_desc_length(self):
         """
         This method checks that the description length on all PVs is no longer
         than 40 chars
         """
-        failures = db_checks.get_desc_length(self.db)
+        failures = self._failures("desc_length")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Description too long in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["optics", "CALab", "danfysikMps8000", "EPICS_V4"],
-        "Vendor-supplied DBs"
-    )
-    @ignore(["ether_ip", "seq"], "Vendor-supplied DBs")
-    @ignore(["qepro.template"], "Historical failures not addressed")
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_units_valid(self):
         """
         This method loops through all found records and finds the unique units.
         It then checks these units are standard
         """
-        failures = db_checks.get_units_valid(self.db)     
+        failures = self._failures("units_valid")     
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Invalid units in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_interest_descriptions(self):
         """
         This method checks all records marked as interesting for
         description fields
         """
-        failures = db_checks.get_interest_descriptions(self.db)
+        failures = self._failures("interest_descriptions")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Missing description in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
-    @ignore(["HVCAENx527ch.db"], "These are externally provided DBs")
     def test_interest_syntax(self):
         """
         This method tests that all interesting PVs that are not in the names
         exception list are capitalised and contain only A-Z 0-9 _ :
         """
-        failures = db_checks.get_interest_syntax(self.db)
+        failures = self._failures("interest_syntax")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
              "PV syntax incorrect in {}".format(self.db.directory), failures))
 
-    @ignore(
-        ["DbUnitChecker"], "Contains integration tests which deliberately fail"
-    )
     def test_log_info_tags(self):
         """
         This method checks logging records to check that logging tags are
         not repeated and that the period is not defined in two ways.
         """
-        failures = db_checks.get_log_info_tags(self.db)
+        failures = self._failures("log_info_tags")
         self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
             "Duplicated log infos in {}".format(self.db.directory), failures))
+
+
+class TestCrossFilePVs(_IgnorableTestCase):
+    """
+    Checks that span all the DBs in a single directory, which are hopefully
+    all the DBs loaded by one IOC
+    """
+
+    def __init__(self, methodName, directory=None, duplicates=(),
+                 log_entries=()):
+        super(TestCrossFilePVs, self).__init__(methodName=methodName)
+        self.path = directory
+        self.duplicates = duplicates
+        self.log_entries = log_entries
+
+    def test_multiple_pvs_across_files_warning(self):
+        """
+        This method warns if there are PVs with the same name in more than
+        one DB in the directory
+        """
+        failures = db_checks.get_multiple_instances_across_files(
+            self.duplicates, self.path)
+        self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
+            "PVs in multiple DBs in {}".format(self.path), failures))
+
+    def test_log_info_tags_across_files(self):
+        """
+        This method checks that logging tags are not repeated and that the
+        period is not defined in two ways by different DBs in the directory
+        """
+        failures = db_checks.get_log_info_tags_across_files(self.log_entries)
+        self.assertEqual(len(failures), 0, msg=db_checks.build_failure_message(
+            "Duplicated log infos across DBs in {}".format(self.path),
+            failures))
@@ -2,15 +2,20 @@
 This file holds the classes to hold the record and field data
 """
 import re
+import sys
+
+_SIMULATION = re.compile(r'.SIM(:.|$)')
 
 
 class Db:
     """
-    This class holds all the data in a single db
+    This class holds all the data in a single db, and the files it includes
+    as (number of records before the include, included name) tuples
     """
-    def __init__(self, directory, records):
+    def __init__(self, directory, records, includes=None):
         self.directory = directory
         self.records = records
+        self.includes = includes if includes is not None else []
 
     def __str__(self):
         return str(self.directory)
@@ -21,35 +26,59 @@ class Record:
     This class holds all the data about each record, including a list of
     fields within the record, and allows the constituent fields to be
     interrogated.
+
+    Fields and infos are kept in lists so duplicates are preserved, with an
+    index from field name to the value of the first such field built on the
+    first lookup. The line and column of the record definition are kept
+    where known, so failures can point at the record.
     """
+    __slots__ = ('type', 'pv', 'fields', 'infos', 'aliases', 'line',
+                 'column', '_index', '_simulation', '_disable')
 
-    def __init__(self, rec_type, pv, infos, fields):
-        self.type = rec_type
+    def __init__(self, rec_type, pv, infos, fields, aliases=None,
+                 line=None, column=None):
+        self.type = sys.intern(rec_type)
         self.pv = pv
-        self.fields = fields
-        self.infos = infos
-
-        # Test for whether the PV is a simulation
-        if re.search(r'.SIM(:.|$)', pv) is not None:
-            self.simulation = True
-        else:
-            self.simulation = False
-
-        # Test for whether the PV is a disable
-        if re.search(r'DISABLE', pv) is not None:
-            self.disable = True
-        else:
-            self.disable = False
+        self.fields = fields if fields is not None else []
+        self.infos = infos if infos is not None else []
+        self.aliases = aliases if aliases is not None else []
+        self.line = line
+        self.column = column
+        self._index = None
+        self._simulation = None
+        self._disable = None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in
+                ('type', 'pv', 'fields', 'infos', 'aliases', 'line',
+                 'column')}
+
+    def __setstate__(self, state):
+        self.__init__(state['type'], state['pv'], state['infos'],
+                      state['fields'], state['aliases'], state['line'],
+                      state['column'])
 
     def is_sim(self):
-        return self.simulation
+        # Test for whether the PV is a simulation
+        if self._simulation is None:
+            self._simulation = _SIMULATION.search(self.pv) is not None
+        return self._simulation
 
     def is_disable(self):
-        return self.disable
+        # Test for whether the PV is a disable
+        if self._disable is None:
+            self._disable = 'DISABLE' in self.pv
+        return self._disable
 
     def __str__(self):
         return str(self.pv)
 
+    def _field_index(self):
+        if self._index is None:
+            self._index = {field.name: field.value
+                           for field in reversed(self.fields)}
+        return self._index
+
     def get_field_names(self):
         """
         This method returns all field names as a list
@@ -67,10 +96,7 @@ class Record:
         This method checks all contained fields for instances of a
         pv given by the search input
         """
-        for field in self.fields:
-            if field.name == search:
-                return True
-        return False
+        return search in self._field_index()
 
     def get_field(self, search):
         """
@@ -78,10 +104,13 @@ class Record:
         the record that matches the search input
         If no field exists None is returned
         """
-        for field in self.fields:
-            if field.name == search:
-                return field.value
-        return None
+        return self._field_index().get(search)
+
+    def has_duplicate_fields(self):
+        """
+        This method returns whether any field name appears more than once
+        """
+        return len(self._field_index()) != len(self.fields)
 
     def get_type(self):
         """
@@ -115,9 +144,18 @@ class Field:
     This class holds all the data about each field within a record,
     not using a dictionary as may not be unique
     """
+    __slots__ = ('name', 'value')
+
     def __init__(self, name, value):
-        self.name = name.strip()
+        self.name = sys.intern(name.strip())
         self.value = value
 
+    def __getstate__(self):
+        return self.name, self.value
+
+    def __setstate__(self, state):
+        self.name, self.value = state
+        self.name = sys.intern(self.name)
+
     def __str__(self):
         return str(self.name) + ":" + str(self.value)
@@ -0,0 +1,392 @@
+"""
+This file holds a columnar table of the records of many dbs, and the checks
+of db_checks written as batched operations over its columns, for analyses
+across a whole tree at once. NumPy is needed to build a table.
+"""
+from .db_checks import EGU_sub_list, ASG_list, RULES, allowed_unit, \
+    _DESC_MACRO, _PV_MACRO, _ILLEGAL_PV_CHARACTER, _MULTIPLE_INSTANCES, \
+    _MULTIPLE_FIELDS, _MISSING_UNITS, _MISSING_ASG, _DESC_TOO_LONG, \
+    _INVALID_UNIT, _MISSING_DESC, _ILLEGAL_CHARACTERS, _NOT_UPPER_CASE
+from .failures import Failure
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("The columnar record table needs NumPy, install "
+                          "it with 'pip install numpy'")
+
+
+class _Dictionary:
+    """
+    Gives each distinct string a code in the order first seen, so a column
+    of repeated strings is held as an array of codes
+    """
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def values(self):
+        return numpy.array(list(self.codes), dtype=object)
+
+
+class RecordTable:
+    """
+    This class holds the records of many dbs as columns.
+
+    Each record is a row of the record columns: the id of its file, its
+    type, its PV name and the line and column it is defined at, which are
+    -1 where not known. Fields and infos are held in their own columns,
+    one row per field or info in the order defined, with the row of their
+    record; those of record i are the rows from offsets[i] to
+    offsets[i + 1].
+
+    Every string column is dictionary encoded, as an array of codes into an
+    array of the distinct strings, so a check tests each distinct value once
+    and works on integer arrays otherwise.
+    """
+    def __init__(self, files, file_id, type_code, types, pv_code, pvs,
+                 line, column, field_offsets, field_name_code, field_names,
+                 field_value_code, field_values, info_offsets,
+                 info_name_code, info_names, info_value_code, info_values):
+        self.files = files
+        self.file_id = file_id
+        self.type_code = type_code
+        self.types = types
+        self.pv_code = pv_code
+        self.pvs = pvs
+        self.line = line
+        self.column = column
+        self.field_offsets = field_offsets
+        self.field_record = numpy.repeat(
+            numpy.arange(len(pv_code)), numpy.diff(field_offsets))
+        self.field_name_code = field_name_code
+        self.field_names = field_names
+        self.field_value_code = field_value_code
+        self.field_values = field_values
+        self.info_offsets = info_offsets
+        self.info_record = numpy.repeat(
+            numpy.arange(len(pv_code)), numpy.diff(info_offsets))
+        self.info_name_code = info_name_code
+        self.info_names = info_names
+        self.info_value_code = info_value_code
+        self.info_values = info_values
+
+    @staticmethod
+    def from_dbs(dbs):
+        """
+        Builds a table from parsed dbs
+
+        Args:
+            dbs: (filename, db) tuples
+
+        Returns:
+            the table
+        """
+        _require_numpy()
+        files = []
+        file_id = []
+        types = _Dictionary()
+        type_code = []
+        pvs = _Dictionary()
+        pv_code = []
+        line = []
+        column = []
+        field_names = _Dictionary()
+        field_values = _Dictionary()
+        field_offsets = [0]
+        field_name_code = []
+        field_value_code = []
+        info_names = _Dictionary()
+        info_values = _Dictionary()
+        info_offsets = [0]
+        info_name_code = []
+        info_value_code = []
+
+        for filename, db in dbs:
+            index = len(files)
+            files.append(filename)
+            for rec in db.records:
+                file_id.append(index)
+                type_code.append(types.code(rec.type))
+                pv_code.append(pvs.code(rec.pv))
+                line.append(rec.line if rec.line is not None else -1)
+                column.append(rec.column if rec.column is not None else -1)
+                for field in rec.fields:
+                    field_name_code.append(field_names.code(field.name))
+                    field_value_code.append(field_values.code(field.value))
+                field_offsets.append(len(field_value_code))
+                for info in rec.infos:
+                    info_name_code.append(info_names.code(info.name))
+                    info_value_code.append(info_values.code(info.value))
+                info_offsets.append(len(info_value_code))
+
+        def codes(values):
+            return numpy.array(values, dtype=numpy.int32)
+
+        return RecordTable(
+            files, codes(file_id), codes(type_code), types.values(),
+            codes(pv_code), pvs.values(), codes(line), codes(column),
+            numpy.array(field_offsets, dtype=numpy.int64),
+            codes(field_name_code), field_names.values(),
+            codes(field_value_code), field_values.values(),
+            numpy.array(info_offsets, dtype=numpy.int64),
+            codes(info_name_code), info_names.values(),
+            codes(info_value_code), info_values.values())
+
+    def __len__(self):
+        return len(self.pv_code)
+
+    def pv(self, row):
+        """
+        Returns the PV name of the record in a row
+        """
+        return self.pvs[self.pv_code[row]]
+
+    def columns(self):
+        """
+        Returns the columns of the table as a dictionary of column name to
+        array, with the strings as NumPy unicode arrays
+        """
+        return {
+            "files": numpy.array(self.files, dtype=str),
+            "file_id": self.file_id,
+            "type_code": self.type_code,
+            "types": self.types.astype(str),
+            "pv_code": self.pv_code,
+            "pvs": self.pvs.astype(str),
+            "line": self.line,
+            "column": self.column,
+            "field_offsets": self.field_offsets,
+            "field_name_code": self.field_name_code,
+            "field_names": self.field_names.astype(str),
+            "field_value_code": self.field_value_code,
+            "field_values": self.field_values.astype(str),
+            "info_offsets": self.info_offsets,
+            "info_name_code": self.info_name_code,
+            "info_names": self.info_names.astype(str),
+            "info_value_code": self.info_value_code,
+            "info_values": self.info_values.astype(str),
+        }
+
+    def save(self, path):
+        """
+        Saves the columns of the table to a compressed NumPy .npz file
+        """
+        numpy.savez_compressed(path, **self.columns())
+
+    @staticmethod
+    def _codes(names, values):
+        return numpy.flatnonzero(numpy.isin(names, list(values)))
+
+    def of_types(self, rec_types):
+        """
+        Returns a mask of the records with one of a set of types
+        """
+        return numpy.isin(self.type_code, self._codes(self.types, rec_types))
+
+    def with_info(self, name):
+        """
+        Returns a mask of the records with an info of a given name
+        """
+        mask = numpy.zeros(len(self), dtype=bool)
+        mask[self.info_record[numpy.isin(
+            self.info_name_code, self._codes(self.info_names, {name}))]] = True
+        return mask
+
+    def field(self, name):
+        """
+        Finds the value of the first field of a given name on each record,
+        as Record.get_field does
+
+        Returns:
+            an array of the code of the value in field_values on each
+            record, which is -1 on records without the field
+        """
+        rows = numpy.flatnonzero(numpy.isin(
+            self.field_name_code, self._codes(self.field_names, {name})))
+        records = self.field_record[rows]
+        first = numpy.ones(len(rows), dtype=bool)
+        first[1:] = records[1:] != records[:-1]
+
+        values = numpy.full(len(self), -1, dtype=numpy.int32)
+        values[records[first]] = self.field_value_code[rows[first]]
+        return values
+
+    def failure(self, row, check, template, params=None):
+        """
+        Creates a Failure of a check on the record in a row
+        """
+        line, column = int(self.line[row]), int(self.column[row])
+        return Failure(template, self.pv(row), params, check,
+                       self.files[self.file_id[row]],
+                       line if line != -1 else None,
+                       column if column != -1 else None,
+                       RULES.rules[check].severity)
+
+    def record_field_names(self, row):
+        start, end = self.field_offsets[row], self.field_offsets[row + 1]
+        return [self.field_names[code]
+                for code in self.field_name_code[start:end]]
+
+
+def _per_unique(codes, values, test):
+    """
+    Applies a test to each distinct value of a dictionary encoded column
+    once, giving the result for every element
+
+    Args:
+        codes: the codes of the elements into values
+        values: the distinct values
+        test: the function to apply to a value
+    """
+    results = numpy.zeros(len(values), dtype=bool)
+    for code in numpy.unique(codes):
+        results[code] = test(values[code])
+    return results[codes]
+
+
+def _failures(mask, table, template):
+    return _rows(numpy.flatnonzero(mask), table, template)
+
+
+def _rows(rows, table, template):
+    return [(row, template, None) for row in rows]
+
+
+def _multiple_instances(table):
+    key = table.file_id.astype(numpy.int64) * len(table.pvs) + table.pv_code
+    _, first, counts = numpy.unique(key, return_index=True,
+                                    return_counts=True)
+    first = numpy.sort(first[counts > 1])
+    return _rows(first, table, _MULTIPLE_INSTANCES)
+
+
+def _multiple_properties_on_pvs(table):
+    names = max(1, len(table.field_names))
+    key = table.field_record.astype(numpy.int64) * names + \
+        table.field_name_code
+    unique, counts = numpy.unique(key, return_counts=True)
+    failures = []
+    for row in numpy.unique(unique[counts > 1] // names):
+        fields = table.record_field_names(row)
+        dupes = set([i for i in fields if fields.count(i) > 1])
+        failures.append((row, _MULTIPLE_FIELDS, {"fields": ','.join(dupes)}))
+    return failures
+
+
+def _interest_units(table):
+    mask = table.of_types(EGU_sub_list) & (table.field("EGU") == -1) & \
+        table.with_info("INTEREST")
+    mask[mask] = ~_per_unique(table.pv_code[mask], table.pvs,
+                              lambda pv: 'DISABLE' in pv)
+    return _failures(mask, table, _MISSING_UNITS)
+
+
+def _interest_calc_readonly(table):
+    asg = table.field("ASG")
+    readonly = table._codes(table.field_values, {"READONLY"})
+    mask = table.of_types(ASG_list) & table.with_info("INTEREST") & \
+        ~numpy.isin(asg, readonly)
+    return _failures(mask, table, _MISSING_ASG)
+
+
+def _desc_length(table):
+    desc = table.field("DESC")
+    mask = desc != -1
+    mask[mask] = _per_unique(desc[mask], table.field_values,
+                             lambda d: len(_DESC_MACRO.sub('', d)) > 40)
+    return _failures(mask, table, _DESC_TOO_LONG)
+
+
+def _invalid_unit(unit):
+    return unit != "" and not allowed_unit(unit)
+
+
+def _units_valid(table):
+    egu = table.field("EGU")
+    mask = egu != -1
+    mask[mask] = _per_unique(egu[mask], table.field_values, _invalid_unit)
+    return [(row, _INVALID_UNIT, {"unit": table.field_values[egu[row]]})
+            for row in numpy.flatnonzero(mask)]
+
+
+def _interest_descriptions(table):
+    return _failures(
+        (table.field("DESC") == -1) & table.with_info("INTEREST"), table,
+        _MISSING_DESC)
+
+
+def _has_illegal_character(pv):
+    return _ILLEGAL_PV_CHARACTER.search(_PV_MACRO.sub('', pv)) is not None
+
+
+def _is_lower(pv):
+    pv = _PV_MACRO.sub('', pv)
+    return len(pv) > 0 and not pv.isupper()
+
+
+def _interest_syntax(table):
+    rows = numpy.flatnonzero(table.with_info("INTEREST"))
+    codes = table.pv_code[rows]
+    illegal = _per_unique(codes, table.pvs, _has_illegal_character)
+    lower = _per_unique(codes, table.pvs, _is_lower)
+    failures = []
+    for row, is_illegal, is_lower in zip(rows, illegal, lower):
+        if is_illegal:
+            failures.append((row, _ILLEGAL_CHARACTERS, None))
+        if is_lower:
+            failures.append((row, _NOT_UPPER_CASE, None))
+    return failures
+
+
+# The checks of db_checks that have a batched form, which each return a
+# list of (record row, message template, parameters) tuples in the order of
+# the rows, the failures only being created for the rows found
+BATCH_CHECKS = {
+    "multiple_instances": _multiple_instances,
+    "multiple_properties_on_pvs": _multiple_properties_on_pvs,
+    "interest_units": _interest_units,
+    "interest_calc_readonly": _interest_calc_readonly,
+    "desc_length": _desc_length,
+    "units_valid": _units_valid,
+    "interest_descriptions": _interest_descriptions,
+    "interest_syntax": _interest_syntax,
+}
+
+
+def run_batch_checks(table, names=None):
+    """
+    Runs checks over every record of a table at once, giving the same
+    failures as run_checks would for each file
+
+    Args:
+        table: the RecordTable
+        names: the names of the checks to run, or None for every check in
+            BATCH_CHECKS
+
+    Returns:
+        a dictionary of filename to a dictionary of check name to the list
+        of Failure of that check on the file
+    """
+    names = list(BATCH_CHECKS) if names is None else names
+    unknown = [name for name in names if name not in BATCH_CHECKS]
+    if unknown:
+        raise ValueError("No batched form of the checks {}".format(unknown))
+
+    results = {filename: {name: [] for name in names}
+               for filename in table.files}
+    for name in names:
+        for row, template, params in BATCH_CHECKS[name](table):
+            results[table.files[table.file_id[row]]][name].append(
+                table.failure(row, name, template, params))
+    return results
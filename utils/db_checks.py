@@ -1,6 +1,8 @@
 import re
-import os
-from collections import defaultdict
+from functools import lru_cache
+
+from .failures import Failure, WARNING
+from .rule_engine import RuleSet
 
 # list of those record types that should have a EGU field
 EGU_list = {
@@ -36,23 +38,38 @@ allowed_standalone_units = {
 }
 
 
+# every unit that may appear between separators, expanded once at import
+# so that checking a unit is a single set lookup
+_VALID_UNITS = frozenset(
+    allowed_non_prefixable_units | allowed_prefixable_units |
+    {prefix + unit for prefix in allowed_unit_prefixes
+     for unit in allowed_prefixable_units}
+)
+
+_MACRO_WITH_DEFAULT = re.compile(r'\$[({].*?=(.*)?[})]')
+_MACRO = re.compile(r'\$[({].*?[})]')
+_UNIT_SEPARATORS = re.compile(r'[/ ()]')
+
+
+@lru_cache(maxsize=4096)
 def allowed_unit(raw_unit):
     """
-    This method checks that the given unit conforms to standard
+    This method checks that the given unit conforms to standard.
+    The same units appear many times across a tree, so results are cached.
     """
     if raw_unit in allowed_standalone_units:
         return True
 
     # expand macro $(A) to a valid unit, expand $(A=B) to B
-    processed_unit = re.sub(r'\$[({].*?=(.*)?[})]', r'\1', raw_unit)
-    processed_unit = re.sub(r'\$[({].*?[})]', 'm', processed_unit)
+    processed_unit = _MACRO_WITH_DEFAULT.sub(r'\1', raw_unit)
+    processed_unit = _MACRO.sub('m', processed_unit)
 
     # remove 1\ as this is ok as a unit as in 1\m but 1 on its own is not ok
-    processed_unit = re.sub(r'1/', '', processed_unit).replace(" ", "")
+    processed_unit = processed_unit.replace('1/', '').replace(" ", "")
 
     # split unit amalgamations and remove powers
-    units_with_powers = re.split(r'[/ ()]', processed_unit)
-   
+    units_with_powers = _UNIT_SEPARATORS.split(processed_unit)
+
     # allow power but not negative power so m^-1.
     # Reason is there is no latex so 1/m is much clearer here
     for u in units_with_powers:
@@ -63,19 +80,7 @@ def allowed_unit(raw_unit):
             else:
                 units_with_powers = [base]
 
-    units = filter(None, units_with_powers)
-
-    def is_standalone_unit(unit):
-        return unit in allowed_non_prefixable_units or \
-               unit in allowed_prefixable_units
-
-    def is_prefixed_unit(unit):
-        return any(len(unit) > len(base_unit) and
-                   unit[-len(base_unit):] == base_unit and
-                   unit[:-len(base_unit)] in allowed_unit_prefixes
-                   for base_unit in allowed_prefixable_units)
-
-    return all(is_standalone_unit(u) or is_prefixed_unit(u) for u in units)
+    return all(u in _VALID_UNITS for u in units_with_powers if u)
 
 
 def build_failure_message(basemessage, submessages):
@@ -91,53 +96,206 @@ def build_failure_message(basemessage, submessages):
         A formatted string containing the base and sub messages.
     """
     return "{}\n{}".format(basemessage, "\n".
-                           join("   -> " + s for s in submessages))
+                           join("   -> {}".format(s) for s in submessages))
+
+
+RULES = RuleSet()
+
+_DESC_MACRO = re.compile(r'\$\([^)]*\)')
+_PV_MACRO = re.compile(r'\$\(.*\)')
+_ILLEGAL_PV_CHARACTER = re.compile(r'[^\w:]')
+
+# The messages of the failures of each check, shared with the batched forms
+# of the checks in columnar
+_MULTIPLE_INSTANCES = "Multiple instances of {pv}"
+_MULTIPLE_FIELDS = "Multiple instances of fields {fields} on {pv}"
+_MISSING_UNITS = "Missing units on {pv}"
+_MISSING_ASG = "Missing ASG on {pv}"
+_DESC_TOO_LONG = "Description too long on {pv}"
+_INVALID_UNIT = "Invalid unit '{unit}' on {pv}"
+_MISSING_DESC = "Missing description on {pv}"
+_ILLEGAL_CHARACTERS = "{pv} contains illegal characters"
+_NOT_UPPER_CASE = "{pv} should be upper-case"
+_LOG_TAG_REPEATED = "Invalid logging config: {source} repeats the log info " \
+    "tag {tag}"
+_LOG_PERIOD_ALTERED = "Invalid logging config: {source} alters the logging " \
+    "period type"
+_IN_FILE = {template: template.replace("{source}", "{pv}")
+            for template in (_LOG_TAG_REPEATED, _LOG_PERIOD_ALTERED)}
+_ACROSS_FILES = {
+    template: template.replace("{source}", "{pv} in {source_file}") +
+    " (already set by {previous_pv} in {previous_file})"
+    for template in (_LOG_TAG_REPEATED, _LOG_PERIOD_ALTERED)}
+_MULTIPLE_INSTANCES_ACROSS_FILES = "Multiple instances of {pv} in {files}"
+
+
+def run_checks(db, names=None, timings=None):
+    """
+    Runs checks over every record of a db in a single traversal.
 
+    Args:
+        db: the parsed db
+        names: the names of the checks to run, e.g. "units_valid", or None
+            to run all checks
+        timings: an optional dictionary which the seconds spent in each
+            check are added to
 
-def get_multiple_instances(db):        
+    Returns:
+        a dictionary of check name to the list of Failure of that check,
+        each with the check, the path of the db and the severity filled in
     """
-    This method warns if there are multiple PVs with the same name in the
-    project
-    """    
-    failures = []
-    dups = defaultdict(list)  # Makes a dict of lists
-    for rec in db.records:
-        dups[str(rec.pv)].append(rec)
+    results = RULES.run(db, names, timings)
+    for name, failures in results.items():
+        severity = RULES.rules[name].severity
+        for failure in failures:
+            failure.check = name
+            failure.file = db.directory
+            failure.severity = severity
+    return results
+
+
+def _multiple_instances(state):
+    return [Failure.of_record(_MULTIPLE_INSTANCES, first)
+            for first, count in state.values() if count > 1]
+
+
+@RULES.record_rule("multiple_instances", finish=_multiple_instances,
+                   severity=WARNING)
+def _count_pv(rec, values, state):
+    # the failure is given at the first record of the name
+    entry = state.get(str(rec.pv))
+    if entry is None:
+        state[str(rec.pv)] = [rec, 1]
+    else:
+        entry[1] += 1
+
+
+@RULES.record_rule("multiple_properties_on_pvs")
+def _check_multiple_properties(rec, values, state):
+    if rec.has_duplicate_fields():
+        fields = rec.get_field_names()
+        dupes = set([i for i in fields if fields.count(i) > 1])
+        return [Failure.of_record(_MULTIPLE_FIELDS, rec,
+                                  fields=','.join(dupes))]
+
+
+@RULES.record_rule("interest_units", fields=["EGU"],
+                   record_types=EGU_sub_list)
+def _check_interest_units(rec, values, state):
+    if values["EGU"] is None and rec.is_interest() and not rec.is_disable():
+        return [Failure.of_record(_MISSING_UNITS, rec)]
+
+
+@RULES.record_rule("interest_calc_readonly", fields=["ASG"],
+                   record_types=ASG_list)
+def _check_interest_calc_readonly(rec, values, state):
+    if values["ASG"] != "READONLY" and rec.is_interest():
+        return [Failure.of_record(_MISSING_ASG, rec)]
+
+
+@RULES.record_rule("desc_length", fields=["DESC"])
+def _check_desc_length(rec, values, state):
+    desc = values["DESC"]
+    # remove macros
+    if desc is not None and len(_DESC_MACRO.sub('', desc)) > 40:
+        return [Failure.of_record(_DESC_TOO_LONG, rec)]
+
+
+@RULES.record_rule("units_valid", fields=["EGU"])
+def _check_units_valid(rec, values, state):
+    unit = values["EGU"]
+    if unit is not None and unit != "" and not allowed_unit(unit):
+        return [Failure.of_record(_INVALID_UNIT, rec, unit=unit)]
 
-    for k, v in dups.items():
-        if len(v) > 1:
-            failures.append("Multiple instances of {}".format(k))
+
+@RULES.record_rule("interest_descriptions", fields=["DESC"])
+def _check_interest_descriptions(rec, values, state):
+    if values["DESC"] is None and rec.is_interest():
+        return [Failure.of_record(_MISSING_DESC, rec)]
+
+
+@RULES.record_rule("interest_syntax")
+def _check_interest_syntax(rec, values, state):
+    if not rec.is_interest():
+        return None
+    failures = []
+    mypv = _PV_MACRO.sub('', rec.pv)  # remove macros
+    if _ILLEGAL_PV_CHARACTER.search(mypv) is not None:
+        failures.append(Failure.of_record(_ILLEGAL_CHARACTERS, rec))
+    if len(mypv) > 0 and not mypv.isupper():
+        failures.append(Failure.of_record(_NOT_UPPER_CASE, rec))
     return failures
 
 
+def _log_info_conflicts(entries):
+    """
+    Finds logging info tags that are repeated and logging periods that are
+    defined in two ways.
+
+    Args:
+        entries: (source, info name) tuples in the order they are defined
+
+    Returns:
+        a list of (failure message, source, tag, previous source) tuples,
+        where the message is one of _LOG_TAG_REPEATED and
+        _LOG_PERIOD_ALTERED
+    """
+    conflicts = []
+    log_fields = {}
+    logging_period = None
+    for source, info_name in entries:
+        info_name = info_name.lower().strip('"')
+        if info_name.startswith("log"):
+            previous_source = log_fields.get(info_name, None)
+            if previous_source is not None:
+                conflicts.append((_LOG_TAG_REPEATED, source, info_name,
+                                  previous_source))
+            else:
+                log_fields[info_name] = source
+
+        if info_name == "log_period_seconds" or \
+                info_name == "log_period_pv":
+            if logging_period is None:
+                logging_period = source
+            else:
+                conflicts.append((_LOG_PERIOD_ALTERED, source, info_name,
+                                  logging_period))
+    return conflicts
+
+
+def _log_info_failures(state):
+    return [Failure.of_record(_IN_FILE[message], source, tag=tag)
+            for message, source, tag, _ in
+            _log_info_conflicts(state.get("entries", []))]
+
+
+@RULES.record_rule("log_info_tags", finish=_log_info_failures)
+def _gather_log_infos(rec, values, state):
+    state.setdefault("entries", []).extend(
+        (rec, info.name) for info in rec.infos)
+
+
+def get_multiple_instances(db):
+    """
+    This method warns if there are multiple PVs with the same name in the
+    project
+    """
+    return run_checks(db, ["multiple_instances"])["multiple_instances"]
+
+
 def get_multiple_properties_on_pvs(db):
     """
     This method checks that no PVs have duplicate fields
     """
-    failures = []
-
-    for rec in db.records:
-        fields = rec.get_field_names()
-        if len(set(fields)) != len(fields):
-            dupes = set([i for i in fields if fields.count(i) > 1])
-            failures.append("Multiple instances of fields {} on {}".
-                            format(','.join(dupes), rec))
-    return failures
+    return run_checks(db, ["multiple_properties_on_pvs"])[
+        "multiple_properties_on_pvs"]
 
 
 def get_interest_units(db):
     """
     This method checks that interesting PVs have units
     """
-    failures = []
-
-    for rec in db.records:
-        if rec.is_interest() and not rec.is_disable() and \
-                (rec.get_type() in EGU_sub_list):
-            unit = rec.get_field("EGU")
-            if unit is None:
-                failures.append("Missing units on {}".format(rec))
-    return failures
+    return run_checks(db, ["interest_units"])["interest_units"]
 
 
 def get_interest_calc_readonly(db):
@@ -145,14 +303,8 @@ def get_interest_calc_readonly(db):
     This method checks that interesting PVs that are calc fields are set to
     readonly
     """
-    failures = []
-
-    for rec in db.records:
-        if rec.is_interest() and (rec.get_type() in ASG_list):
-            value = rec.get_field("ASG")
-            if value != "READONLY":
-                failures.append("Missing ASG on {}".format(rec))
-    return failures
+    return run_checks(db, ["interest_calc_readonly"])[
+        "interest_calc_readonly"]
 
 
 def get_desc_length(db):
@@ -160,16 +312,7 @@ def get_desc_length(db):
     This method checks that the description length on all PVs is no longer
     than 40 chars
     """
-    failures = []
-
-    for rec in db.records:
-        desc = rec.get_field("DESC")
-        if desc is not None:
-            # remove macros
-            desc = re.sub(r'\$\([^)]*\)', '', desc)
-            if len(desc) > 40:
-                failures.append("Description too long on {}".format(rec))
-    return failures
+    return run_checks(db, ["desc_length"])["desc_length"]
 
 
 def get_units_valid(db):
@@ -177,27 +320,14 @@ def get_units_valid(db):
     This method loops through all found records and finds the unique units.
     It then checks these units are standard
     """
-    failures = []
-
-    for rec in db.records:
-        unit = rec.get_field("EGU")
-
-        if unit is not None and unit != "" and not allowed_unit(unit):
-            failures.append("Invalid unit '{}' on {}".format(unit, rec))
-
-    return failures
+    return run_checks(db, ["units_valid"])["units_valid"]
 
 
 def get_interest_descriptions(db):
     """
     This method checks all records marked as interesting for description fields
     """
-    failures = []
-
-    for rec in db.records:
-        if rec.is_interest() and not rec.has_field("DESC"):
-            failures.append("Missing description on {}".format(rec))
-    return failures
+    return run_checks(db, ["interest_descriptions"])["interest_descriptions"]
 
 
 def get_interest_syntax(db):
@@ -205,18 +335,7 @@ def get_interest_syntax(db):
     This method tests that all interesting PVs that are not in the names
     exception list are capitalised and contain only A-Z 0-9 _ :
     """
-    failures = []
-
-    for rec in db.records:
-        if rec.is_interest():
-            mypv = re.sub(r'\$\(.*\)', '', rec.pv)  # remove macros
-            se = re.search(r'[^\w:]', mypv)
-            if se is not None:
-                failures.append("{} contains illegal characters".format(rec))
-            if len(mypv) > 0 and not mypv.isupper():
-                failures.append("{} should be upper-case".format(rec))
-
-    return failures
+    return run_checks(db, ["interest_syntax"])["interest_syntax"]
 
 
 def get_log_info_tags(db):
@@ -224,41 +343,49 @@ def get_log_info_tags(db):
     This method checks logging records to check that logging tags are not
     repeated and that the period is not defined in two ways.
     """
-    failures = []
+    return run_checks(db, ["log_info_tags"])["log_info_tags"]
+
 
-    dbs_by_paths = {}
-    # group dbs by directory hopefully these are all the db records for one IOC
-    dbs_by_path = dbs_by_paths.get(os.path.dirname(db.directory), [])
-    dbs_by_path.append(db)
-    dbs_by_paths[db.directory] = dbs_by_path
-
-    for key, dir_dbs in dbs_by_paths.items():
-        log_fields = {}
-        logging_period = None
-        for db in dir_dbs:
-            for rec in db.records:
-                for info in rec.infos:
-                    info_name = info.name.lower().strip('"')
-                    if info_name.startswith("log"):
-                        previous_source = log_fields.get(info_name, None)
-                        if previous_source is not None:
-                            failures.append(
-                                "Invalid logging config: "
-                                "{source} repeats the log info tag "
-                                "{tag}".format(source=rec, tag=info_name)
-                            )
-                        else:
-                            log_fields[info_name] = (db, rec)
-
-                    if info_name == "log_period_seconds" or \
-                            info_name == "log_period_pv":
-                        if logging_period is None:
-                            logging_period = (db, rec)
-                        else:
-                            failures.append(
-                                "Invalid logging config: "
-                                "{source} alters the logging period "
-                                "type".format(source=rec, tag=info_name)
-                            )
+def get_log_info_tags_across_files(log_entries):
+    """
+    This method checks the logging tags of all the dbs in one directory,
+    hopefully all the dbs for one IOC, to check that tags are not repeated
+    and that the period is not defined in two ways in different files.
+    Repeats within a single file are found by get_log_info_tags.
+
+    Args:
+        log_entries: (filename, PV name, info name) tuples for the directory
 
+    Returns:
+        a list of Failure, each given in the file that repeats the tag
+    """
+    failures = []
+    entries = (((filename, pv), info_name)
+               for filename, pv, info_name in log_entries)
+    for message, source, tag, previous in _log_info_conflicts(entries):
+        if source[0] != previous[0]:
+            failures.append(Failure(
+                _ACROSS_FILES[message], source[1],
+                {"tag": tag, "source_file": source[0],
+                 "previous_pv": previous[1], "previous_file": previous[0]},
+                check="log_info_tags_across_files", file=source[0]))
     return failures
+
+
+def get_multiple_instances_across_files(duplicates, directory=None):
+    """
+    This method warns if PVs with the same name are defined in more than one
+    file in the same directory
+
+    Args:
+        duplicates: (PV name, list of files) tuples for the directory
+        directory: the directory, which each failure is given in
+
+    Returns:
+        a list of Failure
+    """
+    return [Failure(_MULTIPLE_INSTANCES_ACROSS_FILES, pv,
+                    {"files": ", ".join(files)},
+                    check="multiple_instances_across_files", file=directory,
+                    severity=WARNING)
+            for pv, files in duplicates]
@@ -2,122 +2,459 @@ import re
 from .EPICS_collections import Db, Record, Field
 
 
-def _check_string(text):
+# Bare (unquoted) words follow the EPICS dbLex character set, with macro
+# references such as $(P) or ${P=$(Q)} allowed anywhere within the word.
+# The pattern matches references nested one level deep, and the lexer
+# extends a word over any nested more deeply by counting brackets.
+_MACRO = r'\$\((?:[^()\n]|\([^()\n]*\))*\)|\$\{(?:[^{}\n]|\{[^{}\n]*\})*\}'
+_BARE_CHARS = r'[A-Za-z0-9_\-+:.\[\]<>;]+'
+
+_TOKEN_RE = re.compile(
+    r'(?P<skip>(?:\s+|#[^\n]*)+)'
+    r'|(?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*")'
+    r'|(?P<bare>(?:' + _BARE_CHARS + '|' + _MACRO + r')+)'
+    r'|(?P<punct>[(){},])'
+    r'|(?P<other>.)'
+)
+
+# Matches the common forms of field and info entries in one go, leaving
+# anything with escapes, macros in names or JSON values to the full parser.
+_SIMPLE_VALUE = r'(?:"[^"\\\n]*"|[A-Za-z0-9_\-+:.<>;]+)'
+_PROPERTY_RE = re.compile(
+    r'(?P<keyword>field|info)\s*\(\s*(?P<name>' + _SIMPLE_VALUE + r')'
+    r'\s*,\s*(?P<value>' + _SIMPLE_VALUE + r')\s*\)'
+)
+
+_BARE_RE = re.compile(r'(?:' + _BARE_CHARS + '|' + _MACRO + r')*')
+
+# The same patterns for matching the bytes of a mapped file directly
+_TOKEN_BYTES_RE = re.compile(_TOKEN_RE.pattern.encode('ascii'))
+_BARE_BYTES_RE = re.compile(_BARE_RE.pattern.encode('ascii'))
+_PROPERTY_BYTES_RE = re.compile(_PROPERTY_RE.pattern.encode('ascii'))
+
+ENCODING = 'utf-8'
+
+_ESCAPE_RE = re.compile(r'\\(.)')
+
+_ESCAPES = {
+    'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f',
+    'v': '\v', '"': '"', "'": "'", '\\': '\\',
+}
+
+_RECORD_KEYWORDS = {'record', 'grecord'}
+
+STRING = 'string'
+BARE = 'bare'
+PUNCT = 'punct'
+OTHER = 'other'
+EOF = 'eof'
+
+
+class DbParseError(ValueError):
     """
-    Helper function to return the data between the next comma and closed
-    bracket, even if it's a string containing commas/brackets
+    Raised when the text of a db file does not follow the EPICS db grammar
     """
-    quote_pos = text.find('"')
-    if quote_pos < text.find(')') and quote_pos != -1:
-        # Data is a string
-        r = text.split('"')
-    else:
-        # Data is not a string
-        r = re.split('[,)]', text)
-        
-    if len(r) < 2:
-        raise ValueError("Cannot parse " + text + ", length < 2.")
-    return r[1]
-
-
-def _get_props(keyword, text):
+    def __init__(self, message, line):
+        super(DbParseError, self).__init__(
+            "{} (line {})".format(message, line))
+        self.line = line
+
+
+class Token:
     """
-    This method searches for valid EPICS formatted data under the given
-    keyword in the text, specifically avoiding strings containing
-    that keyword. E.g. info and field
-    A list of this data is returned.
+    A single lexical token from a db file
     """
-    fields = []
-    while text.find(keyword) != -1:
-        # check keyword is not in string
-        search = re.search(r'"[^"\n]*?'+keyword+'[^"\n]*?"', text)
-
-        if search and (search.start() < text.find(keyword)):
-            # string comes first so cut it out and repeat
-            text = text[search.end():]
-        else:
-            # info is not in a string so add to record
-            text = text[text.find(keyword)+4:]
-            name = re.split('[(,]', text)[1]
-            val = _check_string(text)
-            fields.append(Field(name, val))
-
-    return fields
-
-
-def remove_comments(line):
-    """ Removes comments from a given db line
-    @param line : Single line Db entry 
-    @returns text : parsed string with comments removed, line return added.
-    This method finds all single line comments starting with
-    a #. It checks to see whether the # is contained within a string
-    in which case it retains the text proceeds. All other comments are
-    removed before returning the parsed string.
+    __slots__ = ('kind', 'value', 'start', 'end')
+
+    def __init__(self, kind, value, start, end):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return "Token({}, {!r}, {})".format(self.kind, self.value, self.start)
+
+
+def _unescape(text):
+    """
+    Translates the C style escape sequences allowed in EPICS strings
     """
+    if '\\' not in text:
+        return text
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
 
-    is_full_line_comment = r"^(\s*#)"
-    if re.search(is_full_line_comment, line) is not None:
-        return "\n"
-    else:
-        is_comment = r"#\s*\w*(?!.*['\"]\))"
-        matches = re.search(is_comment, line)
-        if matches is not None:
-            index = matches.span()[0]
-            return line[:index] + "\n"
-        else:
-            return line + "\n"
+
+def _unquote(text):
+    """
+    Removes the quotes from a string matched without escape sequences
+    """
+    return text[1:-1] if text[:1] == '"' else text
 
 
-def parse_db(db_file):
+class _Parser:
     """
-    This method will parse the text found in the EPICS db files to form groups
-    of Record and Field instances.
+    Recursive descent parser for the text of a single db file. Tokens are
+    matched one at a time from the current position, so the text is only
+    scanned once.
+
+    Anything at the top level that is not a record definition (includes,
+    aliases, dbd style definitions or stray text) is consumed and ignored,
+    so only the records are returned.
     """
 
-    text = ""
-    temp_text = db_file.get_text()
+    def __init__(self, text):
+        self.text = text
+        if isinstance(text, str):
+            self._token_re = _TOKEN_RE
+            self._property_re = _PROPERTY_RE
+            self._bare_re = _BARE_RE
+            self._newline = '\n'
+            self._macro_starts = ('$(', '${')
+            self._brackets = ('(', '{', ')', '}')
+        else:
+            # bytes, or a bytes-like object such as a memory mapped file,
+            # which is decoded one token at a time
+            self._token_re = _TOKEN_BYTES_RE
+            self._property_re = _PROPERTY_BYTES_RE
+            self._bare_re = _BARE_BYTES_RE
+            self._newline = b'\n'
+            self._macro_starts = (b'$(', b'${')
+            self._brackets = (b'(', b'{', b')', b'}')
+        self.pos = 0
+        self.aliases = []
+        self.includes = []
+        self._line = 1
+        self._line_pos = 0
+        self.token = self._lex()
+
+    def _lex(self):
+        """
+        Matches the next token after the current position, skipping any
+        whitespace and comments
+        """
+        match = self._token_re.match(self.text, self.pos)
+        if match is not None and match.lastgroup == 'skip':
+            match = self._token_re.match(self.text, match.end())
+        if match is None:
+            self.pos = len(self.text)
+            return Token(EOF, None, self.pos, self.pos)
 
-    # remove comments but keep any # that appear in strings
-    # (may be able to do better in regex?)
-    for line in iter(temp_text.splitlines()):
-        text += remove_comments(line)
+        kind = match.lastgroup
+        if kind == 'bare':
+            self.pos = self._bare_end(match.end())
+            return Token(BARE, self._raw(match.start(), self.pos),
+                         match.start(), self.pos)
+        if kind == 'other':
+            end = self._bare_end(match.start())
+            if end > match.start():
+                self.pos = end
+                return Token(BARE, self._raw(match.start(), end),
+                             match.start(), end)
 
-    recs = []
+        self.pos = match.end()
+        if kind == 'string':
+            return Token(STRING, _unescape(self._decode(match.group()[1:-1])),
+                         match.start(), self.pos)
+        return Token(kind, self._decode(match.group()), match.start(),
+                     self.pos)
 
-    # cut out the text before the first record
-    rec_pos = text.find("record")
-    text = text[rec_pos+5:]
+    def _bare_end(self, pos):
+        """
+        Returns the end of a bare word continuing from a position, over any
+        macro references nested too deeply for the token pattern
+        """
+        while self.text[pos:pos + 2] in self._macro_starts:
+            close = self._macro_close(pos + 2)
+            if close == -1:
+                break
+            pos = self._bare_re.match(self.text, close + 1).end()
+        return pos
 
-    while rec_pos != -1:
+    def _macro_close(self, start):
+        """
+        Returns the position of the bracket closing a macro reference whose
+        body starts at start, counting nested brackets to any depth as
+        macros._find_close does, or -1 if it is not closed on its line
+        """
+        opening, brace, closing, end_brace = self._brackets
+        depth = 0
+        for pos in range(start, len(self.text)):
+            char = self.text[pos:pos + 1]
+            if char == opening or char == brace:
+                depth += 1
+            elif char == closing or char == end_brace:
+                if depth == 0:
+                    return pos
+                depth -= 1
+            elif char == self._newline:
+                return -1
+        return -1
 
-        # cut out record data
-        rec_type = re.split('[(,]', text)[1]
-        
-        pv_name = _check_string(text)
+    def _decode(self, value):
+        if isinstance(value, str):
+            return value
+        return value.decode(ENCODING, 'replace')
 
-        # cut out field data (any data between braces)
-        braced_text = text[text.find('{')+1:text.find('}')]
-        field_text = braced_text
+    def _raw(self, start, end):
+        """
+        Returns the raw text between two positions
+        """
+        return self._decode(self.text[start:end])
 
-        # check for info field
-        infos = _get_props("info", field_text)
+    def _line_of(self, token):
+        """
+        Returns the line number of a token. Newlines are counted from the
+        previous lookup, so the cost over a whole file stays linear.
+        """
+        if token.start < self._line_pos:
+            self._line, self._line_pos = 1, 0
+        self._line += \
+            self.text[self._line_pos:token.start].count(self._newline)
+        self._line_pos = token.start
+        return self._line
 
-        # find fields
-        fields = _get_props("field", field_text)
+    def _advance(self):
+        token = self.token
+        self.token = self._lex()
+        return token
 
-        # populate records list
-        rec = Record(rec_type.strip(), pv_name, infos, fields)
-        recs.append(rec)
+    def _at(self, kind, value=None):
+        return self.token.kind == kind and \
+            (value is None or self.token.value == value)
 
-        # find next record
-        # check if the next instance of record occurs in a string
+    def _expect(self, kind, value=None):
+        if not self._at(kind, value):
+            found = "end of file" if self.token.kind == EOF \
+                else "'{}'".format(self.token.value)
+            raise DbParseError("Expected '{}' but found {}".format(
+                value or kind, found), self._line_of(self.token))
+        return self._advance()
 
-        if re.search('"[^"]*record[^"]*?"', braced_text):
-            # find where record is used in a string
-            rec_pos = re.search('"[^"]*record[^"]*?"', text).end()
-            text = text[rec_pos+5:]
+    def _skip_block(self, opening, closing):
+        """
+        Consumes a bracketed block, including any nested blocks, and returns
+        the raw text between the outermost brackets
+        """
+        start = self._expect(PUNCT, opening)
+        depth = 1
+        while depth:
+            if self._at(EOF):
+                raise DbParseError("Unterminated '{}'".format(opening),
+                                   self._line_of(start))
+            token = self._advance()
+            if token.kind == PUNCT or token.kind == OTHER:
+                if token.value == opening:
+                    depth += 1
+                elif token.value == closing:
+                    depth -= 1
+        return self._raw(start.end, token.start)
 
-        rec_pos = text.find("record")
-        text = text[rec_pos+5:]
+    def _json_array(self):
+        """
+        Consumes a JSON style array value, whose brackets are legal within
+        bare words, and returns it as raw text
+        """
+        start = self.token
+        depth = 0
+        while True:
+            if self._at(EOF):
+                raise DbParseError("Unterminated '['", self._line_of(start))
+            token = self._advance()
+            if token.kind == BARE:
+                depth += token.value.count('[') - token.value.count(']')
+            if depth <= 0:
+                return self._raw(start.start, token.end)
 
-    return Db(db_file.get_dir(), recs)
+    def _value(self):
+        """
+        Parses a single argument: a string, a bare word or a JSON style
+        link value which is returned as raw text
+        """
+        if self._at(BARE) and self.token.value.startswith('['):
+            return self._json_array()
+        if self._at(STRING) or self._at(BARE):
+            return self._advance().value
+        if self._at(PUNCT, '{'):
+            return '{' + self._skip_block('{', '}') + '}'
+        if self._at(PUNCT, ',') or self._at(PUNCT, ')'):
+            return ""
+        found = "end of file" if self.token.kind == EOF \
+            else "'{}'".format(self.token.value)
+        raise DbParseError("Unexpected {}".format(found),
+                           self._line_of(self.token))
+
+    def _arguments(self):
+        """
+        Parses a bracketed, comma separated argument list
+        """
+        self._expect(PUNCT, '(')
+        args = [self._value()]
+        while self._at(PUNCT, ','):
+            self._advance()
+            args.append(self._value())
+        self._expect(PUNCT, ')')
+        return args
+
+    def _property(self, keyword):
+        """
+        Parses the name and value of a field or info entry
+        """
+        start = self.token
+        args = self._arguments()
+        if len(args) != 2:
+            raise DbParseError("{} takes a name and a value".format(keyword),
+                               self._line_of(start))
+        return Field(args[0], args[1])
+
+    def _position(self, token):
+        """
+        Returns the line and column, both counted from 1, of a token
+        """
+        line = self._line_of(token)
+        column = token.start - \
+            self.text.rfind(self._newline, 0, token.start)
+        return line, column
+
+    def _record(self, keyword):
+        """
+        Parses a record definition and its optional body
+        """
+        line, column = self._position(keyword)
+        start = self.token
+        args = self._arguments()
+        if len(args) != 2:
+            raise DbParseError("record takes a type and a name",
+                               self._line_of(start))
+        rec_type, pv = args
+        fields = []
+        infos = []
+        aliases = []
+
+        if self._at(PUNCT, '{'):
+            start = self._advance()
+            while not self._at(PUNCT, '}'):
+                if self._at(EOF):
+                    raise DbParseError("Unterminated record '{}'".format(pv),
+                                       self._line_of(start))
+                fast = self._property_re.match(self.text, self.token.start)
+                if fast is not None:
+                    name, value, keyword = fast.group('name', 'value',
+                                                      'keyword')
+                    field = Field(_unquote(self._decode(name)),
+                                  _unquote(self._decode(value)))
+                    if keyword == 'field' or keyword == b'field':
+                        fields.append(field)
+                    else:
+                        infos.append(field)
+                    self.pos = fast.end()
+                    self.token = self._lex()
+                    continue
+
+                token = self._advance()
+                if token.kind != BARE or not self._at(PUNCT, '('):
+                    continue
+                if token.value == 'field':
+                    fields.append(self._property('field'))
+                elif token.value == 'info':
+                    infos.append(self._property('info'))
+                elif token.value == 'alias':
+                    aliases.extend(self._arguments()[:1])
+                else:
+                    self._arguments()
+            self._advance()
+
+        return Record(rec_type.strip(), pv, infos, fields, aliases, line,
+                      column)
+
+    def _statement(self, records):
+        """
+        Parses a single top level statement, appending any record found
+        """
+        token = self._advance()
+        if token.kind == BARE and token.value == 'include' and \
+                self._at(STRING):
+            # remember where the included records belong
+            self.includes.append((len(records), self._advance().value))
+            return
+        if token.kind != BARE or not self._at(PUNCT, '('):
+            return
+        if token.value in _RECORD_KEYWORDS:
+            records.append(self._record(token))
+            return
+
+        args = self._arguments()
+        if token.value == 'alias' and len(args) == 2:
+            self.aliases.append(args)
+        if self._at(PUNCT, '{'):
+            self._skip_block('{', '}')
+
+    def scan_includes(self):
+        """
+        Finds the names included by the text from its tokens alone, taking
+        an include directive wherever parse would: outside of any brackets
+        or braces
+
+        Returns:
+            the list of included names, in the order they are included
+        """
+        includes = []
+        depth = 0
+        while not self._at(EOF):
+            token = self._advance()
+            if token.kind == PUNCT:
+                if token.value in '({':
+                    depth += 1
+                elif token.value in ')}' and depth > 0:
+                    depth -= 1
+            elif depth == 0 and token.kind == BARE and \
+                    token.value == 'include' and self._at(STRING):
+                includes.append(self._advance().value)
+        return includes
+
+    def parse(self):
+        """
+        Parses the whole text
+
+        Returns:
+            the list of records in the text
+        """
+        records = []
+        while not self._at(EOF):
+            self._statement(records)
+
+        if self.aliases:
+            by_name = {rec.pv: rec for rec in records}
+            for target, alias in self.aliases:
+                if target in by_name:
+                    by_name[target].aliases.append(alias)
+        return records
+
+
+def scan_includes(text):
+    """
+    Finds the names included by the text of a db without parsing its
+    records, following the same grammar as parse_db
+
+    Args:
+        text: the text of the db, as a string or a bytes-like object
+
+    Returns:
+        the list of included names, in the order they are included
+    """
+    return _Parser(text).scan_includes()
+
+
+def parse_db(db_file):
+    """
+    This method will parse the text found in the EPICS db files to form groups
+    of Record and Field instances.
+
+    The text is tokenized and parsed in a single pass, so the time taken is
+    linear in the size of the file. The text may be a string or a bytes-like
+    object such as a memory mapped file, which is decoded a token at a time
+    so the file never needs to be held in memory as a whole.
+    """
+    parser = _Parser(db_file.get_text())
+    records = parser.parse()
+    return Db(db_file.get_dir(), records, parser.includes)
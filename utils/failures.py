@@ -0,0 +1,166 @@
+"""
+This file holds the failure record the checks of db_checks return, and the
+formats failures are written out in. A failure keeps what failed and where
+rather than a formatted message, so failures that are only counted or
+compared are never formatted, and the formats can give each part its own
+field.
+"""
+import json
+import os
+
+ERROR = "error"
+WARNING = "warning"
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "DbUnitChecker"
+
+
+class Failure:
+    """
+    This class holds a single failure of a check: the name of the check, the
+    file and the PV of the record that failed, the line and column of the
+    record where known, the severity and the parameters of the message. The
+    message is formatted from a template with the PV and the parameters
+    each time it is asked for.
+    """
+    __slots__ = ('check', 'file', 'pv', 'line', 'column', 'severity',
+                 'template', 'params')
+
+    def __init__(self, template, pv=None, params=None, check=None, file=None,
+                 line=None, column=None, severity=ERROR):
+        """
+        Args:
+            template: the message, with {pv} and the names of the parameters
+                in braces where they are put
+            pv: the name of the PV of the record that failed, if any
+            params: a dictionary of the other values in the message
+            check: the name of the check that failed
+            file: the path of the file that failed
+            line: the line of the record that failed, counted from 1
+            column: the column of the record that failed, counted from 1
+            severity: ERROR or WARNING
+        """
+        self.template = template
+        self.pv = pv
+        self.params = params if params is not None else {}
+        self.check = check
+        self.file = file
+        self.line = line
+        self.column = column
+        self.severity = severity
+
+    @staticmethod
+    def of_record(template, rec, **params):
+        """
+        Creates a failure of a record, at the position it was defined
+
+        Args:
+            template: the message, as for a Failure
+            rec: the Record that failed
+            params: the other values in the message
+        """
+        return Failure(template, rec.pv, params, line=rec.line,
+                       column=rec.column)
+
+    @property
+    def message(self):
+        return self.template.format(pv=self.pv, **self.params)
+
+    def _key(self):
+        return (self.check, self.file, self.pv, self.line, self.column,
+                self.severity, self.template,
+                tuple(sorted(self.params.items())))
+
+    def __eq__(self, other):
+        if not isinstance(other, Failure):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return "Failure({!r}, {!r}, {!r}, line={!r})".format(
+            self.check, self.file, self.message, self.line)
+
+    def as_dict(self):
+        """
+        Returns the failure as a JSON serialisable dictionary
+        """
+        return {"check": self.check, "file": self.file, "pv": self.pv,
+                "line": self.line, "column": self.column,
+                "severity": self.severity, "message": self.message,
+                "params": self.params}
+
+
+def write_jsonl(failures, stream):
+    """
+    Writes failures as JSON lines, one object as given by Failure.as_dict
+    per line
+
+    Args:
+        failures: an iterable of Failure
+        stream: the stream to write to
+
+    Returns:
+        the number of failures written
+    """
+    count = 0
+    for failure in failures:
+        stream.write(json.dumps(failure.as_dict()) + "\n")
+        count += 1
+    return count
+
+
+def _uri(path):
+    if os.path.isabs(path):
+        return "file://" + ("" if path.startswith("/") else "/") + \
+            path.replace(os.sep, "/")
+    return path.replace(os.sep, "/")
+
+
+def sarif_log(failures, checks=()):
+    """
+    Builds a SARIF 2.1.0 log of failures, as read by code scanning tools
+
+    Args:
+        failures: an iterable of Failure
+        checks: the names of the checks that were run, which are listed as
+            the rules of the tool along with any that failed
+
+    Returns:
+        the log, as a JSON serialisable dictionary
+    """
+    rules = list(checks)
+    results = []
+    for failure in failures:
+        if failure.check not in rules:
+            rules.append(failure.check)
+        location = {"artifactLocation": {"uri": _uri(failure.file)}}
+        if failure.line is not None:
+            location["region"] = {"startLine": failure.line}
+            if failure.column is not None:
+                location["region"]["startColumn"] = failure.column
+        properties = dict(failure.params)
+        if failure.pv is not None:
+            properties["pv"] = failure.pv
+        results.append({
+            "ruleId": failure.check,
+            "ruleIndex": rules.index(failure.check),
+            "level": failure.severity,
+            "message": {"text": failure.message},
+            "locations": [{"physicalLocation": location}],
+            "properties": properties,
+        })
+    return {
+        "version": "2.1.0",
+        "$schema": SARIF_SCHEMA,
+        "runs": [{
+            "tool": {"driver": {"name": TOOL_NAME,
+                                "rules": [{"id": rule} for rule in rules]}},
+            "results": results,
+        }],
+    }
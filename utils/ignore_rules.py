@@ -0,0 +1,151 @@
+"""
+This file holds the rules for skipping checks on certain files, loaded from
+a declarative config file and compiled once into a matcher
+"""
+import fnmatch
+import json
+import os
+import re
+from collections import defaultdict
+
+# The key of the reason for skipping every check on a path
+ALL_CHECKS = "*"
+
+# The config of the rules the checker is run with
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests",
+    "ignore_rules.json")
+
+_RULE_KEYS = {"reason", "files", "paths", "checks"}
+
+# The tests which report a check of db_checks, where the name of the test is
+# not test_ followed by the name of the check
+_TEST_NAMES = {"multiple_instances": "test_multiple_pvs_warning"}
+
+
+def test_name(check):
+    """
+    Returns the name of the test which reports a check of db_checks, which
+    is the name the rules refer to the check by
+    """
+    return _TEST_NAMES.get(check, "test_" + check)
+
+
+class IgnoreRule:
+    """
+    This class holds a single rule, which skips checks on files with one of
+    a set of names or with a path matching one of a list of globs.
+
+    Globs are matched case sensitively against the whole path, so a glob
+    such as "*optics*" skips everything under a directory of that name.
+    """
+    __slots__ = ('reason', 'files', 'pattern', 'checks')
+
+    def __init__(self, reason, files=(), paths=(), checks=None):
+        self.reason = reason
+        self.files = frozenset(files)
+        self.pattern = re.compile("|".join(
+            fnmatch.translate(glob) for glob in paths)) if paths else None
+        self.checks = frozenset(checks) if checks is not None else None
+
+    def matches_path(self, path):
+        return self.pattern is not None and \
+            self.pattern.match(path) is not None
+
+
+class IgnoreRules:
+    """
+    This class matches paths against a list of rules.
+
+    Rules on file names are found with a dictionary lookup of the name of
+    the file, so only the rules on path globs are tried against each path.
+    """
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self._by_file = defaultdict(list)
+        self._by_path = []
+        for rule in self.rules:
+            for name in rule.files:
+                self._by_file[name].append(rule)
+            if rule.pattern is not None:
+                self._by_path.append(rule)
+
+    @staticmethod
+    def load(path):
+        """
+        Loads the rules from a JSON config file
+
+        Args:
+            path: the config file, holding a list of "rules" each with a
+                "reason", the "files" names and/or "paths" globs it applies
+                to and optionally the "checks" it skips, which are all
+                checks if not given
+
+        Returns:
+            the compiled rules
+        """
+        with open(path) as _file:
+            config = json.load(_file)
+
+        rules = []
+        for entry in config.get("rules", []):
+            unknown = set(entry) - _RULE_KEYS
+            if unknown:
+                raise ValueError("Unknown keys {} in ignore rule in {}".format(
+                    sorted(unknown), path))
+            if "reason" not in entry:
+                raise ValueError("Ignore rule without a reason in {}".format(
+                    path))
+            rules.append(IgnoreRule(entry["reason"], entry.get("files", ()),
+                                    entry.get("paths", ()),
+                                    entry.get("checks")))
+        return IgnoreRules(rules)
+
+    def skips(self, path):
+        """
+        Finds the checks skipped on a path
+
+        Args:
+            path: the path of a file, or of a directory for the checks that
+                span a directory
+
+        Returns:
+            a dictionary of check name to the reason it is skipped, with the
+            reason for skipping every check under ALL_CHECKS. Where several
+            rules match, the first rule in the config gives the reason.
+        """
+        matched = self._by_file.get(os.path.basename(path), [])
+        matched = matched + [rule for rule in self._by_path
+                             if rule.matches_path(path)]
+        skipped = {}
+        for rule in sorted(matched, key=self.rules.index):
+            for check in rule.checks if rule.checks is not None \
+                    else (ALL_CHECKS,):
+                skipped.setdefault(check, rule.reason)
+        return skipped
+
+    def skipped_checks(self, path, checks):
+        """
+        Finds which of a list of checks of db_checks are skipped on a path
+
+        Args:
+            path: the path of a file
+            checks: the names of the checks, e.g. "units_valid"
+
+        Returns:
+            a dictionary of the name of each skipped check to the reason
+        """
+        skips = self.skips(path)
+        skipped = {}
+        for check in checks:
+            reason = skips.get(test_name(check), skips.get(ALL_CHECKS))
+            if reason is not None:
+                skipped[check] = reason
+        return skipped
+
+    def skips_all(self, path):
+        """
+        Returns whether every check is skipped on a path, so that the file
+        need not be read at all
+        """
+        return ALL_CHECKS in self.skips(path)
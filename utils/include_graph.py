@@ -0,0 +1,169 @@
+"""
+This file holds a graph of the include directives between the scanned db
+files, used to compose the records of each file with the records of the
+files it includes while parsing every shared file only once
+"""
+import mmap
+import os
+from collections import defaultdict
+
+from .EPICS_collections import Db
+from .db_parser import scan_includes as _scan_text
+
+
+def scan_includes(filename):
+    """
+    Finds the names included by a file from the tokens of the parser,
+    without parsing its records. Files which do not mention include at all
+    are not tokenised.
+
+    Args:
+        filename: the absolute path of the file
+
+    Returns:
+        the list of included names, in the order they are included
+    """
+    with open(filename, "rb") as _file:
+        if os.fstat(_file.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data.find(b"include") == -1:
+                return []
+            return _scan_text(data)
+
+
+class IncludeGraph:
+    """
+    This class holds the include edges between a set of files.
+
+    Included names are resolved relative to the including file and then by
+    file name among the scanned files. Files that are included by another
+    file are kept once parsed, as are their composed records, so a db
+    included by many files is parsed and composed once. Other files are
+    parsed when asked for and not kept.
+    """
+    def __init__(self, filenames, load):
+        """
+        Args:
+            filenames: the absolute paths of the scanned files
+            load: a function which returns the parsed db of a path, or None
+                if the file is not in EPICS format
+        """
+        self.load = load
+        self._by_name = {}
+        self._resolved = {}
+        self._parsed = {}
+        self._composed = {}
+        self.includes = {}
+        self.includers = defaultdict(set)
+        self.missing = []
+
+        filenames = list(filenames)
+        for filename in filenames:
+            self._by_name.setdefault(os.path.basename(filename), filename)
+        for filename in filenames:
+            self._add(filename)
+
+    def _add(self, filename):
+        targets = self.includes[filename] = []
+        for name in scan_includes(filename):
+            target = self.resolve(name, filename)
+            if target is None:
+                self.missing.append((filename, name))
+                continue
+            targets.append(target)
+            self.includers[target].add(filename)
+            if target not in self.includes:
+                self._add(target)
+
+    def resolve(self, name, includer):
+        """
+        Finds the file an include directive refers to
+
+        Args:
+            name: the included name
+            includer: the absolute path of the including file
+
+        Returns:
+            the absolute path of the included file, or None if not found
+        """
+        key = (name, os.path.dirname(includer))
+        if key not in self._resolved:
+            path = os.path.join(os.path.dirname(includer), name)
+            self._resolved[key] = os.path.abspath(path) \
+                if os.path.isfile(path) \
+                else self._by_name.get(os.path.basename(name))
+        return self._resolved[key]
+
+    def dependents(self, filenames):
+        """
+        Finds every file which includes one of a set of files, directly or
+        through other includes
+
+        Args:
+            filenames: the absolute paths of the files
+
+        Returns:
+            the set of including files, not including the files given
+        """
+        found = set()
+        pending = list(filenames)
+        while pending:
+            for includer in self.includers.get(pending.pop(), ()):
+                if includer not in found:
+                    found.add(includer)
+                    pending.append(includer)
+        return found - set(filenames)
+
+    def _parse(self, filename):
+        if filename in self._parsed:
+            return self._parsed[filename]
+        db = self.load(filename)
+        if filename in self.includers:
+            self._parsed[filename] = db
+        return db
+
+    def load_with_includes(self, filename, _including=()):
+        """
+        Parses a file and composes its records with those of the files it
+        includes, in the order they are included. An include that is not
+        found, or that would include a file within itself, is skipped.
+
+        Args:
+            filename: the absolute path of the file
+
+        Returns:
+            a tuple of the parsed db of the file alone and the composed db,
+            which are the same if the file includes nothing, or a tuple of
+            None and None if the file is not in EPICS format
+        """
+        if filename in self._composed:
+            return self._parsed[filename], self._composed[filename]
+        db = self._parse(filename)
+        if db is None or not db.includes:
+            return db, db
+
+        including = _including + (filename,)
+        records = []
+        position = 0
+        for index, name in db.includes:
+            records.extend(db.records[position:index])
+            position = index
+            target = self.resolve(name, filename)
+            if target is None or target in including:
+                continue
+            _, included = self.load_with_includes(target, including)
+            if included is not None:
+                records.extend(included.records)
+        records.extend(db.records[position:])
+
+        composed = Db(db.directory, records, db.includes)
+        if filename in self.includers:
+            self._composed[filename] = composed
+        return db, composed
+
+    def composed(self, filename):
+        """
+        Returns the composed db of a file, as given by load_with_includes
+        """
+        return self.load_with_includes(filename)[1]
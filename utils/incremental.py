@@ -0,0 +1,264 @@
+"""
+This file holds the stored results of a previous run and the logic to work
+out which files need checking again, so that a run can re-check only the
+files that have changed
+"""
+import glob
+import hashlib
+import json
+import os
+import stat as stat_module
+import subprocess
+import sys
+
+from .loader import is_candidate
+from .parse_cache import parser_version
+from .walker import DirectoryWalker
+
+BASELINE_VERSION = 2
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _check_sources():
+    """
+    Lists the sources that decide the results of checking a file: every
+    module of the checker, as the checks, the loading of files, the index
+    and the composing of includes all shape the results
+    """
+    root = os.path.dirname(_HERE)
+    return sorted(glob.glob(os.path.join(_HERE, "*.py"))) + [
+        os.path.join(root, "tests", "pv_unit_tests.py"),
+        os.path.join(root, "run_tests.py"),
+    ]
+
+
+def checks_key(rules_path, options=None):
+    """
+    Builds a key from the checks, the ignore rules, the parser and the
+    options of the run, so that results from a run with any of them
+    different are never used
+
+    Args:
+        rules_path: the path of the ignore rules config
+        options: a JSON serialisable dictionary of the options of the run
+            that change the results, such as whether includes are composed
+
+    Returns:
+        the key, as a hex string
+    """
+    key = hashlib.sha1(parser_version().encode("utf-8"))
+    key.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    rules_path = os.path.realpath(rules_path)
+    for path in _check_sources() + [rules_path]:
+        key.update(path.encode("utf-8"))
+        try:
+            with open(path, "rb") as _file:
+                key.update(_file.read())
+        except OSError:
+            key.update(b"\0missing")
+    return key.hexdigest()
+
+
+class Baseline:
+    """
+    This class holds the check results of every file from a previous run,
+    along with the modification time and size each file had when checked
+    and the key of the checks that gave the results
+    """
+    def __init__(self, files=None, key=None):
+        self.files = files if files is not None else {}
+        self.key = key
+
+    @staticmethod
+    def load(path, key=None):
+        """
+        Loads a stored baseline
+
+        Args:
+            path: the file the baseline was saved to
+            key: the key of the checks as given by checks_key, a baseline
+                saved with a different key is not used
+
+        Returns:
+            the baseline, or None if there is no usable baseline at the path
+        """
+        try:
+            with open(path) as _file:
+                data = json.load(_file)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != BASELINE_VERSION or \
+                data.get("key") != key:
+            return None
+        return Baseline(data["files"], key)
+
+    def save(self, path):
+        """
+        Saves the baseline, replacing any previous baseline at the path
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as _file:
+            json.dump({"version": BASELINE_VERSION, "key": self.key,
+                       "files": self.files}, _file)
+        os.replace(temp_path, path)
+
+    def update(self, filename, result, stat):
+        """
+        Records the result of checking a file
+
+        Args:
+            filename: the absolute path of the file
+            result: the JSON serialisable result of the checks, or None if
+                the file is not in EPICS format
+            stat: the result of os.stat on the file taken before it was
+                read, so that a file changed while it was being checked is
+                checked again by the next run
+        """
+        self.files[filename] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "result": result,
+        }
+
+    def remove(self, filename):
+        self.files.pop(filename, None)
+
+    def is_stale(self, filename, stat=None):
+        """
+        Returns whether a file has changed since it was checked
+
+        Args:
+            filename: the absolute path of the file
+            stat: the result of stat on the file, if already known
+        """
+        entry = self.files.get(filename)
+        if entry is None:
+            return True
+        if stat is None:
+            stat = os.stat(filename)
+        return (stat.st_mtime_ns, stat.st_size) != \
+            (entry["mtime"], entry["size"])
+
+    def results(self):
+        """
+        Yields the path and result of each file in EPICS format, sorted by
+        path so that reports are stable between runs
+        """
+        for filename in sorted(self.files):
+            result = self.files[filename]["result"]
+            if result is not None:
+                yield filename, result
+
+
+def read_file_list(source):
+    """
+    Reads a list of files, one per line or separated by NUL characters as
+    written by git's -z option
+
+    Args:
+        source: the file to read, or '-' to read from stdin
+
+    Returns:
+        the list of absolute paths
+    """
+    if source == '-':
+        text = sys.stdin.read()
+    else:
+        with open(source) as _file:
+            text = _file.read()
+    if "\0" in text:
+        # names separated by NUL may have any other character in them
+        return [os.path.abspath(name) for name in text.split("\0") if name]
+    lines = text.splitlines()
+    return [os.path.abspath(line.strip()) for line in lines if line.strip()]
+
+
+def _git_lines(directory, *args):
+    output = subprocess.run(
+        ["git", "-C", directory] + list(args), check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True).stdout
+    return [os.path.abspath(os.path.join(directory, line))
+            for line in output.splitlines() if line]
+
+
+def changed_files_since(ref, directories):
+    """
+    Lists the files changed in each directory since a git ref, including
+    uncommitted and untracked files
+
+    Args:
+        ref: the git ref to compare against
+        directories: the directories to look in
+
+    Returns:
+        a tuple of the changed files and the list of directories that could
+        not be compared with git, e.g. because they are not in a repository
+        containing the ref
+    """
+    changed = []
+    failed = []
+    for directory in directories:
+        try:
+            changed.extend(_git_lines(
+                directory, "diff", "--name-only", "--relative", ref))
+            changed.extend(_git_lines(
+                directory, "ls-files", "--others", "--exclude-standard"))
+        except (OSError, subprocess.CalledProcessError):
+            failed.append(directory)
+    return changed, failed
+
+
+def files_to_check(baseline, directories, file_types, changed=(),
+                   scan_dirs=(), walker=None, stats=None):
+    """
+    Works out which files need checking again and which have been removed
+
+    Args:
+        baseline: the baseline from the previous run
+        directories: the input directories of the run
+        file_types: a list of file extensions that are expected
+        changed: paths known to have changed; paths outside the input
+            directories or of other types are ignored
+        scan_dirs: directories to find changes in by comparing modification
+            times with the baseline
+        walker: an optional DirectoryWalker to search the directories with
+        stats: an optional dictionary to keep the stat result of each file
+            to check in, as find_files does
+
+    Returns:
+        a tuple of the list of files to check and the list of files to
+        remove from the baseline
+    """
+    walker = walker if walker is not None else DirectoryWalker()
+    stats = stats if stats is not None else {}
+    to_check = []
+    removed = []
+
+    seen = set()
+    for filename, stat in walker.find(scan_dirs, file_types):
+        seen.add(filename)
+        if baseline.is_stale(filename, stat):
+            to_check.append(filename)
+            stats[filename] = stat
+    roots = tuple(os.path.join(os.path.abspath(directory), "")
+                  for directory in scan_dirs)
+    removed.extend(f for f in baseline.files
+                   if f.startswith(roots) and f not in seen)
+
+    for filename in changed:
+        if not any(is_candidate(filename, directory, file_types, walker)
+                   for directory in directories):
+            continue
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            stat = None
+        if stat is not None and stat_module.S_ISREG(stat.st_mode):
+            to_check.append(filename)
+            stats[filename] = stat
+        elif filename in baseline.files:
+            removed.append(filename)
+
+    return sorted(set(to_check)), sorted(set(removed))
@@ -1,21 +1,19 @@
-from os.path import join
+from collections import deque
 from .db_parser import parse_db
+from .walker import DirectoryWalker
+import mmap
 import os
+import re
+import time
 
 
-DIRECTORIES_TO_ALWAYS_IGNORE = [
-    ".git",
-    "O.Common",
-    "O.windows-x64",
-    "O.win32-x86",
-    "bin",
-    "lib",
-    "include",
-    ".project",
-    ".ci",
-    "areaDetector",  # Has some huge DBs which take forever to parse.
-    ".vs"
-]
+# A record or grecord definition, or an include of another db, the least a
+# file in EPICS format must have
+_RECORD_RE = re.compile(rb'record\s*\(')
+_INCLUDE_RE = re.compile(rb'include[ \t]+"')
+
+# The number of bytes at the start of a file looked at for binary content
+BINARY_SNIFF_SIZE = 8192
 
 
 class SingleFile:
@@ -34,55 +32,352 @@ class SingleFile:
         return self.text
 
 
-def _load_files(path, file_types):
+def is_candidate(filename, path, file_types, walker=None):
     """
-    This method will search a given directory, including all sub-directories,
-    for files of type in file_types.
-    It will then attempt to determine if the files are in EPICS format.
+    This method checks whether a file would be found by searching a given
+    directory for files of type in file_types.
 
     Args:
-        path: the path to load DBs from
+        filename: the absolute path of the file
+        path: the directory that would be searched
+        file_types: a list of file extensions that are expected
+        walker: the DirectoryWalker that would search the directory, which
+            decides the directories skipped
+
+    Returns:
+        True if the file would be found, False otherwise
+    """
+    walker = walker if walker is not None else DirectoryWalker()
+    try:
+        relative = os.path.relpath(filename, os.path.abspath(path))
+    except ValueError:
+        # on a different drive
+        return False
+    if relative.startswith(os.pardir + os.sep):
+        return False
+    directories = relative.split(os.sep)[:-1]
+    return not any(walker.prunes(d) for d in directories) \
+        and any(filename.endswith(file_type) for file_type in file_types)
+
+
+def is_epics(data, sniff_size=None):
+    """
+    This method classifies a file as being in EPICS format from its bytes,
+    without decoding it.
+
+    Args:
+        data: the bytes of the file, or a memory mapped file
+        sniff_size: the number of bytes at the start of the file to search
+            for a record definition, or None to search the whole file
+
+    Returns:
+        False if the file is binary or has no record definition or include
+        within the searched bytes, True otherwise
+    """
+    if data[:BINARY_SNIFF_SIZE].find(b"\0") != -1:
+        return False
+    end = len(data) if sniff_size is None else min(sniff_size, len(data))
+    return _RECORD_RE.search(data, 0, end) is not None or \
+        _INCLUDE_RE.search(data, 0, end) is not None
+
+
+def _lap(timings, stage, start):
+    """
+    Adds the time since start to a stage of the timings, if timings are
+    being kept, and returns the current time
+    """
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+
+def _load_file(filename, stat, cache=None, sniff_size=None, timings=None):
+    """
+    This method parses a single file if it is in EPICS format.
+
+    The file is memory mapped rather than read, so the operating system pages
+    its contents in as the parser reaches them and only the parsed records
+    are held in memory.
+
+    Args:
+        filename: the absolute path of the file
+        stat: the result of os.stat for the file
+        cache: an optional ParseCache to store the parsed db in
+        sniff_size: the number of bytes to search for a record definition
+            before deciding the file is not in EPICS format, or None to
+            search the whole file
+        timings: an optional dictionary which the seconds spent reading,
+            parsing and caching the file are added to
+
+    Returns:
+        the parsed db, or None if the file is not in EPICS format
+    """
+    start = time.perf_counter()
+    try:
+        with open(filename, "rb") as _file:
+            if stat.st_size == 0:
+                # an empty file cannot be mapped
+                data = b""
+            else:
+                data = mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception as e:
+        raise Exception(f"{str(e)} found in {filename}")
+
+    try:
+        return _parse_data(filename, stat, data, cache, sniff_size, timings,
+                           start)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def _parse_data(filename, stat, data, cache, sniff_size, timings, start):
+    """
+    This method parses the contents of a file if it is in EPICS format,
+    storing the result in the cache.
+
+    Args:
+        data: the bytes of the file, or the memory mapped file
+        start: the time reading the file started, for the timings
+    """
+    # check db is EPICS
+    if not is_epics(data, sniff_size):
+        start = _lap(timings, "read", start)
+        # a file only rejected from its first bytes is not cached, as a
+        # later run may search more of it
+        if cache is not None and sniff_size is None:
+            cache.store(filename, stat, None)
+            _lap(timings, "cache", start)
+        return None
+    start = _lap(timings, "read", start)
+
+    db = parse_file(SingleFile(filename, data, int(stat.st_mtime)))
+    start = _lap(timings, "parse", start)
+    if cache is not None:
+        # the contents are only hashed for a cache that compares them, and
+        # the hashing is only imported then
+        text_hash = None
+        if cache.use_hash:
+            from .parse_cache import content_hash
+            text_hash = content_hash(data)
+        cache.store(filename, stat, db, text_hash)
+        _lap(timings, "cache", start)
+    return db
+
+
+class Prefetched:
+    """
+    This class holds a file read ahead of parsing: either its parsed db
+    found in the cache, or the result of os.stat and its contents
+    """
+    __slots__ = ('found', 'db', 'stat', 'data', 'seconds')
+
+    def __init__(self, found=False, db=None, stat=None, data=None,
+                 seconds=0.0):
+        self.found = found
+        self.db = db
+        self.stat = stat
+        self.data = data
+        self.seconds = seconds
+
+
+def fetch_file(filename, cache=None, stat=None):
+    """
+    This method does the file I/O needed to parse a file, so that it can be
+    done on another thread.
+
+    Args:
+        filename: the absolute path of the file
+        cache: an optional ParseCache to look the file up in first
+        stat: the result of stat on the file, if already known
+
+    Returns:
+        the Prefetched file
+    """
+    start = time.perf_counter()
+    if cache is not None:
+        found, db = cache.lookup(filename, stat)
+        if found:
+            return Prefetched(True, db, seconds=time.perf_counter() - start)
+    try:
+        if stat is None:
+            stat = os.stat(filename)
+        with open(filename, "rb") as _file:
+            data = _file.read()
+    except Exception as e:
+        raise Exception(f"{str(e)} found in {filename}")
+    return Prefetched(stat=stat, data=data,
+                      seconds=time.perf_counter() - start)
+
+
+def prefetch(filenames, threads, cache=None, window=None, stats=None):
+    """
+    Generator which reads files on a pool of threads ahead of the caller,
+    for file systems such as network shares where the latency of each read
+    dominates. Files are yielded in the order given, and at most window
+    files are read ahead so memory stays bounded.
+
+    Args:
+        filenames: the absolute paths of the files
+        threads: the number of files to read at once
+        cache: an optional ParseCache to look each file up in first
+        window: the number of files to read ahead, by default four per
+            thread
+        stats: an optional dictionary of the stat results of files found
+            by find_files, which each file's stat is taken from
+
+    Yields:
+        (filename, Prefetched) tuples
+    """
+    # imported here as the thread pool is only used when asked for
+    from concurrent.futures import ThreadPoolExecutor
+
+    window = window if window is not None else threads * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for filename in filenames:
+            stat = stats.pop(filename, None) if stats is not None else None
+            pending.append((filename, executor.submit(fetch_file, filename,
+                                                      cache, stat)))
+            if len(pending) >= window:
+                filename, future = pending.popleft()
+                yield filename, future.result()
+        while pending:
+            filename, future = pending.popleft()
+            yield filename, future.result()
+
+
+def parse_file(db_file):
+    """
+    Parses a single loaded file.
+
+    Args:
+        db_file: the file to parse, holding its text or bytes
+
+    Returns:
+        the parsed db
+    """
+    try:
+        return parse_db(db_file)
+    except (ValueError, LookupError) as e:
+        raise ValueError("Failed to parse DB '{}'. Exception was: {}"
+                         .format(db_file.directory, e))
+
+
+def find_files(paths, file_types, walker=None, stats=None):
+    """
+    Generator of the candidate files in a list of directories.
+
+    Args:
+        paths: the paths to search
+        file_types: a list of file extensions that are expected
+        walker: an optional DirectoryWalker to search with, which decides
+            the directories skipped and keeps the duplicate paths skipped
+        stats: an optional dictionary to keep the stat result of each file
+            found in, taken while searching, so that loading the file need
+            not stat it again
+
+    Yields:
+        the absolute path of each candidate file, with each physical file
+        only given once
+    """
+    walker = walker if walker is not None else DirectoryWalker()
+    for filename, stat in walker.find(paths, file_types):
+        if stats is not None:
+            stats[filename] = stat
+        yield filename
+
+
+def given_files(filenames, file_types, walker=None):
+    """
+    Generator of the candidate files among paths given explicitly, such as
+    the files staged for a commit, without searching any directory.
+
+    Args:
+        filenames: the paths of the files, absolute or relative to the
+            working directory
         file_types: a list of file extensions that are expected
+        walker: an optional DirectoryWalker deciding the directories skipped
+            below the working directory
 
     Yields:
-        files that are in EPICS format
+        the absolute path of each candidate file that exists, once each
     """
-    for root, dirs, files in os.walk(os.path.normpath(path)):
-        dirs[:] = [d for d in dirs if d not in DIRECTORIES_TO_ALWAYS_IGNORE]
+    root = os.getcwd()
+    seen = set()
+    for filename in filenames:
+        filename = os.path.abspath(filename)
+        if filename in seen or not os.path.isfile(filename):
+            continue
+        seen.add(filename)
+        try:
+            within = os.path.commonpath([root, filename]) == root
+        except ValueError:
+            # on a different drive
+            within = False
+        directory = root if within else os.path.dirname(filename)
+        if is_candidate(filename, directory, file_types, walker):
+            yield filename
 
-        for f in [f for f in files if any(f.endswith(file_type) for
-                                          file_type in file_types)]:
-            filename = os.path.abspath(join(root, f))
 
-            try:
-                with open(filename) as _file:
-                    text = _file.read()
-            except Exception as e:
-                raise Exception(f"{str(e)} found in {filename}")
+def parsed_file(filename, cache=None, sniff_size=None, timings=None,
+                prefetched=None, stat=None):
+    """
+    Loads and parses a single file.
 
-            # check db is EPICS
-            if not(text.find("record") == -1):
+    Args:
+        filename: the absolute path of the file
+        cache: an optional ParseCache to take the parsed db from, which is
+            updated when the file has changed
+        sniff_size: the number of bytes to search for a record definition,
+            or None to search the whole file
+        timings: an optional dictionary which the seconds spent reading,
+            parsing and caching the file are added to
+        prefetched: the file as already read by fetch_file, if it was
+        stat: the result of stat on the file, if already known
 
-                # get the timestamp of the last modification on the file
-                timestamp = os.stat(filename)[8]
+    Returns:
+        the parsed db, or None if the file is not in EPICS format
+    """
+    if prefetched is not None:
+        if prefetched.found:
+            _lap(timings, "cache", time.perf_counter() - prefetched.seconds)
+            return prefetched.db
+        start = time.perf_counter() - prefetched.seconds
+        return _parse_data(filename, prefetched.stat, prefetched.data, cache,
+                           sniff_size, timings, start)
 
-                yield SingleFile(filename, text, timestamp)
+    # the one stat of the file serves both the cache lookup and the load
+    if stat is None:
+        stat = os.stat(filename)
+    if cache is not None:
+        start = time.perf_counter()
+        found, db = cache.lookup(filename, stat)
+        _lap(timings, "cache", start)
+        if found:
+            return db
 
+    return _load_file(filename, stat, cache, sniff_size, timings)
 
-def parsed_files(path, file_types):
+
+def parsed_files(path, file_types, cache=None, sniff_size=None):
     """
-    Generator of parsed DB files.
+    Generator of parsed DB files. Each file is only parsed when the next db
+    is asked for, so a caller that drops each db once it is done with it
+    only ever holds one file in memory.
 
     Args:
         path: the path to load DBs from
         file_types: a list of file extensions that are expected
+        cache: an optional ParseCache to take unchanged files from
+        sniff_size: the number of bytes to search for a record definition,
+            or None to search the whole file
 
     Yields:
         parsed db files
     """
-    for db in _load_files(path, file_types):
-        try:
-            yield parse_db(db)
-        except (ValueError, LookupError) as e:
-            raise ValueError("Failed to parse DB '{}'. Exception was: {}"
-                             .format(db.directory, e))
+    for filename in DirectoryWalker().files(path, file_types):
+        db = parsed_file(filename, cache, sniff_size)
+        if db is not None:
+            yield db
@@ -0,0 +1,198 @@
+"""
+This file holds a macro expansion engine, which expands the $(NAME),
+${NAME} and $(NAME=default) macros of EPICS dbs and templates in the same
+way as msi and dbLoadRecords
+"""
+from collections import OrderedDict
+
+from .EPICS_collections import Db, Record, Field
+
+_CLOSING = {"(": ")", "{": "}"}
+
+
+def parse_macros(definitions):
+    """
+    Parses a string of macro definitions such as "P=IN:DEMO:,Q=MOT"
+
+    Args:
+        definitions: the comma separated NAME=VALUE definitions
+
+    Returns:
+        a dictionary of macro name to value
+    """
+    macros = {}
+    for definition in definitions.split(","):
+        name, _, value = definition.partition("=")
+        if name.strip():
+            macros[name.strip()] = value.strip()
+    return macros
+
+
+def _find_close(text, start, closing):
+    """
+    Returns the position of the bracket closing a macro reference that
+    starts at start, allowing for nested references, or -1 if it is not
+    closed
+    """
+    depth = 0
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            if depth == 0:
+                return pos if char == closing else -1
+            depth -= 1
+    return -1
+
+
+def _split_default(body):
+    """
+    Splits the body of a macro reference into the name and the default,
+    at the first '=' outside a nested reference
+    """
+    depth = 0
+    for pos, char in enumerate(body):
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        elif char == "=" and depth == 0:
+            return body[:pos], body[pos + 1:]
+    return body, None
+
+
+class MacroExpander:
+    """
+    This class expands macro references using a single set of macros.
+
+    Names, defaults and the values of macros may themselves contain macro
+    references, which are expanded in turn. References to undefined macros
+    without a default are left in place, as are references to a macro from
+    within its own value. The expansion of each string is remembered, as the
+    same values repeat across the records of a template.
+    """
+    def __init__(self, macros):
+        self.macros = dict(macros)
+        self._expanded = {}
+
+    def key(self):
+        """
+        Returns a hashable key for the set of macros
+        """
+        return frozenset(self.macros.items())
+
+    def expand(self, text):
+        """
+        Expands every macro reference in a string
+
+        Args:
+            text: the string to expand
+
+        Returns:
+            the expanded string
+        """
+        if text is None or "$" not in text:
+            return text
+        expanded = self._expanded.get(text)
+        if expanded is None:
+            expanded = self._expanded[text] = self._expand(text, frozenset())
+        return expanded
+
+    def _expand(self, text, expanding):
+        parts = []
+        pos = 0
+        while True:
+            start = text.find("$", pos)
+            if start == -1 or start + 1 >= len(text):
+                break
+            opening = text[start + 1]
+            if opening not in _CLOSING:
+                parts.append(text[pos:start + 1])
+                pos = start + 1
+                continue
+            end = _find_close(text, start + 2, _CLOSING[opening])
+            if end == -1:
+                break
+
+            parts.append(text[pos:start])
+            parts.append(self._reference(text[start:end + 1],
+                                         text[start + 2:end], expanding))
+            pos = end + 1
+        parts.append(text[pos:])
+        return "".join(parts)
+
+    def _reference(self, original, body, expanding):
+        raw_name, default = _split_default(body)
+        name = self._expand(raw_name, expanding)
+        if name in self.macros and name not in expanding:
+            return self._expand(self.macros[name], expanding | {name})
+        if default is not None:
+            return self._expand(default, expanding)
+        return original if name == raw_name else "$({})".format(name)
+
+    def expand_db(self, db):
+        """
+        Expands the names, fields, infos and aliases of every record in a db
+
+        Args:
+            db: the parsed db
+
+        Returns:
+            a new Db holding the expanded records, with the same path
+        """
+        expand = self.expand
+        return Db(db.directory, [
+            Record(rec.type, expand(rec.pv),
+                   [Field(info.name, expand(info.value))
+                    for info in rec.infos],
+                   [Field(field.name, expand(field.value))
+                    for field in rec.fields],
+                   [expand(alias) for alias in rec.aliases],
+                   rec.line, rec.column)
+            for rec in db.records])
+
+
+class TemplateExpander:
+    """
+    This class expands templates with sets of macros. Each template is only
+    loaded once, and the most recently expanded templates are remembered so
+    that a template loaded more than once with the same macros is only
+    expanded once.
+    """
+    def __init__(self, load, maxsize=128):
+        """
+        Args:
+            load: a function which returns the parsed db of a template path
+            maxsize: the number of expanded templates to remember
+        """
+        self.load = load
+        self.maxsize = maxsize
+        self._templates = {}
+        self._expanded = OrderedDict()
+
+    def expand(self, template, macros):
+        """
+        Expands a template with a set of macros
+
+        Args:
+            template: the path of the template
+            macros: a dictionary of macro name to value
+
+        Returns:
+            the expanded db, or None if the template is not in EPICS format
+        """
+        expander = MacroExpander(macros)
+        key = (template, expander.key())
+        if key in self._expanded:
+            self._expanded.move_to_end(key)
+            return self._expanded[key]
+
+        if template not in self._templates:
+            self._templates[template] = self.load(template)
+        db = self._templates[template]
+        expanded = self._expanded[key] = None if db is None else \
+            expander.expand_db(db)
+        if len(self._expanded) > self.maxsize:
+            self._expanded.popitem(last=False)
+        return expanded
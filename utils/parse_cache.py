@@ -0,0 +1,163 @@
+"""
+This file holds an on-disk cache of parsed db files, so that files which
+have not changed since the last run do not need to be parsed again
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def parser_version():
+    """
+    Builds a version string from the source of the modules that make up a
+    parsed Db, so entries written by a different parser are never used.
+    The version is only built once a cache is used, so that importing this
+    module stays cheap.
+    """
+    version = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in ("db_parser.py", "EPICS_collections.py"):
+        with open(os.path.join(here, module), "rb") as _file:
+            version.update(_file.read())
+    return version.hexdigest()
+
+
+def content_hash(data):
+    """
+    Returns the hash of the contents of a file, used to recognise files that
+    have been touched but not changed
+
+    Args:
+        data: the bytes of the file, or a bytes-like object such as a
+            memory mapped file
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+class ParseCache:
+    """
+    This class stores the parsed Db of each file as a pickle in a cache
+    directory. Each entry is keyed by the path of the file and is only
+    valid while the modification time and size of the file are unchanged.
+
+    Optionally, when the time or size differ the content hash is compared
+    as well, so a touched but unchanged file still does not need parsing.
+
+    Every entry is written to its own file and replaced atomically, so the
+    cache can be shared by several processes.
+    """
+    def __init__(self, directory, use_hash=False):
+        self.directory = directory
+        self.use_hash = use_hash
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, filename):
+        key = hashlib.sha1(filename.encode("utf-8", "surrogateescape"))
+        return os.path.join(self.directory, key.hexdigest() + ".pickle")
+
+    @staticmethod
+    def _read_header(_file):
+        header = pickle.load(_file)
+        if header.get("version") != parser_version():
+            return None
+        return header
+
+    def lookup(self, filename, stat=None):
+        """
+        This method looks up the parsed Db of a file
+
+        Args:
+            filename: the absolute path of the file
+            stat: the result of stat on the file, if already known
+
+        Returns:
+            a tuple of whether the file was found in the cache and the
+            cached Db, which is None for a file not in EPICS format
+        """
+        try:
+            with open(self._entry_path(filename), "rb") as _file:
+                header = self._read_header(_file)
+                if header is None or header["path"] != filename:
+                    return False, None
+
+                if stat is None:
+                    stat = os.stat(filename)
+                if (stat.st_mtime_ns, stat.st_size) == \
+                        (header["mtime"], header["size"]):
+                    return True, pickle.load(_file)
+
+                if not self.use_hash or header["hash"] is None:
+                    return False, None
+                with open(filename, "rb") as source:
+                    data = source.read()
+                if content_hash(data) != header["hash"]:
+                    return False, None
+                db = pickle.load(_file)
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError,
+                AttributeError, ImportError):
+            return False, None
+
+        # the file was only touched, refresh the entry so the next lookup
+        # does not need to hash it again
+        self.store(filename, stat, db, header["hash"])
+        return True, db
+
+    def store(self, filename, stat, db, text_hash=None):
+        """
+        This method stores the parsed Db of a file
+
+        Args:
+            filename: the absolute path of the file
+            stat: the result of os.stat on the file taken before it was read
+            db: the parsed Db, or None if the file is not in EPICS format
+            text_hash: the content hash of the file
+        """
+        header = {
+            "version": parser_version(),
+            "path": filename,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": text_hash,
+        }
+        entry_path = self._entry_path(filename)
+        # a temporary file of its own for each writer, so that processes and
+        # threads storing the same entry never write into each other's file
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp",
+                                             dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as _file:
+                pickle.dump(header, _file, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(db, _file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def evict_missing(self):
+        """
+        This method removes the entries of files that no longer exist, as
+        well as entries written by a different version of the parser
+
+        Returns:
+            the number of entries removed
+        """
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".pickle"):
+                continue
+            try:
+                with open(entry.path, "rb") as _file:
+                    header = self._read_header(_file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                header = None
+
+            if header is None or not os.path.exists(header["path"]):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,130 @@
+"""
+This file holds an index of every PV name across all scanned files, built
+up one file at a time, to allow checks that span more than one file
+"""
+import os
+from collections import defaultdict
+
+
+def summarise(db):
+    """
+    Reduces a parsed db to the parts needed by the index, in a form that is
+    cheap to pass between processes and to store as JSON
+
+    Args:
+        db: the parsed db
+
+    Returns:
+        a dictionary of the (name, record type) of each PV and alias, and
+        the (PV name, info name) of each logging info tag
+    """
+    pvs = []
+    logs = []
+    for rec in db.records:
+        pvs.append((rec.pv, rec.type))
+        pvs.extend((alias, rec.type) for alias in rec.aliases)
+        logs.extend((rec.pv, info.name) for info in rec.infos
+                    if info.name.lower().strip('"').startswith("log"))
+    return {"pvs": pvs, "logs": logs}
+
+
+class PvIndex:
+    """
+    This class maps each PV name to the files and record types it is
+    defined with, and keeps the logging info tags of each directory.
+
+    Files are grouped by the directory they are in, which for an IOC is
+    hopefully all the db files loaded by that IOC.
+    """
+    def __init__(self):
+        self.pvs = defaultdict(list)
+        self.logs = defaultdict(list)
+        self.files = defaultdict(set)
+        self.summaries = {}
+
+    def add(self, db):
+        """
+        Adds all the records of a parsed db to the index
+        """
+        self.add_summary(db.directory, summarise(db))
+
+    def add_summary(self, filename, summary):
+        """
+        Adds the summary of a single file, as returned by summarise
+        """
+        directory = os.path.dirname(filename)
+        self.files[directory].add(filename)
+        self.summaries[filename] = summary
+        for pv, rec_type in summary["pvs"]:
+            self.pvs[pv].append((filename, rec_type))
+        for pv, info_name in summary["logs"]:
+            self.logs[directory].append((filename, pv, info_name))
+
+    def remove(self, filename):
+        """
+        Removes a file from the index, so that it can be added again once it
+        has changed
+        """
+        summary = self.summaries.pop(filename, None)
+        if summary is None:
+            return
+        directory = os.path.dirname(filename)
+        self.files[directory].discard(filename)
+        if not self.files[directory]:
+            del self.files[directory]
+        for pv in {pv for pv, _ in summary["pvs"]}:
+            self.pvs[pv] = [d for d in self.pvs[pv] if d[0] != filename]
+            if not self.pvs[pv]:
+                del self.pvs[pv]
+        if summary["logs"]:
+            self.logs[directory] = [e for e in self.logs[directory]
+                                    if e[0] != filename]
+
+    def log_entries(self, directory):
+        """
+        Returns the (filename, PV name, info name) of each logging info tag in
+        a directory, ordered by file so the result does not depend on the
+        order the files were added in
+        """
+        return sorted(self.logs.get(directory, []), key=lambda e: e[0])
+
+    def directories(self):
+        """
+        Returns the directories which contain more than one file, sorted
+        """
+        return sorted(d for d, files in self.files.items() if len(files) > 1)
+
+    def duplicates(self, directories=None):
+        """
+        Finds the PVs that are defined in more than one file within the same
+        directory. Names with macros in them are left out, as alternative
+        templates in one directory share names such as $(P)SIM on purpose,
+        and only one of them is loaded with each set of macros.
+
+        Args:
+            directories: the directories to look in, or None for all
+
+        Returns:
+            a dictionary of directory to a sorted list of
+            (PV name, list of files) tuples
+        """
+        if directories is None:
+            pvs = self.pvs
+        else:
+            pvs = {pv for directory in directories
+                   for filename in self.files.get(directory, ())
+                   for pv, _ in self.summaries[filename]["pvs"]}
+        duplicates = defaultdict(list)
+        for pv in pvs:
+            if "$(" in pv or "${" in pv:
+                continue
+            files_by_dir = defaultdict(set)
+            for filename, _ in self.pvs[pv]:
+                files_by_dir[os.path.dirname(filename)].add(filename)
+            for directory, files in files_by_dir.items():
+                if len(files) > 1 and (directories is None or
+                                       directory in directories):
+                    duplicates[directory].append((pv, sorted(files)))
+        for entries in duplicates.values():
+            entries.sort()
+        return duplicates
@@ -0,0 +1,153 @@
+"""
+This file holds a lightweight collector for the outcomes of the PV unit
+tests, which streams them to a JUnit XML report as each file is checked
+rather than building a unittest suite of every test of every file
+"""
+import re
+import sys
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+PASSED = "passed"
+FAILED = "failed"
+ERROR = "error"
+SKIPPED = "skipped"
+
+# Characters which are not allowed anywhere in an XML 1.0 document
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_SEPARATOR = "=" * 70
+_RULE = "-" * 70
+
+
+def _clean(text):
+    return _INVALID_XML.sub("?", text)
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class JUnitWriter:
+    """
+    This class writes a JUnit XML report one testsuite at a time, so each
+    suite is on disk as soon as it completes and no results are held in
+    memory.
+
+    The elements and attributes written are the ones the xmlrunner reports
+    used, so the report can be read by the same tools, except that times are
+    only written for the suites they were measured for.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<testsuites>\n')
+
+    def write_suite(self, name, classname, outcomes, seconds=None):
+        """
+        Writes a single testsuite
+
+        Args:
+            name: the name of the suite, e.g. the path of the checked file
+            classname: the class name given to each test case
+            outcomes: a list of (test name, outcome, message) tuples
+            seconds: the time taken to run the suite, or None if it was
+                not measured, such as for results kept from a previous run
+        """
+        counts = {FAILED: 0, ERROR: 0, SKIPPED: 0}
+        cases = []
+        for test_name, outcome, message in outcomes:
+            case = '\t\t<testcase classname={} name={}'.format(
+                quoteattr(classname), quoteattr(test_name))
+            if outcome == PASSED:
+                cases.append(case + '/>\n')
+                continue
+
+            counts[outcome] += 1
+            message = _clean(message or "")
+            if outcome == SKIPPED:
+                cases.append(case + '>\n\t\t\t<skipped type="skip" '
+                             'message={}/>\n\t\t</testcase>\n'.format(
+                                 quoteattr(message)))
+            else:
+                tag, kind = ("failure", "AssertionError") \
+                    if outcome == FAILED else ("error", "Exception")
+                cases.append(case + '>\n\t\t\t<{0} type="{1}" message={2}>'
+                             '{3}</{0}>\n\t\t</testcase>\n'.format(
+                                 tag, kind, quoteattr(message),
+                                 escape(message)))
+
+        self._file.write(
+            '\t<testsuite name={} tests="{}" failures="{}" errors="{}" '
+            'skipped="{}"{} timestamp="{}">\n'.format(
+                quoteattr(_clean(name)), len(outcomes), counts[FAILED],
+                counts[ERROR], counts[SKIPPED],
+                ' time="{:.3f}"'.format(seconds) if seconds is not None
+                else "", _timestamp()))
+        self._file.writelines(cases)
+        self._file.write('\t</testsuite>\n')
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write('</testsuites>\n')
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultCollector:
+    """
+    This class collects the outcomes of each suite of tests, printing the
+    failures and errors as they arrive and writing every suite to a JUnit
+    XML report.
+    """
+    def __init__(self, writer, stream=sys.stdout):
+        self.writer = writer
+        self.stream = stream
+        self.counts = {PASSED: 0, FAILED: 0, ERROR: 0, SKIPPED: 0}
+        self.start = time.time()
+
+    def add(self, name, classname, outcomes, seconds=None):
+        """
+        Adds the outcomes of a suite of tests
+
+        Args:
+            name: the name of the suite, e.g. the path of the checked file
+            classname: the class name of the tests
+            outcomes: a list of (test name, outcome, message) tuples
+            seconds: the time taken to run the suite, or None if it was
+                not measured
+        """
+        for test_name, outcome, message in outcomes:
+            self.counts[outcome] += 1
+            if outcome == FAILED or outcome == ERROR:
+                self.stream.write("{}\n{}: {} ({})\n{}\n{}{}\n\n".format(
+                    _SEPARATOR, "FAIL" if outcome == FAILED else "ERROR",
+                    test_name, name, _RULE,
+                    "AssertionError: " if outcome == FAILED else "",
+                    message))
+        self.writer.write_suite(name, classname, outcomes, seconds)
+
+    def was_successful(self):
+        return self.counts[FAILED] == 0 and self.counts[ERROR] == 0
+
+    def summarise(self):
+        """
+        Prints the number of tests run and of each kind of outcome
+        """
+        self.stream.write("{}\nRan {} tests in {:.3f}s\n\n".format(
+            _RULE, sum(self.counts.values()), time.time() - self.start))
+        details = ["{}={}".format(kind, self.counts[outcome])
+                   for kind, outcome in (("failures", FAILED),
+                                         ("errors", ERROR),
+                                         ("skipped", SKIPPED))
+                   if self.counts[outcome]]
+        status = "OK" if self.was_successful() else "FAILED"
+        self.stream.write("{}{}\n".format(
+            status, " ({})".format(", ".join(details)) if details else ""))
@@ -0,0 +1,108 @@
+"""
+This file holds a simple rule engine, which runs any number of checks over
+the records of a db in a single traversal
+"""
+import time
+
+
+class Rule:
+    """
+    This class holds a single check.
+
+    The visitor is called with each record the rule applies to, the values
+    of the fields the rule declared it depends on and the state of the rule
+    for the current db, and returns a list of failures or None. Rules that
+    need to see every record before reporting, such as duplicate detection,
+    gather what they need in the state and report from the finish callback.
+    """
+    __slots__ = ('name', 'visit', 'fields', 'record_types', 'finish',
+                 'severity')
+
+    def __init__(self, name, visit, fields=(), record_types=None,
+                 finish=None, severity="error"):
+        self.name = name
+        self.visit = visit
+        self.fields = tuple(fields)
+        self.record_types = \
+            frozenset(record_types) if record_types is not None else None
+        self.finish = finish
+        self.severity = severity
+
+    def applies_to(self, rec_type):
+        return self.record_types is None or rec_type in self.record_types
+
+
+class RuleSet:
+    """
+    This class holds a set of registered rules and runs them over dbs.
+    """
+    def __init__(self):
+        self.rules = {}
+
+    def record_rule(self, name, fields=(), record_types=None, finish=None,
+                    severity="error"):
+        """
+        Decorator to register a visitor function as a rule
+
+        Args:
+            name: the name of the rule
+            fields: names of the fields the rule reads
+            record_types: record types the rule applies to, or None for all
+            finish: optional function called with the state once every
+                record has been visited, returning a list of failures
+            severity: how serious the failures of the rule are, "error" or
+                "warning"
+        """
+        def decorator(visit):
+            self.rules[name] = Rule(name, visit, fields, record_types, finish,
+                                    severity)
+            return visit
+        return decorator
+
+    def run(self, db, names=None, timings=None):
+        """
+        Runs rules over every record of a db in a single traversal
+
+        Args:
+            db: the parsed db
+            names: the names of the rules to run, or None for all rules
+            timings: an optional dictionary which the seconds spent in each
+                rule are added to, keyed by rule name
+
+        Returns:
+            a dictionary of rule name to the list of failures of that rule
+        """
+        rules = [self.rules[name] for name in names] if names is not None \
+            else list(self.rules.values())
+        failures = {rule.name: [] for rule in rules}
+        states = {rule.name: {} for rule in rules}
+        fields = sorted({field for rule in rules for field in rule.fields})
+
+        # the rules that apply to each record type, worked out once per type
+        dispatch = {}
+        for rec in db.records:
+            applicable = dispatch.get(rec.type)
+            if applicable is None:
+                applicable = dispatch[rec.type] = \
+                    [rule for rule in rules if rule.applies_to(rec.type)]
+
+            values = {field: rec.get_field(field) for field in fields}
+            for rule in applicable:
+                if timings is None:
+                    found = rule.visit(rec, values, states[rule.name])
+                else:
+                    start = time.perf_counter()
+                    found = rule.visit(rec, values, states[rule.name])
+                    timings[rule.name] = timings.get(rule.name, 0.0) + \
+                        time.perf_counter() - start
+                if found:
+                    failures[rule.name].extend(found)
+
+        for rule in rules:
+            if rule.finish is not None:
+                start = time.perf_counter()
+                failures[rule.name].extend(rule.finish(states[rule.name]))
+                if timings is not None:
+                    timings[rule.name] = timings.get(rule.name, 0.0) + \
+                        time.perf_counter() - start
+        return failures
@@ -0,0 +1,265 @@
+"""
+This file holds a local server which checks db files on request, for IOC
+build rules and editor plugins. The server keeps the parsed dbs, the parse
+cache and the compiled ignore rules between requests, so a request costs
+only the parse of a changed file and its checks.
+
+Requests are JSON over HTTP on localhost. As a request may name any file
+for the server to read, it only listens on loopback addresses:
+    POST /check {"path": "/abs/path/to/file.db"}
+    POST /check {"text": "record(ai, \"A\") {...}", "name": "file.db"}
+    GET /health
+either of the check requests may also give "checks", a list of the names of
+the checks to run. Run from the root of the checker with:
+    python -m utils.server --port 8765
+"""
+import argparse
+import ipaddress
+import json
+import os
+import socket
+import stat as stat_module
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .db_checks import RULES, run_checks
+from .ignore_rules import IgnoreRules, DEFAULT_RULES_PATH
+from .loader import SingleFile, parse_file, parsed_file
+from .parse_cache import ParseCache
+
+DEFAULT_PORT = 8765
+
+
+class RequestError(ValueError):
+    """
+    Raised for a request that cannot be answered, with the HTTP status to
+    answer it with
+    """
+    def __init__(self, message, status=400):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+class CheckService:
+    """
+    This class answers check requests. The parsed db of each file checked
+    is kept, keyed by path and valid while the modification time and size
+    of the file are unchanged, for the most recently checked files.
+    """
+    def __init__(self, rules=None, cache=None, maxsize=1024):
+        """
+        Args:
+            rules: the IgnoreRules deciding the checks skipped on each path
+            cache: an optional ParseCache to take unchanged files from
+            maxsize: the number of parsed dbs to keep in memory
+        """
+        self.rules = rules if rules is not None else IgnoreRules()
+        self.cache = cache
+        self.maxsize = maxsize
+        self._dbs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _db_of_path(self, path):
+        if not os.path.isabs(path):
+            raise RequestError("The path must be absolute: {}".format(path))
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            raise RequestError(str(e), 404)
+        if not stat_module.S_ISREG(stat.st_mode):
+            raise RequestError("The path is not a file: {}".format(path))
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._dbs.get(path)
+            if entry is not None and entry[0] == key:
+                self._dbs.move_to_end(path)
+                return entry[1]
+
+        db = parsed_file(path, self.cache)
+        with self._lock:
+            self._dbs[path] = (key, db)
+            self._dbs.move_to_end(path)
+            if len(self._dbs) > self.maxsize:
+                self._dbs.popitem(last=False)
+        return db
+
+    def check(self, request):
+        """
+        Checks the file or text given by a request
+
+        Args:
+            request: the decoded JSON request, giving either the "path" of a
+                file or the "text" of a db with an optional "name", and
+                optionally the "checks" to run
+
+        Returns:
+            the JSON serialisable response, giving the "file", whether it is
+            "epics", each failure as given by Failure.as_dict, the reason
+            each skipped check was "skipped" and the "seconds" taken
+        """
+        start = time.perf_counter()
+        if not isinstance(request, dict):
+            raise RequestError("The request must be a JSON object")
+        for key in ("path", "text", "name"):
+            if key in request and not isinstance(request[key], str):
+                raise RequestError("The {} must be a string".format(key))
+        checks = request.get("checks")
+        if checks is None:
+            checks = list(RULES.rules)
+        if not isinstance(checks, list) or \
+                not all(isinstance(check, str) for check in checks):
+            raise RequestError("The checks must be a list of strings")
+        unknown = [check for check in checks if check not in RULES.rules]
+        if unknown:
+            raise RequestError("Unknown checks {}".format(unknown))
+
+        try:
+            if "path" in request:
+                name = request["path"]
+                db = self._db_of_path(name)
+            elif "text" in request:
+                name = request.get("name", "<text>")
+                db = parse_file(SingleFile(name, request["text"], 0))
+            else:
+                raise RequestError(
+                    "The request must give a path or the text of a db")
+        except RequestError:
+            raise
+        except ValueError as e:
+            raise RequestError(str(e), 422)
+
+        response = {"file": name, "epics": db is not None, "failures": [],
+                    "skipped": {}}
+        if db is not None:
+            skipped = self.rules.skipped_checks(name, checks)
+            results = run_checks(db, [check for check in checks
+                                      if check not in skipped])
+            response["skipped"] = skipped
+            response["failures"] = [
+                failure.as_dict() for failures in results.values()
+                for failure in failures]
+        response["seconds"] = time.perf_counter() - start
+        return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+    quiet = True
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._respond(200, {"status": "ok"})
+        else:
+            self._respond(404, {"error": "Unknown path {}".format(self.path)})
+
+    def do_POST(self):
+        if self.path != "/check":
+            self._respond(404, {"error": "Unknown path {}".format(self.path)})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+            except ValueError as e:
+                raise RequestError("Invalid JSON: {}".format(e))
+            self._respond(200, self.service.check(request))
+        except RequestError as e:
+            self._respond(e.status, {"error": str(e)})
+        except Exception as e:
+            self.log_error("Failed to answer %s: %r", self.path, e)
+            self._respond(500, {"error": "Internal error: {}".format(e)})
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super(_Handler, self).log_message(format, *args)
+
+
+def is_loopback(host):
+    """
+    Returns whether every address a host name resolves to is a loopback
+    address, so that only this machine can connect to it
+    """
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except (OSError, UnicodeError):
+        return False
+    # drop the scope of an IPv6 address, such as %lo
+    addresses = {info[4][0].split("%")[0] for info in infos}
+    return bool(addresses) and all(
+        ipaddress.ip_address(address).is_loopback for address in addresses)
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, quiet=True):
+    """
+    Creates a server answering requests with a CheckService, which handles
+    each request on its own thread
+
+    Args:
+        service: the CheckService
+        host: the address to listen on, which must be a loopback address as
+            requests may name any file to read
+        port: the port to listen on, or 0 for any free port
+        quiet: whether to leave each request unlogged
+
+    Returns:
+        the server, which is started with serve_forever
+
+    Raises:
+        ValueError: if the host is not a loopback address
+    """
+    if not is_loopback(host):
+        raise ValueError("The server only listens on loopback addresses, as "
+                         "requests may name any file: {}".format(host))
+    handler = type("Handler", (_Handler,),
+                   {"service": service, "quiet": quiet})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--port', type=int, default=DEFAULT_PORT,
+        help='The port to listen on')
+    parser.add_argument(
+        '--host', type=str, default="127.0.0.1",
+        help='The loopback address to listen on. Other addresses are '
+             'refused, as requests may name any file for the server to read')
+    parser.add_argument(
+        '--cache_dir', type=str, default=None,
+        help='A directory to cache parsed files in between runs')
+    parser.add_argument(
+        '--ignore_rules', type=str, default=DEFAULT_RULES_PATH,
+        help='The config of the checks skipped on certain paths')
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help='Log each request')
+    args = parser.parse_args()
+
+    cache = ParseCache(args.cache_dir) if args.cache_dir is not None \
+        else None
+    service = CheckService(IgnoreRules.load(args.ignore_rules), cache)
+    try:
+        server = make_server(service, args.host, args.port, not args.verbose)
+    except ValueError as e:
+        parser.error(str(e))
+    print("Serving checks on http://{}:{}".format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+This file holds a parser for EPICS substitutions files, which list the
+templates an IOC loads and the sets of macros each is loaded with
+"""
+import re
+
+from .db_parser import DbParseError, _unescape
+
+_TOKEN_RE = re.compile(r'''
+    (?P<skip>(?:\s+|\#[^\n]*)+)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<punct>[{}=,])
+  | (?P<bare>(?:\$[({][^)}]*[)}]|[^\s{}=,"\#])+)
+''', re.VERBOSE)
+
+
+def _tokens(text):
+    """
+    Yields the (kind, value, position) of each token of a substitutions file
+    """
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise DbParseError("Unexpected character {!r}".format(text[pos]),
+                               text.count("\n", 0, pos) + 1)
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == "string":
+            yield kind, _unescape(match.group()[1:-1]), match.start()
+        elif kind != "skip":
+            yield kind, match.group(), match.start()
+    yield None, None, pos
+
+
+class _SubstitutionsParser:
+    def __init__(self, text):
+        self.text = text
+        self._tokens = _tokens(text)
+        self._advance()
+
+    def _advance(self):
+        self.kind, self.value, self.pos = next(self._tokens)
+
+    def _error(self, message):
+        return DbParseError(message, self.text.count("\n", 0, self.pos) + 1)
+
+    def _expect(self, value):
+        if self.kind != "punct" or self.value != value:
+            raise self._error("Expected '{}' but found {!r}".format(
+                value, self.value))
+        self._advance()
+
+    def _word(self):
+        if self.kind not in ("string", "bare"):
+            raise self._error("Expected a name or value but found {!r}"
+                              .format(self.value))
+        value = self.value
+        self._advance()
+        return value
+
+    def _values(self):
+        """
+        Parses a braced, comma separated list of values or NAME=VALUE
+        definitions, returning a list of (name, value) tuples where name is
+        None for plain values
+        """
+        self._expect("{")
+        values = []
+        while not (self.kind == "punct" and self.value == "}"):
+            word = self._word()
+            if self.kind == "punct" and self.value == "=":
+                self._advance()
+                values.append((word, self._word()))
+            else:
+                values.append((None, word))
+            if self.kind == "punct" and self.value == ",":
+                self._advance()
+        self._advance()
+        return values
+
+    def _definitions(self):
+        return {name: value for name, value in self._values()
+                if name is not None}
+
+    def _file(self, global_macros):
+        template = self._word()
+        self._expect("{")
+        instances = []
+        pattern = None
+        while not (self.kind == "punct" and self.value == "}"):
+            if self.kind == "bare" and self.value == "pattern":
+                self._advance()
+                pattern = [value for _, value in self._values()]
+                continue
+            if self.kind == "bare" and self.value == "global":
+                self._advance()
+                global_macros = dict(global_macros, **self._definitions())
+                continue
+
+            values = self._values()
+            macros = dict(global_macros)
+            if pattern is not None and all(n is None for n, _ in values):
+                if len(values) != len(pattern):
+                    raise self._error(
+                        "Expected {} values for pattern {} but found {}"
+                        .format(len(pattern), pattern, len(values)))
+                macros.update(zip(pattern, (v for _, v in values)))
+            else:
+                macros.update((n, v) for n, v in values if n is not None)
+            instances.append(macros)
+        self._advance()
+        return template, instances
+
+    def parse(self):
+        substitutions = []
+        global_macros = {}
+        while self.kind is not None:
+            if self.kind == "bare" and self.value == "global":
+                self._advance()
+                global_macros = dict(global_macros, **self._definitions())
+            elif self.kind == "bare" and self.value == "file":
+                self._advance()
+                substitutions.append(self._file(global_macros))
+            else:
+                raise self._error("Expected 'file' or 'global' but found {!r}"
+                                  .format(self.value))
+        return substitutions
+
+
+def parse_substitutions(text):
+    """
+    Parses the text of a substitutions file, in either the pattern or the
+    NAME=VALUE form
+
+    Args:
+        text: the text of the file
+
+    Returns:
+        a list of (template, list of macro dictionaries) tuples, one for
+        each file block, where each dictionary is one instance of the
+        template with any global macros included
+    """
+    return _SubstitutionsParser(text).parse()
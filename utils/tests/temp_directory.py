@@ -0,0 +1,42 @@
+"""
+This file holds the base class of the tests that work on files in a
+temporary directory
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+RECORD_TEXT = 'record(ao, "A") {}\n'
+
+
+class TempDirectoryTestCase(unittest.TestCase):
+    """
+    This class gives each test a temporary directory, which is removed once
+    the test is done, and writes files into it
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _write(self, name, text=RECORD_TEXT, mtime=None):
+        """
+        Writes a file in the temporary directory, making the directories it
+        is in
+
+        Args:
+            name: the path of the file, relative to the directory
+            text: the contents of the file, as text or bytes
+            mtime: the modification time to give the file in nanoseconds,
+                or None to leave it as written
+
+        Returns:
+            the absolute path of the file
+        """
+        filename = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "wb" if isinstance(text, bytes) else "w") as _file:
+            _file.write(text)
+        if mtime is not None:
+            os.utime(filename, ns=(mtime, mtime))
+        return filename
@@ -0,0 +1,50 @@
+import pickle
+import unittest
+from utils.EPICS_collections import Record, Field
+
+
+class TestRecord(unittest.TestCase):
+    def test_GIVEN_duplicate_fields_WHEN_got_THEN_first_value_returned(self):
+        rec = Record('ao', 'A', None, [Field('EGU', 'm'), Field('DESC', 'd'),
+                                       Field('EGU', 'mm')])
+
+        self.assertEqual('m', rec.get_field('EGU'))
+        self.assertEqual(['EGU', 'DESC', 'EGU'], rec.get_field_names())
+        self.assertTrue(rec.has_duplicate_fields())
+
+    def test_GIVEN_unique_fields_WHEN_queried_THEN_missing_field_none(self):
+        rec = Record('ao', 'A', None, [Field('EGU', 'm'), Field('DESC', 'd')])
+
+        self.assertFalse(rec.has_duplicate_fields())
+        self.assertTrue(rec.has_field('DESC'))
+        self.assertFalse(rec.has_field('ASG'))
+        self.assertIsNone(rec.get_field('ASG'))
+
+    def test_GIVEN_sim_and_disable_pvs_WHEN_queried_THEN_flags_set(self):
+        self.assertTrue(Record('ao', 'A:SIM', None, []).is_sim())
+        self.assertTrue(Record('ao', 'A:SIM:B', None, []).is_sim())
+        self.assertFalse(Record('ao', 'A:SIMULATE', None, []).is_sim())
+        self.assertTrue(Record('ao', 'A:DISABLE', None, []).is_disable())
+        self.assertFalse(Record('ao', 'A:ENABLE', None, []).is_disable())
+
+    def test_GIVEN_record_with_infos_WHEN_queried_THEN_infos_returned(self):
+        rec = Record('ao', 'A', [Field('INTEREST', 'HIGH'), Field('LOG', 'a'),
+                                 Field('LOG', 'b')], [])
+
+        self.assertTrue(rec.is_interest())
+        self.assertEqual(['a', 'b'], rec.get_info('LOG'))
+        self.assertFalse(Record('ao', 'B', None, []).is_interest())
+
+    def test_GIVEN_queried_record_WHEN_pickled_THEN_round_trips(self):
+        rec = Record('ao', 'A:SIM', [Field('INTEREST', 'HIGH')],
+                     [Field('EGU', 'm')], ['B'])
+        rec.get_field('EGU')
+        rec.is_sim()
+
+        copy = pickle.loads(pickle.dumps(rec))
+
+        self.assertEqual(('ao', 'A:SIM', ['B']),
+                         (copy.type, copy.pv, copy.aliases))
+        self.assertEqual('m', copy.get_field('EGU'))
+        self.assertTrue(copy.is_interest())
+        self.assertTrue(copy.is_sim())
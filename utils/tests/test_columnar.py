@@ -0,0 +1,70 @@
+import os
+import unittest
+from utils import columnar
+from utils.columnar import RecordTable, run_batch_checks, BATCH_CHECKS
+from utils.db_checks import run_checks
+from utils.EPICS_collections import Record, Db, Field
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+def _record(rec_type, pv, fields=(), interest=False):
+    infos = [Field("INTEREST", "HIGH")] if interest else []
+    return Record(rec_type, pv, infos,
+                  [Field(name, value) for name, value in fields])
+
+
+@unittest.skipIf(columnar.numpy is None, "needs NumPy")
+class TestColumnar(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestColumnar, self).setUp()
+        self.first = Db("first.db", [
+            _record("ai", "IN:A", [("EGU", "mm"), ("DESC", "A")], True),
+            _record("ai", "IN:B", [("EGU", "parsec")], True),
+            _record("ai", "IN:A", [("DESC", "x" * 41)]),
+            _record("calc", "IN:c", [("ASG", "READONLY")], True),
+            _record("calc", "IN:D", [("DESC", "d"), ("DESC", "e")], True),
+            _record("ao", "IN:DISABLE", [("DESC", "disable")], True),
+        ])
+        self.second = Db("second.db", [
+            _record("ao", "IN:A", [("EGU", "parsec")], True),
+            _record("bo", "IN:E", [("EGU", "")]),
+        ])
+        self.table = RecordTable.from_dbs(
+            [("first.db", self.first), ("second.db", self.second)])
+
+    def test_GIVEN_dbs_WHEN_exported_THEN_records_and_fields_in_columns(self):
+        self.assertEqual(8, len(self.table))
+        self.assertEqual(["first.db", "second.db"], self.table.files)
+        self.assertEqual([0] * 6 + [1] * 2, list(self.table.file_id))
+        self.assertEqual("IN:DISABLE", self.table.pv(5))
+        self.assertEqual(["DESC", "DESC"], self.table.record_field_names(4))
+
+    def test_GIVEN_duplicate_fields_WHEN_field_read_THEN_first_value_given(self):
+        desc = self.table.field("DESC")
+
+        self.assertEqual("d", self.table.field_values[desc[4]])
+        self.assertEqual(-1, desc[1])
+
+    def test_GIVEN_dbs_WHEN_batch_checked_THEN_same_failures_as_each_db(self):
+        results = run_batch_checks(self.table)
+
+        for filename, db in [("first.db", self.first),
+                             ("second.db", self.second)]:
+            self.assertEqual(run_checks(db, list(BATCH_CHECKS)),
+                             results[filename])
+        self.assertEqual(["Multiple instances of IN:A"],
+                         [str(f) for f in results["first.db"]
+                          ["multiple_instances"]])
+        self.assertEqual(["Invalid unit 'parsec' on IN:A"],
+                         [str(f) for f in results["second.db"]["units_valid"]])
+
+    def test_GIVEN_check_without_batched_form_WHEN_batch_checked_THEN_error(self):
+        with self.assertRaises(ValueError):
+            run_batch_checks(self.table, ["log_info_tags"])
+
+    def test_GIVEN_table_WHEN_saved_THEN_columns_written(self):
+        path = os.path.join(self.directory, "records.npz")
+        self.table.save(path)
+        with columnar.numpy.load(path) as saved:
+            self.assertEqual(["IN:A", "IN:B"], list(saved["pvs"][:2]))
+            self.assertEqual(8, len(saved["pv_code"]))
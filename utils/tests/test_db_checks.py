@@ -300,3 +300,37 @@ class TestDbChecks(unittest.TestCase):
         dbs = Db('/path', records)
         failures = db_checks.get_units_valid(dbs)
         self.assertNotEqual(len(failures), 0)
+
+    def test_GIVEN_log_tag_repeated_in_another_file_WHEN_checked_across_files_THEN_return_failure(self):
+        entries = [("a.db", "A", "LOG_HEADER1"), ("b.db", "B", "LOG_HEADER1")]
+        failures = db_checks.get_log_info_tags_across_files(entries)
+        self.assertEqual(len(failures), 1)
+
+    def test_GIVEN_log_tag_repeated_in_same_file_WHEN_checked_across_files_THEN_return_no_failure(self):
+        entries = [("a.db", "A", "LOG_HEADER1"), ("a.db", "B", "LOG_HEADER1")]
+        failures = db_checks.get_log_info_tags_across_files(entries)
+        self.assertEqual(len(failures), 0)
+
+    def test_GIVEN_period_defined_in_two_files_WHEN_checked_across_files_THEN_return_failure(self):
+        entries = [("a.db", "A", "LOG_period_seconds"), ("b.db", "B", "LOG_period_pv")]
+        failures = db_checks.get_log_info_tags_across_files(entries)
+        self.assertEqual(len(failures), 1)
+
+    def test_GIVEN_pv_duplicated_across_files_WHEN_checked_THEN_return_failure(self):
+        failures = db_checks.get_multiple_instances_across_files([("A", ["a.db", "b.db"])])
+        self.assertEqual(len(failures), 1)
+
+    def test_GIVEN_invalid_unit_WHEN_checks_run_THEN_failure_locates_record(self):
+        records = [Record('ai', 'A', None, [Field('EGU', "parsec")], line=3, column=1)]
+        failure, = db_checks.run_checks(Db('/path/a.db', records), ["units_valid"])["units_valid"]
+        self.assertEqual(("units_valid", "/path/a.db", "A", 3, "error"),
+                         (failure.check, failure.file, failure.pv, failure.line, failure.severity))
+        self.assertEqual({"unit": "parsec"}, failure.params)
+        self.assertEqual("Invalid unit 'parsec' on A", str(failure))
+
+    def test_GIVEN_log_tag_repeated_in_another_file_WHEN_checked_across_files_THEN_message_names_both_files(self):
+        entries = [("a.db", "A", "LOG_HEADER1"), ("b.db", "B", "LOG_HEADER1")]
+        failure, = db_checks.get_log_info_tags_across_files(entries)
+        self.assertEqual("b.db", failure.file)
+        self.assertEqual("Invalid logging config: B in b.db repeats the log info tag log_header1 "
+                         "(already set by A in a.db)", failure.message)
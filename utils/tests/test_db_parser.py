@@ -1,42 +1,35 @@
 import unittest
 import mock
 from utils import db_parser
-from utils.EPICS_collections import Record, Db, Field
+from utils.EPICS_collections import Field
 
 
 class TestDbParser(unittest.TestCase):
 
-    def test_GIVEN_db_line_with_field_in_comment_WHEN_called_THEN_return_no_failure(self):
-        dummy_line =  'field(CALC, "(C=0||C=2)?A:B")  # If heater is present and switched off, display persistent field, else display PSU field'
-        required_result = 'field(CALC, "(C=0||C=2)?A:B")  \n'
-        actual_result = db_parser.remove_comments(dummy_line)
-        self.assertEqual(required_result, actual_result)
-
-    def test_GIVEN_db_line_with_hashtag_in_string_WHEN_called_THEN_return_no_failure(self):
-        dummy_line =  'field(CALC, "(C=0||C=2)?A:#C")'
-        required_result = 'field(CALC, "(C=0||C=2)?A:#C")\n'
-        actual_result = db_parser.remove_comments(dummy_line)
-        self.assertEqual(required_result, actual_result)
-
-    def test_GIVEN_db_line_with_multiple_fields_in_string_WHEN_called_THEN_return_no_failure(self):
-        dummy_line =  'field(CALC, "(C=0||C=2)?A:#D") #This is a comment with field in it'
-        required_result = 'field(CALC, "(C=0||C=2)?A:#D") \n'
-        actual_result = db_parser.remove_comments(dummy_line)
-        self.assertEqual(required_result, actual_result)
-
-    def test_GIVEN_db_line_with_commented_out_field_WHEN_called_THEN_return_no_failure(self):
-        dummy_line =  '#This is a comment with field in it field(CALC, "(C=0||C=2)?A:#D") '
-        required_result = '\n'
-        actual_result = db_parser.remove_comments(dummy_line)
-        self.assertEqual(required_result, actual_result)
-    
-    def test_GIVEN_db_line_with_multiple_hashtags_and_comments_WHEN_called_THEN_return_no_failure(self):
-        dummy_line = 'field(CALC, "A#B?B:(A#B?A:C") # field comment'
-        required_result = 'field(CALC, "A#B?B:(A#B?A:C") \n'
-        actual_result = db_parser.remove_comments(dummy_line)
-        self.assertEqual(required_result, actual_result)
-
-    def test_GIVEN_text_with_multifields_WHEN_called_THEN_get_props_return_list_of_fields_no_failure(self):
+    def _record_with_line(self, line):
+        return self._parse('record(calc, "A")\n{\n' + line + '\n}\n').records[0]
+
+    def test_GIVEN_db_line_with_field_in_comment_WHEN_parsed_THEN_comment_dropped(self):
+        record = self._record_with_line('field(CALC, "(C=0||C=2)?A:B")  # If heater is present and switched off, display persistent field, else display PSU field')
+        self.assertEqual([("CALC", "(C=0||C=2)?A:B")], [(f.name, f.value) for f in record.fields])
+
+    def test_GIVEN_db_line_with_hashtag_in_string_WHEN_parsed_THEN_hashtag_kept(self):
+        record = self._record_with_line('field(CALC, "(C=0||C=2)?A:#C")')
+        self.assertEqual("(C=0||C=2)?A:#C", record.get_field("CALC"))
+
+    def test_GIVEN_db_line_with_multiple_fields_in_string_WHEN_parsed_THEN_comment_dropped(self):
+        record = self._record_with_line('field(CALC, "(C=0||C=2)?A:#D") #This is a comment with field in it')
+        self.assertEqual([("CALC", "(C=0||C=2)?A:#D")], [(f.name, f.value) for f in record.fields])
+
+    def test_GIVEN_db_line_with_commented_out_field_WHEN_parsed_THEN_field_not_returned(self):
+        record = self._record_with_line('#This is a comment with field in it field(CALC, "(C=0||C=2)?A:#D") ')
+        self.assertEqual([], record.fields)
+
+    def test_GIVEN_db_line_with_multiple_hashtags_and_comments_WHEN_parsed_THEN_comment_dropped(self):
+        record = self._record_with_line('field(CALC, "A#B?B:(A#B?A:C") # field comment')
+        self.assertEqual([("CALC", "A#B?B:(A#B?A:C")], [(f.name, f.value) for f in record.fields])
+
+    def test_GIVEN_text_with_multifields_WHEN_parsed_THEN_fields_returned_in_order(self):
         required_result = [Field('DESC', "test description"), Field("EGU", "m/s")]
         record = ('record(ao, "SHOULDPASS:m_OVER_s")\n'
         '{\n'
@@ -44,51 +37,146 @@ class TestDbParser(unittest.TestCase):
         'field(EGU, "m/s")\n'
         '}')
 
-        actual_result = db_parser._get_props('field', record)
-        self.assertNotEqual(actual_result, [])
-        self.assertTrue(len(actual_result) == len(required_result))
-       
-        for (a,b) in zip(actual_result, required_result):
-            self.assertTrue(a.name == b.name)
-            self.assertTrue(a.value == b.value)
-      
-    def test_GIVEN_text_with_field_in_string_WHEN_called_THEN_get_props_returns_no_failure(self):
-
-        required_result = [Field("EGU", "m/s")]
+        actual_result = self._parse(record).records[0].fields
+        self.assertEqual([(f.name, f.value) for f in required_result],
+                         [(f.name, f.value) for f in actual_result])
+
+    def test_GIVEN_text_with_field_in_string_WHEN_parsed_THEN_only_real_fields_returned(self):
         record = ('record(ao, "SHOULDPASS:m_OVER_s")\n'
         '{\n'
         '"field"(DESC, "test description")\n'
         'field(EGU, "m/s")\n'
         '}')
-      
-        actual_result = db_parser._get_props('field', record)
-        self.assertNotEqual(actual_result, [])
-        self.assertTrue(len(actual_result) == len(required_result))
-       
-        for (a,b) in zip(actual_result, required_result):
-            self.assertTrue(a.name == b.name)
-            self.assertTrue(a.value == b.value)
-
-    def test_GIVEN_text_without_keyword_WHEN_called_THEN_return_failure(self):
-        
+
+        actual_result = self._parse(record).records[0].fields
+        self.assertEqual([("EGU", "m/s")], [(f.name, f.value) for f in actual_result])
+
+    def test_GIVEN_text_without_keyword_WHEN_parsed_THEN_no_infos_returned(self):
         record = ('record(ao, "SHOULDPASS:m_OVER_s")\n'
         '{\n'
         '"field"(DESC, "test description")\n'
         'field(EGU, "m/s")\n'
         '}')
-        actual_result = db_parser._get_props('info', record)
-        self.assertListEqual(actual_result, [])
+        self.assertListEqual([], self._parse(record).records[0].infos)
+
+    def test_GIVEN_properly_formatted_record_text_WHEN_parsed_THEN_pv_returned(self):
+        db = self._parse('record(ao, "SHOULDPASS:m_OVER_s")')
+        self.assertEqual(["SHOULDPASS:m_OVER_s"], [rec.pv for rec in db.records])
+
+    def test_GIVEN_properly_formatted_record_text_with_commas_WHEN_parsed_THEN_whole_pv_returned(self):
+        db = self._parse('record(ao, "SHOULD, (PASS:m_OVER_s)")')
+        self.assertEqual(["SHOULD, (PASS:m_OVER_s)"], [rec.pv for rec in db.records])
+
+    def _parse(self, text):
+        db_file = mock.Mock()
+        db_file.get_text.return_value = text
+        db_file.get_dir.return_value = "/path/test.db"
+        return db_parser.parse_db(db_file)
+
+    def test_GIVEN_db_with_records_WHEN_parsed_THEN_records_and_fields_returned(self):
+        db = self._parse('record(ao, "A:B")\n'
+                         '{\n'
+                         '    field(DESC, "a description")\n'
+                         '    field(PINI, YES)\n'
+                         '    info(INTEREST, "HIGH")\n'
+                         '}\n'
+                         'grecord(calc, "A:C") {}\n')
+
+        self.assertEqual(["A:B", "A:C"], [rec.pv for rec in db.records])
+        self.assertEqual(["ao", "calc"], [rec.type for rec in db.records])
+        self.assertEqual("a description", db.records[0].get_field("DESC"))
+        self.assertEqual("YES", db.records[0].get_field("PINI"))
+        self.assertEqual(["HIGH"], db.records[0].get_info("INTEREST"))
+        self.assertEqual("/path/test.db", db.directory)
+
+    def test_GIVEN_record_in_strings_and_comments_WHEN_parsed_THEN_only_real_records_returned(self):
+        db = self._parse('# record(ao, "COMMENTED")\n'
+                         'record(ao, "REAL") {\n'
+                         '    field(DESC, "a record(ai, \\"FAKE\\") # not a comment")\n'
+                         '}\n')
+
+        self.assertEqual(["REAL"], [rec.pv for rec in db.records])
+        self.assertEqual('a record(ai, "FAKE") # not a comment', db.records[0].get_field("DESC"))
+
+    def test_GIVEN_escaped_characters_in_string_WHEN_parsed_THEN_escapes_translated(self):
+        db = self._parse('record(ao, "A") { field(DESC, "tab\\there \\\\ \\"quoted\\"") }')
+
+        self.assertEqual('tab\there \\ "quoted"', db.records[0].get_field("DESC"))
+
+    def test_GIVEN_unquoted_names_with_macros_WHEN_parsed_THEN_macros_kept(self):
+        db = self._parse('record(ai, $(P)$(Q=X):VALUE) { field(INP, ${DEV}) }')
+
+        self.assertEqual("$(P)$(Q=X):VALUE", db.records[0].pv)
+        self.assertEqual("${DEV}", db.records[0].get_field("INP"))
+
+    def test_GIVEN_doubly_nested_macro_defaults_WHEN_parsed_THEN_macros_kept(self):
+        text = 'record(ai, $(P=$(Q=$(R)))X) { field(INP, $(A=${B=$(C)})) }'
+
+        for db in (self._parse(text), self._parse(text.encode())):
+            self.assertEqual("$(P=$(Q=$(R)))X", db.records[0].pv)
+            self.assertEqual("$(A=${B=$(C)})", db.records[0].get_field("INP"))
+
+    def test_GIVEN_include_and_aliases_WHEN_parsed_THEN_aliases_attached_to_records(self):
+        db = self._parse('include "other.db"\n'
+                         'record(ao, "A") { alias("B") }\n'
+                         'alias("A", "C")\n')
+
+        self.assertEqual(["A"], [rec.pv for rec in db.records])
+        self.assertEqual(["B", "C"], db.records[0].aliases)
+
+    def test_GIVEN_json_link_values_WHEN_parsed_THEN_raw_text_returned(self):
+        db = self._parse('record(ai, "A") {\n'
+                         '    field(INP, {const: {"a": 1}})\n'
+                         '    field(VAL, [1, 2])\n'
+                         '}')
+
+        self.assertEqual('{const: {"a": 1}}', db.records[0].get_field("INP"))
+        self.assertEqual('[1, 2]', db.records[0].get_field("VAL"))
+
+    def test_GIVEN_record_without_body_WHEN_parsed_THEN_record_has_no_fields(self):
+        db = self._parse('record(ao, "A")\nrecord(ai, "B") { field(EGU, "m") }')
+
+        self.assertEqual([], db.records[0].fields)
+        self.assertEqual("m", db.records[1].get_field("EGU"))
+
+    def test_GIVEN_unterminated_record_WHEN_parsed_THEN_value_error_with_line_raised(self):
+        with self.assertRaises(ValueError) as context:
+            self._parse('record(ao, "A")\n{\n    field(EGU, "m")\n')
+        self.assertEqual(2, context.exception.line)
+
+    def test_GIVEN_incomplete_field_WHEN_parsed_THEN_value_error_raised(self):
+        with self.assertRaises(ValueError):
+            self._parse('record(ao, "A") {\n    field(EGU\n}')
+
+    def test_GIVEN_db_as_bytes_WHEN_parsed_THEN_same_records_as_text_returned(self):
+        text = ('record(ao, "A:\u00b0") {\n'
+                '    field(EGU, "\u00b0C")\n'
+                '    field(INP, {const: 1})\n'
+                '    info(INTEREST, "HIGH")\n'
+                '}\n')
+        from_text = self._parse(text).records[0]
+        from_bytes = self._parse(text.encode("utf-8")).records[0]
+
+        self.assertEqual(from_text.pv, from_bytes.pv)
+        self.assertEqual([(f.name, f.value) for f in from_text.fields],
+                         [(f.name, f.value) for f in from_bytes.fields])
+        self.assertEqual(["HIGH"], from_bytes.get_info("INTEREST"))
+
+    def test_GIVEN_bytes_with_unterminated_record_WHEN_parsed_THEN_value_error_with_line_raised(self):
+        with self.assertRaises(ValueError) as context:
+            self._parse(b'record(ao, "A")\n{\n    field(EGU, "m")\n')
+        self.assertEqual(2, context.exception.line)
 
-    def test_GIVEN_properly_formatted_record_text_WHEN_called_THEN_return_no_failure(self):
+    def test_GIVEN_include_between_records_WHEN_parsed_THEN_include_position_kept(self):
+        db = self._parse('record(ao, "A") {}\n'
+                         'include "common.db"\n'
+                         'record(ao, "B") {}\n')
 
-        required_result = "SHOULDPASS:m_OVER_s"
-        record = 'record(ao, "SHOULDPASS:m_OVER_s")'
-        actual_result = db_parser._check_string(record)
-        self.assertEqual(required_result, actual_result)
+        self.assertEqual([(1, "common.db")], db.includes)
 
-    def test_GIVEN_properly_formatted_record_text_with_commas_WHEN_called_THEN_return_no_failure(self):
+    def test_GIVEN_records_WHEN_parsed_THEN_line_and_column_of_each_definition_kept(self):
+        text = '# header\nrecord(ao, "A") {\n}\n  grecord(ai, "B") {}\n'
 
-        required_result = "SHOULD, (PASS:m_OVER_s)"
-        record = 'record(ao, "SHOULD, (PASS:m_OVER_s)")'
-        actual_result = db_parser._check_string(record)
-        self.assertEqual(required_result, actual_result)
+        for db in (self._parse(text), self._parse(text.encode())):
+            self.assertEqual([(2, 1), (4, 3)],
+                             [(rec.line, rec.column) for rec in db.records])
@@ -0,0 +1,56 @@
+import io
+import json
+import unittest
+from utils.failures import Failure, WARNING, sarif_log, write_jsonl
+
+
+class TestFailures(unittest.TestCase):
+    def setUp(self):
+        self.failure = Failure("Invalid unit '{unit}' on {pv}", "IN:A",
+                               {"unit": "parsec"}, "units_valid",
+                               "/path/a.db", 3, 1)
+        self.warning = Failure("Multiple instances of {pv} in {files}",
+                               "IN:B", {"files": "a.db, b.db"},
+                               "multiple_instances_across_files", "/path",
+                               severity=WARNING)
+
+    def test_GIVEN_failure_WHEN_message_asked_for_THEN_template_formatted(self):
+        self.assertEqual("Invalid unit 'parsec' on IN:A", self.failure.message)
+        self.assertEqual(self.failure.message, str(self.failure))
+
+    def test_GIVEN_failures_with_same_parts_WHEN_compared_THEN_equal(self):
+        same = Failure("Invalid unit '{unit}' on {pv}", "IN:A",
+                       {"unit": "parsec"}, "units_valid", "/path/a.db", 3, 1)
+
+        self.assertEqual(self.failure, same)
+        self.assertEqual(1, len({self.failure, same}))
+        self.assertNotEqual(self.failure, self.warning)
+
+    def test_GIVEN_failures_WHEN_written_as_json_lines_THEN_one_object_per_line(self):
+        stream = io.StringIO()
+
+        self.assertEqual(2, write_jsonl([self.failure, self.warning], stream))
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(["units_valid", "multiple_instances_across_files"],
+                         [line["check"] for line in lines])
+        self.assertEqual((3, 1, "error"), (lines[0]["line"], lines[0]["column"],
+                                           lines[0]["severity"]))
+        self.assertEqual({"unit": "parsec"}, lines[0]["params"])
+
+    def test_GIVEN_failures_WHEN_sarif_log_built_THEN_results_located_by_rule(self):
+        log = sarif_log([self.failure, self.warning], ["units_valid", "desc_length"])
+
+        run = log["runs"][0]
+        self.assertEqual("2.1.0", log["version"])
+        self.assertEqual(["units_valid", "desc_length",
+                          "multiple_instances_across_files"],
+                         [rule["id"] for rule in run["tool"]["driver"]["rules"]])
+        first, second = run["results"]
+        self.assertEqual(("units_valid", 0, "error"),
+                         (first["ruleId"], first["ruleIndex"], first["level"]))
+        location = first["locations"][0]["physicalLocation"]
+        self.assertEqual("file:///path/a.db", location["artifactLocation"]["uri"])
+        self.assertEqual({"startLine": 3, "startColumn": 1}, location["region"])
+        self.assertEqual((2, "warning"), (second["ruleIndex"], second["level"]))
+        self.assertNotIn("region", second["locations"][0]["physicalLocation"])
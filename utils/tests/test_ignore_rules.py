@@ -0,0 +1,60 @@
+import json
+import unittest
+from utils.ignore_rules import IgnoreRule, IgnoreRules, ALL_CHECKS
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+class TestIgnoreRules(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestIgnoreRules, self).setUp()
+        self.rules = IgnoreRules([
+            IgnoreRule("integration tests", paths=["*DbUnitChecker*"]),
+            IgnoreRule("historical", files=["motor.db"],
+                       checks=["test_multiple_pvs_warning"]),
+            IgnoreRule("vendor", paths=["*optics*"],
+                       checks=["test_units_valid",
+                               "test_multiple_pvs_warning"]),
+        ])
+
+    def test_GIVEN_file_name_rule_WHEN_matched_THEN_only_exact_name_skipped(self):
+        self.assertEqual({"test_multiple_pvs_warning": "historical"},
+                         self.rules.skips("/ioc/motor.db"))
+        self.assertEqual({}, self.rules.skips("/ioc/asynmotor.db"))
+
+    def test_GIVEN_path_glob_rule_WHEN_matched_THEN_checks_in_scope_skipped(self):
+        self.assertEqual({"test_units_valid": "vendor",
+                          "test_multiple_pvs_warning": "vendor"},
+                         self.rules.skips("/support/optics/Db/table.db"))
+        self.assertFalse(self.rules.skips_all("/support/optics/Db/table.db"))
+
+    def test_GIVEN_several_matching_rules_WHEN_matched_THEN_first_rule_gives_reason(self):
+        skips = self.rules.skips("/support/optics/Db/motor.db")
+        self.assertEqual("historical", skips["test_multiple_pvs_warning"])
+
+    def test_GIVEN_rule_without_checks_WHEN_matched_THEN_all_checks_skipped(self):
+        path = "/utils/DbUnitChecker/tests/test_all.db"
+        self.assertEqual("integration tests",
+                         self.rules.skips(path)[ALL_CHECKS])
+        self.assertTrue(self.rules.skips_all(path))
+
+    def test_GIVEN_config_with_unknown_key_WHEN_loaded_THEN_value_error_raised(self):
+        path = self._write("rules.json", json.dumps(
+            {"rules": [{"reason": "r", "file": ["a.db"]}]}))
+
+        with self.assertRaises(ValueError):
+            IgnoreRules.load(path)
+
+    def test_GIVEN_shipped_config_WHEN_loaded_THEN_checks_name_real_tests(self):
+        from tests.pv_unit_tests import IGNORE_RULES, TestPVUnits, \
+            TestCrossFilePVs
+        names = set(unittest.TestLoader().getTestCaseNames(TestPVUnits)) | \
+            set(unittest.TestLoader().getTestCaseNames(TestCrossFilePVs))
+
+        for rule in IGNORE_RULES.rules:
+            self.assertLessEqual(rule.checks or set(), names)
+
+    def test_GIVEN_rules_on_tests_WHEN_checks_asked_for_THEN_checks_of_those_tests_skipped(self):
+        skipped = self.rules.skipped_checks(
+            "/ioc/motor.db", ["multiple_instances", "units_valid"])
+
+        self.assertEqual(["multiple_instances"], list(skipped))
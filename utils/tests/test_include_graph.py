@@ -0,0 +1,74 @@
+import os
+from utils.include_graph import IncludeGraph, scan_includes
+from utils.loader import parsed_file
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+class TestIncludeGraph(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestIncludeGraph, self).setUp()
+        self.common = self._write(os.path.join("common", "common.db"),
+                                  'record(ao, "COMMON") {}\n')
+        self.first = self._write(os.path.join("ioc", "first.db"),
+                                 'record(ao, "BEFORE") {}\n'
+                                 'include "common.db"\n'
+                                 'record(ao, "AFTER") {}\n')
+        self.second = self._write(os.path.join("ioc", "second.db"),
+                                  'include "../common/common.db"\n'
+                                  'include "missing.db"\n')
+        self.loads = []
+        self.graph = IncludeGraph([self.common, self.first, self.second],
+                                  self._load)
+
+    def _load(self, filename):
+        self.loads.append(filename)
+        return parsed_file(filename)
+
+    def test_GIVEN_db_with_includes_WHEN_scanned_THEN_names_found_in_order(self):
+        self.assertEqual(["../common/common.db", "missing.db"],
+                         scan_includes(self.second))
+
+    def test_GIVEN_include_after_record_on_same_line_WHEN_scanned_THEN_found_as_parser_does(self):
+        filename = self._write("inline.db",
+                               'record(ao, "A") {} include "a.db"\n'
+                               'record(ao, "B") {\n'
+                               '    field(DESC, "include \\"b.db\\"")\n'
+                               '    include "c.db"\n'
+                               '}\n'
+                               '# include "d.db"\n')
+
+        self.assertEqual(["a.db"], scan_includes(filename))
+        self.assertEqual([(1, "a.db")], parsed_file(filename).includes)
+
+    def test_GIVEN_includes_WHEN_graph_built_THEN_edges_resolved(self):
+        self.assertEqual([self.common], self.graph.includes[self.first])
+        self.assertEqual({self.first, self.second},
+                         self.graph.includers[self.common])
+        self.assertEqual([(self.second, "missing.db")], self.graph.missing)
+        self.assertEqual({self.first, self.second},
+                         self.graph.dependents([self.common]))
+
+    def test_GIVEN_include_WHEN_composed_THEN_records_in_include_order(self):
+        own, composed = self.graph.load_with_includes(self.first)
+
+        self.assertEqual(["BEFORE", "AFTER"], [r.pv for r in own.records])
+        self.assertEqual(["BEFORE", "COMMON", "AFTER"],
+                         [r.pv for r in composed.records])
+
+    def test_GIVEN_shared_include_WHEN_includers_composed_THEN_parsed_once(self):
+        for filename in (self.common, self.first, self.second):
+            self.graph.composed(filename)
+
+        self.assertEqual(1, self.loads.count(self.common))
+        self.assertEqual(["COMMON"], [r.pv for r in
+                                      self.graph.composed(self.second).records])
+
+    def test_GIVEN_include_cycle_WHEN_composed_THEN_each_file_included_once(self):
+        looped = self._write(os.path.join("loop", "a.db"),
+                             'record(ao, "A") {}\ninclude "b.db"\n')
+        self._write(os.path.join("loop", "b.db"),
+                    'record(ao, "B") {}\ninclude "a.db"\n')
+        graph = IncludeGraph([looped], parsed_file)
+
+        self.assertEqual(["A", "B"],
+                         [r.pv for r in graph.composed(looped).records])
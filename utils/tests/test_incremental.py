@@ -0,0 +1,100 @@
+import os
+from utils.incremental import Baseline, checks_key, files_to_check, read_file_list
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+FILE_TYPES = ['.db', '.template']
+
+OUTCOMES = [["test_desc_length", "passed", None]]
+
+
+class TestIncremental(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestIncremental, self).setUp()
+        self.first = self._write("first.db")
+        self.second = self._write("second.db")
+        self.baseline = Baseline()
+        self.baseline.update(self.first, OUTCOMES, os.stat(self.first))
+        self.baseline.update(self.second, OUTCOMES, os.stat(self.second))
+
+    def test_GIVEN_saved_baseline_WHEN_loaded_THEN_results_returned(self):
+        path = os.path.join(self.directory, "baseline.json")
+        self.baseline.save(path)
+
+        loaded = Baseline.load(path)
+        self.assertEqual([(self.first, OUTCOMES), (self.second, OUTCOMES)],
+                         list(loaded.results()))
+        self.assertFalse(loaded.is_stale(self.first))
+
+    def test_GIVEN_baseline_of_other_checks_WHEN_loaded_THEN_none_returned(self):
+        rules = self._write("rules.json")
+        path = os.path.join(self.directory, "baseline.json")
+        Baseline(self.baseline.files, checks_key(rules)).save(path)
+        self.assertIsNotNone(Baseline.load(path, checks_key(rules)))
+
+        with open(rules, "w") as _file:
+            _file.write("[]")
+
+        self.assertIsNone(Baseline.load(path, checks_key(rules)))
+
+    def test_GIVEN_baseline_of_other_options_WHEN_loaded_THEN_none_returned(self):
+        rules = self._write("rules.json")
+        path = os.path.join(self.directory, "baseline.json")
+        Baseline(self.baseline.files,
+                 checks_key(rules, {"includes": False})).save(path)
+
+        self.assertIsNone(
+            Baseline.load(path, checks_key(rules, {"includes": True})))
+
+    def test_GIVEN_file_changed_while_checked_WHEN_updated_with_earlier_stat_THEN_stale(self):
+        stat = os.stat(self.first)
+        self._write("first.db", mtime=stat.st_mtime_ns + 10 ** 9)
+
+        self.baseline.update(self.first, OUTCOMES, stat)
+
+        self.assertTrue(self.baseline.is_stale(self.first))
+
+    def test_GIVEN_no_baseline_file_WHEN_loaded_THEN_none_returned(self):
+        self.assertIsNone(
+            Baseline.load(os.path.join(self.directory, "missing.json")))
+
+    def test_GIVEN_unchanged_tree_WHEN_scanned_THEN_nothing_to_check(self):
+        to_check, removed = files_to_check(
+            self.baseline, [self.directory], FILE_TYPES,
+            scan_dirs=[self.directory])
+
+        self.assertEqual([], to_check)
+        self.assertEqual([], removed)
+
+    def test_GIVEN_modified_new_and_deleted_files_WHEN_scanned_THEN_changes_found(self):
+        self._write("first.db", mtime=1)
+        new = self._write(os.path.join("sub", "new.template"))
+        os.remove(self.second)
+
+        to_check, removed = files_to_check(
+            self.baseline, [self.directory], FILE_TYPES,
+            scan_dirs=[self.directory])
+
+        self.assertEqual(sorted([self.first, new]), to_check)
+        self.assertEqual([self.second], removed)
+
+    def test_GIVEN_changed_file_list_WHEN_checked_THEN_only_candidates_in_input_dirs_returned(self):
+        os.remove(self.second)
+        ignored = self._write(os.path.join("O.Common", "built.db"))
+        other_type = self._write("notes.txt")
+        outside = os.path.abspath(__file__)
+
+        to_check, removed = files_to_check(
+            self.baseline, [self.directory], FILE_TYPES,
+            changed=[self.first, self.second, ignored, other_type, outside])
+
+        self.assertEqual([self.first], to_check)
+        self.assertEqual([self.second], removed)
+
+    def test_GIVEN_nul_separated_list_WHEN_read_THEN_names_kept_whole(self):
+        listing = self._write("staged.txt")
+        with open(listing, "w") as _file:
+            _file.write("first.db\0a dir/second.db \0")
+
+        self.assertEqual(
+            [os.path.abspath("first.db"), os.path.abspath("a dir/second.db ")],
+            read_file_list(listing))
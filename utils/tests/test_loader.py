@@ -0,0 +1,71 @@
+import os
+from utils.loader import given_files, is_epics, parsed_file, prefetch
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+class TestLoader(TempDirectoryTestCase):
+    def test_GIVEN_record_definitions_WHEN_classified_THEN_epics(self):
+        self.assertTrue(is_epics(b'record(ao, "A") {}'))
+        self.assertTrue(is_epics(b'# comment\ngrecord (ai, "A")'))
+        self.assertTrue(is_epics(b'include "common.db"\n'))
+
+    def test_GIVEN_text_mentioning_records_WHEN_classified_THEN_not_epics(self):
+        self.assertFalse(is_epics(b'the recorded value of a record'))
+        self.assertFalse(is_epics(b''))
+
+    def test_GIVEN_binary_data_WHEN_classified_THEN_not_epics(self):
+        self.assertFalse(is_epics(b'\x89PNG\x00\x00record(ao, "A")'))
+
+    def test_GIVEN_record_after_sniff_size_WHEN_classified_THEN_not_epics(self):
+        data = b'#' * 100 + b'\nrecord(ao, "A")'
+
+        self.assertFalse(is_epics(data, sniff_size=100))
+        self.assertTrue(is_epics(data, sniff_size=len(data)))
+        self.assertTrue(is_epics(data))
+
+    def test_GIVEN_files_WHEN_parsed_THEN_only_epics_files_parsed(self):
+        db_file = self._write("real.db", b'record(ao, "A") {}\n')
+        binary = self._write("binary.template", b'\x00record(ao, "A")')
+        empty = self._write("empty.db", b'')
+
+        self.assertEqual(["A"], [rec.pv for rec in parsed_file(db_file).records])
+        self.assertIsNone(parsed_file(binary))
+        self.assertIsNone(parsed_file(empty))
+
+    def test_GIVEN_files_WHEN_prefetched_THEN_parsed_in_order_given(self):
+        filenames = [self._write("{}.db".format(i),
+                                 'record(ao, "{}") {{}}\n'.format(i).encode())
+                     for i in range(20)]
+        filenames.append(self._write("binary.db", b'\x00'))
+
+        results = [(filename, parsed_file(filename, prefetched=fetched))
+                   for filename, fetched in prefetch(filenames, 4, window=3)]
+
+        self.assertEqual(filenames, [filename for filename, _ in results])
+        self.assertEqual([str(i) for i in range(20)],
+                         [db.records[0].pv for _, db in results[:-1]])
+        self.assertIsNone(results[-1][1])
+
+    def test_GIVEN_missing_file_WHEN_prefetched_THEN_error_names_file(self):
+        missing = os.path.join(self.directory, "missing.db")
+
+        with self.assertRaisesRegex(Exception, "found in .*missing.db"):
+            list(prefetch([missing], 2))
+
+    def test_GIVEN_file_list_WHEN_filtered_THEN_only_existing_candidates_given_once(self):
+        first = self._write("a.db", b"")
+        os.mkdir(os.path.join(self.directory, "O.Common"))
+        built = os.path.join("O.Common", "b.db")
+        self._write(built, b"")
+        self._write("notes.txt", b"")
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            found = list(given_files(
+                ["a.db", "./a.db", built, "notes.txt", "missing.db"],
+                [".db"]))
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual([os.path.realpath(first)],
+                         [os.path.realpath(f) for f in found])
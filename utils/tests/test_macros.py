@@ -0,0 +1,56 @@
+import unittest
+from utils.EPICS_collections import Db, Record, Field
+from utils.macros import MacroExpander, TemplateExpander, parse_macros
+
+
+class TestMacros(unittest.TestCase):
+    def setUp(self):
+        self.expander = MacroExpander({"P": "IN:DEMO:", "Q": "$(P)MOT",
+                                       "N": "1", "AXIS1": "X"})
+
+    def test_GIVEN_both_bracket_styles_WHEN_expanded_THEN_values_substituted(self):
+        self.assertEqual("IN:DEMO:A IN:DEMO:B",
+                         self.expander.expand("$(P)A ${P}B"))
+
+    def test_GIVEN_defaults_WHEN_expanded_THEN_default_used_only_if_undefined(self):
+        self.assertEqual("IN:DEMO: mm", self.expander.expand("$(P=x) $(EGU=mm)"))
+
+    def test_GIVEN_nested_macros_WHEN_expanded_THEN_inner_expanded_first(self):
+        self.assertEqual("X", self.expander.expand("$(AXIS$(N))"))
+        self.assertEqual("IN:DEMO:MOT", self.expander.expand("$(Q)"))
+        self.assertEqual("IN:DEMO:", self.expander.expand("$(UNDEF=$(P))"))
+
+    def test_GIVEN_undefined_macro_WHEN_expanded_THEN_reference_kept(self):
+        self.assertEqual("$(PORT):${ADDR}",
+                         self.expander.expand("$(PORT):${ADDR}"))
+        self.assertEqual("$(AXIS2)", self.expander.expand("$(AXIS$(M=2))"))
+
+    def test_GIVEN_recursive_macro_WHEN_expanded_THEN_expansion_stops(self):
+        expander = MacroExpander({"A": "$(B)", "B": "x$(A)"})
+        self.assertEqual("x$(A)", expander.expand("$(A)"))
+
+    def test_GIVEN_definition_string_WHEN_parsed_THEN_macros_returned(self):
+        self.assertEqual({"P": "IN:DEMO:", "Q": ""},
+                         parse_macros("P=IN:DEMO:, Q="))
+
+    def test_GIVEN_template_WHEN_expanded_twice_THEN_loaded_and_expanded_once(self):
+        loads = []
+
+        def load(path):
+            loads.append(path)
+            return Db(path, [Record("ao", "$(P)POS",
+                                    [Field("INTEREST", "HIGH")],
+                                    [Field("EGU", "$(EGU=mm)")],
+                                    ["$(P)ALIAS"])])
+
+        templates = TemplateExpander(load)
+        first = templates.expand("/axis.template", {"P": "A:"})
+        again = templates.expand("/axis.template", {"P": "A:"})
+        other = templates.expand("/axis.template", {"P": "B:", "EGU": "deg"})
+
+        self.assertIs(first, again)
+        self.assertEqual(["/axis.template"], loads)
+        self.assertEqual("A:POS", first.records[0].pv)
+        self.assertEqual(["A:ALIAS"], first.records[0].aliases)
+        self.assertEqual("mm", first.records[0].get_field("EGU"))
+        self.assertEqual("deg", other.records[0].get_field("EGU"))
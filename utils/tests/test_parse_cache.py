@@ -0,0 +1,75 @@
+import os
+import mock
+from utils import loader
+from utils.parse_cache import ParseCache
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+DB_TEXT = 'record(ao, "CACHED:PV")\n{\n    field(EGU, "m")\n}\n'
+
+
+class TestParseCache(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestParseCache, self).setUp()
+        self.cache = ParseCache(os.path.join(self.directory, "cache"))
+        self.filename = self._write("cached.db", DB_TEXT)
+
+    def test_GIVEN_empty_cache_WHEN_looked_up_THEN_not_found(self):
+        found, db = self.cache.lookup(self.filename)
+        self.assertFalse(found)
+        self.assertIsNone(db)
+
+    def test_GIVEN_parsed_file_WHEN_looked_up_THEN_cached_db_returned(self):
+        loader.parsed_file(self.filename, self.cache)
+
+        found, db = self.cache.lookup(self.filename)
+        self.assertTrue(found)
+        self.assertEqual(["CACHED:PV"], [rec.pv for rec in db.records])
+        self.assertEqual("m", db.records[0].get_field("EGU"))
+
+    def test_GIVEN_file_not_in_epics_format_WHEN_looked_up_THEN_found_as_none(self):
+        filename = self._write("other.template", "nothing to parse here")
+        self.assertIsNone(loader.parsed_file(filename, self.cache))
+
+        self.assertEqual((True, None), self.cache.lookup(filename))
+
+    def test_GIVEN_changed_file_WHEN_looked_up_THEN_not_found(self):
+        loader.parsed_file(self.filename, self.cache)
+        self._write("cached.db", DB_TEXT.replace("CACHED", "CHANGED"), mtime=1)
+
+        found, _ = self.cache.lookup(self.filename)
+        self.assertFalse(found)
+        db = loader.parsed_file(self.filename, self.cache)
+        self.assertEqual(["CHANGED:PV"], [rec.pv for rec in db.records])
+
+    def test_GIVEN_touched_file_WHEN_looked_up_without_hash_THEN_not_found(self):
+        loader.parsed_file(self.filename, self.cache)
+        os.utime(self.filename, ns=(1, 1))
+
+        found, _ = self.cache.lookup(self.filename)
+        self.assertFalse(found)
+
+    def test_GIVEN_cache_without_hash_WHEN_file_stored_THEN_contents_not_hashed(self):
+        with mock.patch("utils.parse_cache.content_hash") as content_hash:
+            loader.parsed_file(self.filename, self.cache)
+
+        content_hash.assert_not_called()
+        self.assertTrue(self.cache.lookup(self.filename)[0])
+
+    def test_GIVEN_touched_file_WHEN_looked_up_with_hash_THEN_found(self):
+        cache = ParseCache(self.cache.directory, use_hash=True)
+        loader.parsed_file(self.filename, cache)
+        os.utime(self.filename, ns=(1, 1))
+
+        found, db = cache.lookup(self.filename)
+        self.assertTrue(found)
+        self.assertEqual(["CACHED:PV"], [rec.pv for rec in db.records])
+
+    def test_GIVEN_deleted_file_WHEN_evicting_THEN_only_its_entry_removed(self):
+        other = self._write("other.db", DB_TEXT)
+        loader.parsed_file(self.filename, self.cache)
+        loader.parsed_file(other, self.cache)
+        os.remove(other)
+
+        self.assertEqual(1, self.cache.evict_missing())
+        self.assertTrue(self.cache.lookup(self.filename)[0])
+        self.assertEqual(1, len(os.listdir(self.cache.directory)))
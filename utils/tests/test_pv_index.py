@@ -0,0 +1,86 @@
+import os
+import unittest
+from utils.pv_index import PvIndex, summarise
+from utils.EPICS_collections import Record, Db, Field
+
+
+def _db(path, records):
+    return Db(os.path.join(os.sep, *path.split("/")), records)
+
+
+class TestPvIndex(unittest.TestCase):
+    def test_GIVEN_db_WHEN_summarised_THEN_pvs_aliases_and_log_infos_returned(self):
+        infos = [Field("LOG_HEADER1", "a header"), Field("INTEREST", "HIGH")]
+        db = _db("ioc/a.db", [Record('ao', 'A:PV', infos, [], ['A:ALIAS'])])
+
+        summary = summarise(db)
+
+        self.assertEqual([('A:PV', 'ao'), ('A:ALIAS', 'ao')], summary["pvs"])
+        self.assertEqual([('A:PV', 'LOG_HEADER1')], summary["logs"])
+
+    def test_GIVEN_same_pv_in_two_files_in_one_directory_WHEN_indexed_THEN_duplicate_found(self):
+        index = PvIndex()
+        index.add(_db("ioc/a.db", [Record('ao', 'SAME', None, [])]))
+        index.add(_db("ioc/b.db", [Record('ai', 'SAME', None, [])]))
+
+        duplicates = index.duplicates()
+
+        directory = os.path.join(os.sep, "ioc")
+        self.assertEqual(
+            [('SAME', [os.path.join(directory, "a.db"), os.path.join(directory, "b.db")])],
+            duplicates[directory])
+        self.assertEqual([directory], index.directories())
+
+    def test_GIVEN_same_macro_name_in_two_files_in_one_directory_WHEN_indexed_THEN_no_duplicate_found(self):
+        index = PvIndex()
+        index.add(_db("ioc/a.db", [Record('ao', '$(P)SIM', None, []),
+                                   Record('ao', '${P}DISABLE', None, [])]))
+        index.add(_db("ioc/b.db", [Record('bo', '$(P)SIM', None, []),
+                                   Record('bo', '${P}DISABLE', None, [])]))
+
+        self.assertEqual({}, index.duplicates())
+
+    def test_GIVEN_same_pv_in_different_directories_WHEN_indexed_THEN_no_duplicate_found(self):
+        index = PvIndex()
+        index.add(_db("ioc1/a.db", [Record('ao', 'SAME', None, [])]))
+        index.add(_db("ioc2/a.db", [Record('ao', 'SAME', None, [])]))
+
+        self.assertEqual({}, index.duplicates())
+        self.assertEqual([], index.directories())
+
+    def test_GIVEN_same_pv_twice_in_one_file_WHEN_indexed_THEN_no_cross_file_duplicate_found(self):
+        index = PvIndex()
+        index.add(_db("ioc/a.db", [Record('ao', 'SAME', None, []), Record('ao', 'SAME', None, [])]))
+
+        self.assertEqual({}, index.duplicates())
+
+    def test_GIVEN_log_infos_in_several_files_WHEN_indexed_THEN_entries_grouped_by_directory_in_file_order(self):
+        index = PvIndex()
+        index.add(_db("ioc/b.db", [Record('ao', 'B', [Field("LOG_HEADER1", "b")], [])]))
+        index.add(_db("ioc/a.db", [Record('ao', 'A', [Field("LOG_HEADER1", "a")], [])]))
+
+        directory = os.path.join(os.sep, "ioc")
+        self.assertEqual(
+            [(os.path.join(directory, "a.db"), 'A', 'LOG_HEADER1'),
+             (os.path.join(directory, "b.db"), 'B', 'LOG_HEADER1')],
+            index.log_entries(directory))
+
+    def test_GIVEN_indexed_file_WHEN_removed_THEN_no_longer_duplicate(self):
+        index = PvIndex()
+        index.add(_db("ioc/a.db", [Record('ao', 'SAME', None, [])]))
+        index.add(_db("ioc/b.db", [Record('ai', 'SAME', None, [])]))
+
+        index.remove(os.path.join(os.sep, "ioc", "b.db"))
+
+        self.assertEqual({}, index.duplicates())
+        self.assertEqual([], index.directories())
+
+    def test_GIVEN_duplicates_in_two_directories_WHEN_one_asked_for_THEN_only_that_directory_returned(self):
+        index = PvIndex()
+        for path in ["ioc/a.db", "ioc/b.db", "other/a.db", "other/b.db"]:
+            index.add(_db(path, [Record('ao', 'SAME', None, [])]))
+
+        directory = os.path.join(os.sep, "ioc")
+        duplicates = index.duplicates({directory})
+
+        self.assertEqual([directory], list(duplicates))
@@ -0,0 +1,74 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+from utils.results import JUnitWriter, ResultCollector, PASSED, FAILED, \
+    ERROR, SKIPPED
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+CLASSNAME = "tests.pv_unit_tests.TestPVUnits"
+
+OUTCOMES = [
+    ("test_desc_length", PASSED, None),
+    ("test_units_valid", FAILED, "1 != 0 : Invalid units\n   -> 'BADUNIT'"),
+    ("test_interest_syntax", SKIPPED, "Vendor-supplied DBs"),
+    ("test_log_info_tags", ERROR, "Traceback <\x01>"),
+]
+
+
+class TestResults(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestResults, self).setUp()
+        self.path = os.path.join(self.directory, "TEST-report.xml")
+
+    def test_GIVEN_suites_WHEN_written_THEN_report_is_junit_xml(self):
+        with JUnitWriter(self.path) as writer:
+            writer.write_suite("/ioc/a.db", CLASSNAME, OUTCOMES)
+            writer.write_suite("/ioc/b.db", CLASSNAME, OUTCOMES[:1])
+
+        suites = ET.parse(self.path).getroot()
+        self.assertEqual("testsuites", suites.tag)
+        self.assertEqual(["/ioc/a.db", "/ioc/b.db"],
+                         [suite.get("name") for suite in suites])
+        first = suites[0]
+        self.assertEqual(("4", "1", "1", "1"), (
+            first.get("tests"), first.get("failures"), first.get("errors"),
+            first.get("skipped")))
+        self.assertEqual(CLASSNAME, first[0].get("classname"))
+        failure = first[1].find("failure")
+        self.assertEqual("AssertionError", failure.get("type"))
+        self.assertEqual(OUTCOMES[1][2], failure.text)
+        self.assertEqual("Traceback <?>", first[3].find("error").text)
+
+    def test_GIVEN_suites_WHEN_written_THEN_only_measured_times_given(self):
+        with JUnitWriter(self.path) as writer:
+            writer.write_suite("/ioc/a.db", CLASSNAME, OUTCOMES[:1])
+            writer.write_suite("/ioc", CLASSNAME, OUTCOMES[:1], 0.25)
+
+        first, second = ET.parse(self.path).getroot()
+        self.assertIsNone(first.get("time"))
+        self.assertIsNone(first[0].get("time"))
+        self.assertEqual("0.250", second.get("time"))
+
+    def test_GIVEN_suite_written_WHEN_report_still_open_THEN_suite_on_disk(self):
+        with JUnitWriter(self.path) as writer:
+            writer.write_suite("/ioc/a.db", CLASSNAME, OUTCOMES)
+            with open(self.path) as _file:
+                self.assertIn('name="/ioc/a.db"', _file.read())
+
+    def test_GIVEN_failures_WHEN_collected_THEN_printed_and_unsuccessful(self):
+        stream = io.StringIO()
+        with JUnitWriter(self.path) as writer:
+            collector = ResultCollector(writer, stream)
+            collector.add("/ioc/a.db", CLASSNAME, OUTCOMES[:3])
+            collector.summarise()
+
+        self.assertFalse(collector.was_successful())
+        self.assertIn("FAIL: test_units_valid (/ioc/a.db)", stream.getvalue())
+        self.assertIn("FAILED (failures=1, skipped=1)", stream.getvalue())
+
+    def test_GIVEN_only_passes_WHEN_collected_THEN_successful(self):
+        with JUnitWriter(self.path) as writer:
+            collector = ResultCollector(writer, io.StringIO())
+            collector.add("/ioc/a.db", CLASSNAME, OUTCOMES[:1])
+
+        self.assertTrue(collector.was_successful())
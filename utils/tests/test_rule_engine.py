@@ -0,0 +1,89 @@
+import unittest
+from utils import db_checks
+from utils.rule_engine import RuleSet
+from utils.EPICS_collections import Record, Db, Field
+
+
+class _CountingRecords(list):
+    def __init__(self, records):
+        super(_CountingRecords, self).__init__(records)
+        self.traversals = 0
+
+    def __iter__(self):
+        self.traversals += 1
+        return super(_CountingRecords, self).__iter__()
+
+
+class TestRuleEngine(unittest.TestCase):
+    def setUp(self):
+        self.rules = RuleSet()
+        self.records = [
+            Record('ao', 'A', None, [Field('EGU', 'm')]),
+            Record('ai', 'B', None, [Field('DESC', 'desc')]),
+        ]
+
+    def test_GIVEN_rule_with_fields_WHEN_run_THEN_visitor_given_field_values(self):
+        seen = []
+
+        @self.rules.record_rule("fields", fields=["EGU", "DESC"])
+        def visit(rec, values, state):
+            seen.append((rec.pv, values))
+
+        self.rules.run(Db('/path', self.records))
+
+        self.assertEqual([('A', {'EGU': 'm', 'DESC': None}),
+                          ('B', {'EGU': None, 'DESC': 'desc'})], seen)
+
+    def test_GIVEN_rule_for_record_type_WHEN_run_THEN_only_matching_records_visited(self):
+        @self.rules.record_rule("ai only", record_types={'ai'})
+        def visit(rec, values, state):
+            return ["visited {}".format(rec)]
+
+        failures = self.rules.run(Db('/path', self.records))
+
+        self.assertEqual({"ai only": ["visited B"]}, failures)
+
+    def test_GIVEN_rule_with_finish_WHEN_run_THEN_failures_reported_from_state(self):
+        @self.rules.record_rule("count", finish=lambda state: ["{} records".format(state["count"])])
+        def visit(rec, values, state):
+            state["count"] = state.get("count", 0) + 1
+
+        failures = self.rules.run(Db('/path', self.records))
+
+        self.assertEqual({"count": ["2 records"]}, failures)
+
+    def test_GIVEN_named_rules_WHEN_run_THEN_only_those_rules_run(self):
+        self.rules.record_rule("first")(lambda rec, values, state: ["first"])
+        self.rules.record_rule("second")(lambda rec, values, state: ["second"])
+
+        failures = self.rules.run(Db('/path', self.records), ["second"])
+
+        self.assertEqual({"second": ["second", "second"]}, failures)
+
+    def test_GIVEN_db_WHEN_all_checks_run_THEN_records_traversed_once(self):
+        records = _CountingRecords([
+            Record('ao', 'SHOULDFAIL:BADUNIT', [Field('INTEREST', 'HIGH')], [Field('EGU', 'BADUNIT')]),
+        ])
+
+        failures = db_checks.run_checks(Db('/path', records))
+
+        self.assertEqual(1, records.traversals)
+        self.assertEqual(set(db_checks.RULES.rules), set(failures))
+        self.assertEqual(1, len(failures["units_valid"]))
+        self.assertEqual(1, len(failures["interest_descriptions"]))
+
+    def test_GIVEN_timings_WHEN_run_THEN_time_of_each_rule_added(self):
+        @self.rules.record_rule("first")
+        def first(rec, values, state):
+            pass
+
+        @self.rules.record_rule("second", finish=lambda state: [])
+        def second(rec, values, state):
+            pass
+
+        timings = {"first": 1.0}
+        self.rules.run(Db('/path', self.records), timings=timings)
+
+        self.assertEqual({"first", "second"}, set(timings))
+        self.assertGreater(timings["first"], 1.0)
+        self.assertGreater(timings["second"], 0.0)
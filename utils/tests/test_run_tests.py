@@ -0,0 +1,156 @@
+import io
+import os
+import subprocess
+import sys
+import unittest
+import mock
+import run_tests
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+RUN_TESTS = os.path.join(os.path.dirname(__file__), "..", "..",
+                         "run_tests.py")
+
+
+def _record(pv, unit="furlongs"):
+    return "record(ai, \"{}\")\n{{\n    field(EGU, \"{}\")\n}}\n".format(
+        pv, unit)
+
+
+class TestGivenFiles(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestGivenFiles, self).setUp()
+        self._write(os.path.join("ioc", "other.db"), _record("A:B"))
+        self._write("given.db", _record("C:D"))
+
+    def _run(self, *args):
+        return subprocess.run([sys.executable, RUN_TESTS] + list(args),
+                              cwd=self.directory, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              universal_newlines=True)
+
+    def test_GIVEN_input_dirs_then_files_after_dashes_WHEN_run_THEN_only_files_checked(self):
+        result = self._run("-i", "ioc", ".", "--", "given.db")
+
+        self.assertEqual(1, result.returncode, result.stderr)
+        self.assertIn("given.db:1:", result.stdout)
+        self.assertNotIn("other.db", result.stdout)
+
+    def test_GIVEN_several_input_dirs_WHEN_run_THEN_all_dirs_checked(self):
+        self._write(os.path.join("support", "third.db"), _record("E:F"))
+
+        result = self._run("--output_format", "text", "-i", "ioc", "support")
+
+        self.assertEqual(1, result.returncode, result.stderr)
+        self.assertIn("other.db:1:", result.stdout)
+        self.assertIn("third.db:1:", result.stdout)
+        self.assertNotIn("given.db", result.stdout)
+
+    def test_GIVEN_file_after_input_dir_without_dashes_WHEN_run_THEN_invalid_arguments(self):
+        result = self._run("-i", "ioc", "given.db")
+
+        self.assertEqual(2, result.returncode)
+        self.assertIn("--", result.stderr)
+
+    def test_GIVEN_directory_as_file_to_check_WHEN_run_THEN_invalid_arguments(self):
+        result = self._run("-i", "ioc", "--", "ioc")
+
+        self.assertEqual(2, result.returncode)
+        self.assertIn("ioc is not a file", result.stderr)
+
+    def test_GIVEN_missing_file_to_check_WHEN_run_THEN_invalid_arguments(self):
+        result = self._run("missing.db")
+
+        self.assertEqual(2, result.returncode)
+        self.assertIn("missing.db is not a file", result.stderr)
+
+    def test_GIVEN_file_that_cannot_be_parsed_WHEN_run_THEN_reported_and_others_checked(self):
+        self._write(os.path.join("ioc", "broken.db"),
+                    "record(ai, \"X\") {\n    field(\n")
+
+        for output in (["--output_format", "text"], ["-o", "out"]):
+            result = self._run("-i", "ioc", *output)
+
+            self.assertEqual(1, result.returncode, result.stderr)
+            self.assertIn("broken.db", result.stdout)
+            self.assertIn("Unexpected end of file (line 3)", result.stdout)
+            self.assertIn("Invalid unit 'furlongs' on A:B", result.stdout)
+
+    def test_GIVEN_staged_files_on_stdin_WHEN_run_THEN_files_checked(self):
+        result = subprocess.run(
+            [sys.executable, RUN_TESTS, "-i", "ioc", "--files_from", "-"],
+            cwd=self.directory, input="given.db\0", stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True)
+
+        self.assertEqual(1, result.returncode, result.stderr)
+        self.assertIn("given.db:1:", result.stdout)
+        self.assertNotIn("other.db", result.stdout)
+
+
+class TestCheckFiles(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestCheckFiles, self).setUp()
+        self.filenames = [
+            self._write("{}.db".format(number), _record(
+                "A:{}".format(number), "furlongs" if number % 2 else "m"))
+            for number in range(6)]
+
+    def test_GIVEN_files_WHEN_checked_with_two_jobs_THEN_same_results_as_serially(self):
+        serial = list(run_tests._check_files(self.filenames, jobs=1))
+        parallel = list(run_tests._check_files(self.filenames, jobs=2))
+
+        self.assertEqual(self.filenames,
+                         [filename for filename, _ in parallel])
+        self.assertEqual(serial, parallel)
+        failed = [filename for filename, (outcomes, _) in parallel
+                  if any(outcome == "failed" for _, outcome, _ in outcomes)]
+        self.assertEqual(self.filenames[1::2], failed)
+
+
+class TestWatch(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestWatch, self).setUp()
+        self.mtime = os.stat(self.directory).st_mtime_ns
+        self.filename = self._edit("furlongs")
+
+    def _edit(self, unit, broken=False):
+        text = _record("A:B", unit)
+        if broken:
+            text = text[:text.index("    field")]
+        # a second apart, so every edit is seen by the next poll
+        self.mtime += 10 ** 9
+        return self._write("a.db", text, self.mtime)
+
+    def _watch(self, *edits):
+        # each poll waits on a sleep, which makes the next edit instead
+        steps = iter(edits)
+        with mock.patch("utils.watcher.time.sleep",
+                        side_effect=lambda _: next(steps)()), \
+                mock.patch("sys.stdout", new_callable=io.StringIO) as out:
+            run_tests.watch([self.directory], polls=len(edits))
+        return out.getvalue().splitlines()
+
+    def test_GIVEN_file_edited_broken_and_fixed_WHEN_watched_THEN_changes_reported(self):
+        failure = "{} test_units_valid: -> Invalid unit '{{}}' on A:B".format(
+            self.filename)
+
+        lines = self._watch(lambda: self._edit("parsecs"),
+                            lambda: self._edit("parsecs", broken=True),
+                            lambda: self._edit("parsecs"))
+
+        parse = "{} parse: ".format(self.filename)
+
+        self.assertEqual("+ " + failure.format("furlongs"), lines[1])
+        self.assertEqual(["+ " + failure.format("parsecs"),
+                          "- " + failure.format("furlongs")], lines[3:5])
+        self.assertEqual("? " + failure.format("parsecs"), lines[6])
+        self.assertTrue(lines[7].startswith("+ " + parse))
+        self.assertTrue(lines[8].startswith(
+            "1 new, 0 resolved, 1 unknown, 2 failing"))
+        self.assertTrue(lines[9].startswith("- " + parse))
+        self.assertTrue(lines[10].startswith(
+            "0 new, 1 resolved, 0 unknown, 1 failing"))
+        self.assertEqual(11, len(lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
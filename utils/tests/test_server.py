@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from utils.ignore_rules import IgnoreRule, IgnoreRules
+from utils.server import CheckService, RequestError, is_loopback, \
+    make_server
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+RECORD = 'record(ai, "IN:A") {field(EGU, "parsec")}\n'
+
+
+class TestCheckService(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestCheckService, self).setUp()
+        self.service = CheckService(IgnoreRules([
+            IgnoreRule("vendor", paths=["*optics*"],
+                       checks=["test_units_valid"])]))
+
+    def test_GIVEN_path_WHEN_checked_THEN_failures_returned(self):
+        filename = self._write("a.db", RECORD)
+
+        response = self.service.check({"path": filename})
+
+        self.assertTrue(response["epics"])
+        self.assertEqual([("units_valid", "Invalid unit 'parsec' on IN:A", 1)],
+                         [(f["check"], f["message"], f["line"])
+                          for f in response["failures"]])
+
+    def test_GIVEN_unchanged_path_WHEN_checked_again_THEN_parsed_db_reused(self):
+        filename = self._write("a.db", RECORD)
+        self.service.check({"path": filename})
+        db = self.service._dbs[filename][1]
+
+        self.service.check({"path": filename})
+
+        self.assertIs(db, self.service._dbs[filename][1])
+
+    def test_GIVEN_text_on_ignored_path_WHEN_checked_THEN_check_skipped(self):
+        response = self.service.check({"text": RECORD,
+                                       "name": "/support/optics/a.db"})
+
+        self.assertEqual([], response["failures"])
+        self.assertEqual({"units_valid": "vendor"}, response["skipped"])
+
+    def test_GIVEN_invalid_requests_WHEN_checked_THEN_request_errors(self):
+        for request, status in [({}, 400),
+                                ({"path": "relative.db"}, 400),
+                                ({"text": RECORD, "checks": ["bad"]}, 400),
+                                ({"text": 'record(ai'}, 422),
+                                ({"path": 5}, 400),
+                                ({"text": RECORD, "name": 5}, 400),
+                                ({"text": RECORD, "checks": 5}, 400),
+                                ({"text": RECORD, "checks": [5]}, 400),
+                                ({"path": self.directory}, 400),
+                                ({"path": os.path.join(self.directory,
+                                                       "missing.db")}, 404)]:
+            with self.assertRaises(RequestError) as context:
+                self.service.check(request)
+            self.assertEqual(status, context.exception.status)
+
+    def _post(self, body):
+        server = make_server(self.service, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = "http://{}:{}/check".format(*server.server_address)
+            request = urllib.request.Request(
+                url, json.dumps(body).encode("utf-8"),
+                {"Content-Type": "application/json"})
+            # connect directly, whatever proxy the environment sets
+            opener = urllib.request.build_opener(
+                urllib.request.ProxyHandler({}))
+            try:
+                with opener.open(request) as response:
+                    return response.status, json.load(response)
+            except urllib.error.HTTPError as e:
+                return e.code, json.load(e)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_GIVEN_server_WHEN_request_posted_THEN_json_response(self):
+        status, body = self._post({"text": RECORD})
+
+        self.assertEqual(200, status)
+        self.assertEqual(["units_valid"],
+                         [f["check"] for f in body["failures"]])
+
+    def test_GIVEN_unexpected_error_WHEN_request_posted_THEN_json_error(self):
+        def fail(request):
+            raise RuntimeError("broken")
+        self.service.check = fail
+
+        status, body = self._post({"text": RECORD})
+
+        self.assertEqual(500, status)
+        self.assertIn("broken", body["error"])
+
+    def test_GIVEN_loopback_hosts_WHEN_checked_THEN_accepted(self):
+        for host in ("127.0.0.1", "localhost", "::1"):
+            self.assertTrue(is_loopback(host), host)
+
+    def test_GIVEN_other_hosts_WHEN_server_made_THEN_refused(self):
+        for host in ("0.0.0.0", "", "::", "192.0.2.1"):
+            with self.assertRaises(ValueError):
+                make_server(self.service, host=host, port=0)
@@ -0,0 +1,33 @@
+import unittest
+from utils.substitutions import parse_substitutions
+
+
+class TestSubstitutions(unittest.TestCase):
+    def test_GIVEN_pattern_form_WHEN_parsed_THEN_instance_per_row(self):
+        text = ('# axes\n'
+                'file "$(TOP)/db/axis.template" {\n'
+                '    pattern { AXIS, EGU }\n'
+                '    { MTR1, mm }\n'
+                '    { "MTR2", "deg" }\n'
+                '}\n')
+
+        self.assertEqual([("$(TOP)/db/axis.template", [
+            {"AXIS": "MTR1", "EGU": "mm"}, {"AXIS": "MTR2", "EGU": "deg"}])],
+            parse_substitutions(text))
+
+    def test_GIVEN_definition_form_and_globals_WHEN_parsed_THEN_globals_included(self):
+        text = ('global { P = "IN:DEMO:" }\n'
+                'file axis.db { { AXIS=MTR1, ADDR=$(ADDR=0) } }\n'
+                'global { P = "IN:OTHER:" }\n'
+                'file other.db { { Q=1 } }\n')
+
+        self.assertEqual([
+            ("axis.db", [{"P": "IN:DEMO:", "AXIS": "MTR1",
+                          "ADDR": "$(ADDR=0)"}]),
+            ("other.db", [{"P": "IN:OTHER:", "Q": "1"}])],
+            parse_substitutions(text))
+
+    def test_GIVEN_row_not_matching_pattern_WHEN_parsed_THEN_value_error_with_line_raised(self):
+        with self.assertRaises(ValueError) as context:
+            parse_substitutions('file a.db {\n pattern { A, B }\n { 1 }\n}')
+        self.assertEqual(4, context.exception.line)
@@ -0,0 +1,31 @@
+import unittest
+from utils.timings import Timings
+
+
+class TestTimings(unittest.TestCase):
+    def setUp(self):
+        self.timings = Timings()
+        self.timings.add("/ioc/a/fast.db", {
+            "read": 0.1, "parse": 0.2, "checks": 0.3,
+            "check_times": {"units_valid": 0.2, "desc_length": 0.1}})
+        self.timings.add("/ioc/a/slow.db", {
+            "read": 1.0, "parse": 2.0, "checks": 1.0,
+            "check_times": {"units_valid": 0.5, "desc_length": 0.5}})
+        self.timings.add("/ioc/b/cached.db", {"cache": 0.5})
+
+    def test_GIVEN_files_WHEN_slowest_files_found_THEN_ordered_by_total_time(self):
+        self.assertEqual(["/ioc/a/slow.db", "/ioc/a/fast.db"],
+                         [f for f, _ in self.timings.slowest_files(2)])
+
+    def test_GIVEN_files_WHEN_totalled_by_directory_THEN_stages_summed(self):
+        directories = self.timings.directories()
+
+        self.assertEqual(2, directories["/ioc/a"]["files"])
+        self.assertAlmostEqual(2.2, directories["/ioc/a"]["parse"])
+        self.assertAlmostEqual(0.5, directories["/ioc/b"]["cache"])
+
+    def test_GIVEN_files_WHEN_slowest_checks_found_THEN_totalled_across_files(self):
+        slowest = self.timings.slowest_checks(1)
+
+        self.assertEqual("units_valid", slowest[0][0])
+        self.assertAlmostEqual(0.7, slowest[0][1])
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import unittest
+from utils.walker import DirectoryWalker
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+class TestDirectoryWalker(TempDirectoryTestCase):
+    def _settle(self):
+        # make every directory look old enough to be kept in a manifest
+        for root, dirs, _ in os.walk(self.directory):
+            for name in dirs + [""]:
+                os.utime(os.path.join(root, name), (1000, 1000))
+
+    def _os_walk(self, file_types, ignore):
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if d not in ignore]
+            found.extend(os.path.join(root, f) for f in files
+                         if any(f.endswith(t) for t in file_types))
+        return found
+
+    def test_GIVEN_tree_WHEN_walked_THEN_same_files_in_same_order_as_os_walk(self):
+        for parts in [("a.db",), ("b.template",), ("c.txt",), ("x", "d.db"),
+                      ("x", "y", "e.db"), ("bin", "f.db"), ("z", "g.db")]:
+            self._write(os.path.join(*parts))
+        walker = DirectoryWalker()
+
+        self.assertEqual(self._os_walk([".db", ".template"], walker.ignore),
+                         list(walker.files(self.directory,
+                                           [".db", ".template"])))
+
+    def test_GIVEN_glob_WHEN_walked_THEN_matching_directories_pruned(self):
+        kept = self._write(os.path.join("App", "a.db"))
+        self._write(os.path.join("O.linux-x86_64", "b.db"))
+        self._write(os.path.join("lib", "c.db"))
+
+        found = list(DirectoryWalker(globs=["O.*"]).files(self.directory,
+                                                          [".db"]))
+
+        self.assertEqual([kept], found)
+
+    def test_GIVEN_unusual_file_type_WHEN_walked_THEN_matched_by_suffix(self):
+        kept = self._write("a.db.orig")
+        self._write("a.db")
+
+        found = list(DirectoryWalker().files(self.directory, ["db.orig"]))
+
+        self.assertEqual([kept], found)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symbolic links")
+    def test_GIVEN_symlinked_directory_WHEN_walked_THEN_not_followed(self):
+        target = self._write(os.path.join("real", "a.db"))
+        try:
+            os.symlink(os.path.dirname(target),
+                       os.path.join(self.directory, "link"))
+        except OSError:
+            self.skipTest("cannot create symbolic links")
+
+        self.assertEqual([target], list(DirectoryWalker().files(
+            self.directory, [".db"])))
+
+    def test_GIVEN_files_WHEN_stats_walked_THEN_stat_of_each_file_given(self):
+        filename = self._write(os.path.join("x", "a.db"))
+
+        found = list(DirectoryWalker().stats(self.directory, [".db"]))
+
+        self.assertEqual([filename], [name for name, _ in found])
+        self.assertEqual(os.stat(filename).st_size, found[0][1].st_size)
+
+    def test_GIVEN_saved_manifest_WHEN_tree_unchanged_THEN_listings_reused(self):
+        manifest = os.path.join(tempfile.mkdtemp(), "manifest.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(manifest))
+        expected = [self._write("a.db"), self._write(os.path.join("x", "b.db"))]
+        self._settle()
+        first = DirectoryWalker(manifest=manifest)
+        self.assertEqual(expected, list(first.files(self.directory, [".db"])))
+        first.save()
+
+        second = DirectoryWalker(manifest=manifest)
+        found = list(second.files(self.directory, [".db"]))
+
+        self.assertEqual(expected, found)
+        self.assertEqual(2, second.manifest.reused)
+
+    def test_GIVEN_saved_manifest_WHEN_file_added_THEN_new_file_found(self):
+        manifest = os.path.join(tempfile.mkdtemp(), "manifest.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(manifest))
+        self._write(os.path.join("x", "a.db"))
+        self._settle()
+        walker = DirectoryWalker(manifest=manifest)
+        list(walker.files(self.directory, [".db"]))
+        walker.save()
+
+        added = self._write(os.path.join("x", "b.db"))
+        found = list(DirectoryWalker(manifest=manifest).files(
+            self.directory, [".db"]))
+
+        self.assertIn(added, found)
+        self.assertEqual(2, len(found))
+
+    def test_GIVEN_manifest_from_other_pruning_WHEN_loaded_THEN_not_used(self):
+        manifest = os.path.join(tempfile.mkdtemp(), "manifest.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(manifest))
+        self._write(os.path.join("O.x", "a.db"))
+        self._settle()
+        walker = DirectoryWalker(manifest=manifest)
+        list(walker.files(self.directory, [".db"]))
+        walker.save()
+
+        found = list(DirectoryWalker(globs=["O.*"], manifest=manifest)
+                     .files(self.directory, [".db"]))
+
+        self.assertEqual([], found)
+
+    def test_GIVEN_nested_input_directories_WHEN_found_THEN_each_file_once(self):
+        outer = self._write("a.db")
+        inner = self._write(os.path.join("x", "b.db"))
+        walker = DirectoryWalker()
+
+        found = [name for name, _ in walker.find(
+            [self.directory, os.path.dirname(inner), self.directory],
+            [".db"])]
+
+        self.assertEqual([outer, inner], found)
+        self.assertEqual(2, len(walker.nested))
+        self.assertEqual(set(), walker.duplicates)
+
+    def test_GIVEN_directory_within_pruned_directory_WHEN_found_THEN_searched(self):
+        self._write("a.db")
+        inner = self._write(os.path.join("lib", "b.db"))
+
+        found = [name for name, _ in DirectoryWalker().find(
+            [self.directory, os.path.dirname(inner)], [".db"])]
+
+        self.assertIn(inner, found)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symbolic links")
+    def test_GIVEN_symlinked_file_WHEN_found_THEN_duplicate_skipped(self):
+        target = self._write(os.path.join("x", "a.db"))
+        link = os.path.join(self.directory, "y", "link.db")
+        os.makedirs(os.path.dirname(link))
+        try:
+            os.symlink(target, link)
+        except OSError:
+            self.skipTest("cannot create symbolic links")
+        walker = DirectoryWalker()
+
+        found = [name for name, _ in walker.find([self.directory], [".db"])]
+
+        self.assertEqual([target], found)
+        self.assertEqual({link}, walker.duplicates)
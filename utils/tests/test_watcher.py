@@ -0,0 +1,33 @@
+import os
+from utils.watcher import PollingWatcher
+from utils.tests.temp_directory import TempDirectoryTestCase
+
+
+class TestPollingWatcher(TempDirectoryTestCase):
+    def setUp(self):
+        super(TestPollingWatcher, self).setUp()
+        self.first = self._write("a.db", "record(ao, \"A\") {}\n")
+
+    def test_GIVEN_watched_directory_WHEN_nothing_changes_THEN_no_changes_found(self):
+        watcher = PollingWatcher([self.directory], [".db"])
+
+        self.assertEqual([self.first], watcher.files())
+        self.assertEqual(([], []), watcher.poll())
+
+    def test_GIVEN_watched_directory_WHEN_files_added_modified_and_removed_THEN_changes_found(self):
+        other = self._write("b.db", "")
+        watcher = PollingWatcher([self.directory], [".db"])
+
+        added = self._write("c.db", "")
+        self._write("a.db", "record(ao, \"A\") {}\nrecord(ao, \"B\") {}\n")
+        os.remove(other)
+
+        self.assertEqual(([self.first, added], [other]), watcher.poll())
+        self.assertEqual(([], []), watcher.poll())
+
+    def test_GIVEN_change_WHEN_waited_for_THEN_only_polls_with_changes_yielded(self):
+        watcher = PollingWatcher([self.directory], [".db"])
+        os.remove(self.first)
+
+        self.assertEqual([([], [self.first])],
+                         list(watcher.wait(0, polls=3)))
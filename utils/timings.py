@@ -0,0 +1,104 @@
+"""
+This file holds the time spent on each stage of checking each file, so the
+files and checks that dominate a run can be found
+"""
+import json
+import os
+from collections import defaultdict
+
+STAGES = ("cache", "read", "parse", "checks")
+
+
+def _total(entry):
+    return sum(entry.get(stage, 0.0) for stage in STAGES)
+
+
+class Timings:
+    """
+    This class collects the timings of each file checked in a run.
+
+    The timings of a file are a dictionary of the seconds spent in each of
+    STAGES, the seconds spent in each check under "check_times" and the
+    number of records under "records".
+    """
+    def __init__(self):
+        self.files = {}
+
+    def add(self, filename, timings):
+        """
+        Adds the timings of a single file
+        """
+        self.files[filename] = dict(timings)
+
+    def directories(self):
+        """
+        Totals the timings of the files in each directory
+
+        Returns:
+            a dictionary of directory to the number of files and the seconds
+            spent in each stage
+        """
+        totals = defaultdict(lambda: dict.fromkeys(("files",) + STAGES, 0))
+        for filename, entry in self.files.items():
+            total = totals[os.path.dirname(filename)]
+            total["files"] += 1
+            for stage in STAGES:
+                total[stage] += entry.get(stage, 0.0)
+        return dict(totals)
+
+    def checks(self):
+        """
+        Totals the seconds spent in each check across every file
+        """
+        totals = defaultdict(float)
+        for entry in self.files.values():
+            for check, seconds in entry.get("check_times", {}).items():
+                totals[check] += seconds
+        return dict(totals)
+
+    def slowest_files(self, count):
+        """
+        Returns the (filename, total seconds) of the slowest files
+        """
+        return sorted(((f, _total(e)) for f, e in self.files.items()),
+                      key=lambda item: item[1], reverse=True)[:count]
+
+    def slowest_checks(self, count):
+        """
+        Returns the (check name, total seconds) of the slowest checks
+        """
+        return sorted(self.checks().items(), key=lambda item: item[1],
+                      reverse=True)[:count]
+
+    def save(self, path):
+        """
+        Saves the timings of each file, directory and check as JSON
+        """
+        with open(path, "w") as _file:
+            json.dump({"files": self.files,
+                       "directories": self.directories(),
+                       "checks": self.checks()}, _file, indent=1,
+                      sort_keys=True)
+
+    def report(self, count):
+        """
+        Prints the slowest files, directories and checks
+        """
+        directories = sorted(self.directories().items(),
+                             key=lambda item: _total(item[1]), reverse=True)
+        print("Slowest files:")
+        for filename, seconds in self.slowest_files(count):
+            entry = self.files[filename]
+            print("  {:8.1f} ms  {} ({} records, read {:.1f} ms, parse "
+                  "{:.1f} ms, checks {:.1f} ms)".format(
+                      seconds * 1000, filename, entry.get("records", 0),
+                      entry.get("read", 0.0) * 1000,
+                      entry.get("parse", 0.0) * 1000,
+                      entry.get("checks", 0.0) * 1000))
+        print("Slowest directories:")
+        for directory, total in directories[:count]:
+            print("  {:8.1f} ms  {} ({} files)".format(
+                _total(total) * 1000, directory, total["files"]))
+        print("Slowest checks:")
+        for check, seconds in self.slowest_checks(count):
+            print("  {:8.1f} ms  {}".format(seconds * 1000, check))
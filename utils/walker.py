@@ -0,0 +1,299 @@
+"""
+This file holds the walk of the input directories for candidate files,
+built on os.scandir, with an optional manifest of the directories walked so
+that unchanged directories need not be listed again on later runs
+"""
+import fnmatch
+import json
+import os
+import re
+import time
+
+DIRECTORIES_TO_ALWAYS_IGNORE = [
+    ".git",
+    "O.Common",
+    "O.windows-x64",
+    "O.win32-x86",
+    "bin",
+    "lib",
+    "include",
+    ".project",
+    ".ci",
+    ".vs"
+]
+
+MANIFEST_VERSION = 1
+
+# A directory modified this recently may be modified again within the
+# resolution of its timestamp, so its listing is not kept in the manifest
+_SETTLE_NS = 2 * 10 ** 9
+
+
+def _suffix_matcher(file_types):
+    """
+    Returns a function which checks whether a file name ends with one of a
+    list of file types. Plain extensions such as ".db" are found with a
+    single set lookup of the extension of the name.
+    """
+    file_types = tuple(file_types)
+    if all(len(t) > 1 and t.startswith(".") and t.count(".") == 1
+           for t in file_types):
+        suffixes = frozenset(file_types)
+        return lambda name: name[name.rfind("."):] in suffixes
+    return lambda name: name.endswith(file_types)
+
+
+class DirectoryManifest:
+    """
+    This class holds the listing of each directory walked, keyed by its
+    path and only valid while the modification time of the directory is
+    unchanged.
+
+    A directory's modification time changes when entries are added to,
+    removed from or renamed within it, so an unchanged directory is not
+    listed again. Its subdirectories are still visited, as a change within
+    a subdirectory does not change the time of its parent.
+    """
+    def __init__(self, path, key):
+        """
+        Args:
+            path: the file the manifest is saved to
+            key: the pruning the listings were made with, as listings made
+                with different pruning are not used
+        """
+        self.path = path
+        self.key = key
+        self.directories = {}
+        self.reused = 0
+        try:
+            with open(path) as _file:
+                data = json.load(_file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION and \
+                data.get("key") == key:
+            self.directories = data["directories"]
+
+    def lookup(self, directory, mtime):
+        """
+        Returns the stored (files, subdirectories) names of a directory, or
+        None if it is not stored or has changed
+        """
+        entry = self.directories.get(directory)
+        if entry is None or entry["mtime"] != mtime:
+            return None
+        self.reused += 1
+        return entry["files"], entry["dirs"]
+
+    def store(self, directory, mtime, files, dirs):
+        if time.time_ns() - mtime < _SETTLE_NS:
+            self.directories.pop(directory, None)
+            return
+        self.directories[directory] = {
+            "mtime": mtime, "files": files, "dirs": dirs}
+
+    def save(self):
+        """
+        Saves the manifest, replacing any previous manifest at the path
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as _file:
+            json.dump({"version": MANIFEST_VERSION, "key": self.key,
+                       "directories": self.directories}, _file)
+        os.replace(temp_path, self.path)
+
+
+class DirectoryWalker:
+    """
+    This class walks directories for files with given extensions, skipping
+    directories with an ignored name or a name matching an ignored glob.
+
+    Files are found in the same order as with os.walk: the files of a
+    directory, then each of its subdirectories in turn. As with os.walk,
+    symbolic links to directories are not followed.
+    """
+    def __init__(self, ignore=DIRECTORIES_TO_ALWAYS_IGNORE, globs=(),
+                 manifest=None):
+        """
+        Args:
+            ignore: the names of directories to skip
+            globs: glob patterns of the names of directories to skip
+            manifest: an optional file to keep the listing of each
+                directory in between runs
+        """
+        self.ignore = frozenset(ignore)
+        self.globs = tuple(globs)
+        self._pattern = re.compile("|".join(
+            fnmatch.translate(glob) for glob in self.globs)) \
+            if self.globs else None
+        self.manifest = None if manifest is None else DirectoryManifest(
+            manifest, sorted(self.ignore) + ["glob:" + glob
+                                             for glob in self.globs])
+        # the paths of files skipped as the same file as one already found,
+        # and the (directory, outer directory) of input directories skipped
+        # as they are searched as part of another
+        self.duplicates = set()
+        self.nested = set()
+
+    def prunes(self, name):
+        """
+        Returns whether directories with a given name are skipped
+        """
+        return name in self.ignore or \
+            (self._pattern is not None and
+             self._pattern.match(name) is not None)
+
+    def _list(self, directory, mtime=None):
+        """
+        Lists the files and subdirectories of a directory that are not
+        pruned, as two lists of DirEntry objects or of names when taken
+        from the manifest
+        """
+        if self.manifest is not None:
+            if mtime is None:
+                mtime = os.stat(directory).st_mtime_ns
+            listing = self.manifest.lookup(directory, mtime)
+            if listing is not None:
+                return listing
+
+        files = []
+        dirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry)
+                elif not entry.is_symlink() and not self.prunes(entry.name):
+                    dirs.append(entry)
+
+        if self.manifest is not None:
+            self.manifest.store(directory, mtime,
+                                [entry.name for entry in files],
+                                [entry.name for entry in dirs])
+        return files, dirs
+
+    def _walk(self, directory, matches, mtime=None):
+        try:
+            files, dirs = self._list(directory, mtime)
+        except OSError:
+            return
+        for entry in files:
+            name = entry if isinstance(entry, str) else entry.name
+            if matches(name):
+                yield os.path.join(directory, name), entry
+        for entry in dirs:
+            if isinstance(entry, str):
+                subdir = os.path.join(directory, entry)
+                yield from self._walk(subdir, matches)
+            else:
+                try:
+                    subdir_mtime = entry.stat().st_mtime_ns \
+                        if self.manifest is not None else None
+                except OSError:
+                    continue
+                yield from self._walk(entry.path, matches, subdir_mtime)
+
+    def files(self, path, file_types):
+        """
+        Generator of the files under a directory with one of the expected
+        extensions
+
+        Args:
+            path: the path to search
+            file_types: a list of file extensions that are expected
+
+        Yields:
+            the absolute path of each file
+        """
+        root = os.path.abspath(os.path.normpath(path))
+        for filename, _ in self._walk(root, _suffix_matcher(file_types)):
+            yield filename
+
+    def stats(self, path, file_types):
+        """
+        Generator of the files under a directory with one of the expected
+        extensions along with the result of stat on each. The stat held by
+        the directory listing is used where there is one, which costs no
+        further system call on Windows.
+
+        Args:
+            path: the path to search
+            file_types: a list of file extensions that are expected
+
+        Yields:
+            (absolute path, stat result) tuples
+        """
+        root = os.path.abspath(os.path.normpath(path))
+        for filename, entry in self._walk(root, _suffix_matcher(file_types)):
+            try:
+                yield filename, os.stat(filename) \
+                    if isinstance(entry, str) else entry.stat()
+            except OSError:
+                # removed since the directory was listed
+                continue
+
+    def _within(self, path, root):
+        """
+        Returns whether a directory is searched as part of searching root,
+        both given as real paths
+        """
+        try:
+            relative = os.path.relpath(path, root)
+        except ValueError:
+            # on a different drive
+            return False
+        if relative == os.curdir:
+            return True
+        parts = relative.split(os.sep)
+        return parts[0] != os.pardir and not any(self.prunes(part)
+                                                 for part in parts)
+
+    def find(self, paths, file_types):
+        """
+        Generator of the files under a list of directories with one of the
+        expected extensions, finding each physical file once.
+
+        A directory within another directory of the list is not searched
+        again, and a file reached by more than one path, e.g. through a
+        symbolic link, is only given by the first path found. The paths
+        skipped are kept in duplicates and nested.
+
+        Args:
+            paths: the paths to search
+            file_types: a list of file extensions that are expected
+
+        Yields:
+            (absolute path, stat result) tuples
+        """
+        roots = []
+        seen = set()
+        for path in paths:
+            real = os.path.realpath(path)
+            outer = next((root for root in roots
+                          if self._within(real, root)), None)
+            if outer is not None:
+                self.nested.add((os.path.abspath(path), outer))
+                continue
+            roots.append(real)
+
+            for filename, stat in self.stats(path, file_types):
+                if stat.st_ino == 0:
+                    # the stat of a directory listing on Windows has no
+                    # file index
+                    stat = os.stat(filename)
+                key = (stat.st_dev, stat.st_ino)
+                if key in seen:
+                    self.duplicates.add(filename)
+                    continue
+                seen.add(key)
+                yield filename, stat
+
+    def save(self):
+        """
+        Saves the manifest, if there is one
+        """
+        if self.manifest is not None:
+            self.manifest.save()
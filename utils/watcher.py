@@ -0,0 +1,75 @@
+"""
+This file holds a watcher which finds the files that change in a set of
+directories by polling, so that a long running checker can re-check only
+those files. Polling needs no file system notification service, and works
+the same on network shares and on Windows.
+"""
+import time
+
+from .walker import DirectoryWalker
+
+
+class PollingWatcher:
+    """
+    This class keeps the modification time and size of every candidate file
+    in a set of directories, and compares them with the files found on each
+    poll.
+    """
+    def __init__(self, directories, file_types, walker=None):
+        """
+        Args:
+            directories: the directories to watch
+            file_types: a list of file extensions that are expected
+            walker: an optional DirectoryWalker to search with, which
+                decides the directories skipped
+        """
+        self.directories = directories
+        self.file_types = file_types
+        self.walker = walker if walker is not None else DirectoryWalker()
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        return {filename: (stat.st_mtime_ns, stat.st_size)
+                for filename, stat in self.walker.find(self.directories,
+                                                       self.file_types)}
+
+    def files(self):
+        """
+        Returns the files found by the last poll, in the order found
+        """
+        return list(self.snapshot)
+
+    def poll(self):
+        """
+        Finds the files that changed since the last poll
+
+        Returns:
+            a tuple of the sorted lists of the files added or modified and
+            of the files removed
+        """
+        snapshot = self._scan()
+        changed = sorted(filename for filename, state in snapshot.items()
+                         if self.snapshot.get(filename) != state)
+        removed = sorted(set(self.snapshot) - set(snapshot))
+        self.snapshot = snapshot
+        return changed, removed
+
+    def wait(self, interval, polls=None):
+        """
+        Generator which polls until files change, and then yields them
+
+        Args:
+            interval: the seconds between polls
+            polls: the number of polls to make, or None to poll for ever
+
+        Yields:
+            (changed, removed) tuples as returned by poll, only when a file
+            has changed or been removed
+        """
+        count = 0
+        while polls is None or count < polls:
+            time.sleep(interval)
+            count += 1
+            changed, removed = self.poll()
+            if changed or removed:
+                yield changed, removed